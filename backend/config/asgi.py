@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Login (``users.login``) is async: served through this application, password
+hashing runs in a bounded pool and leaves the event loop free for other
+requests. Under WSGI the same views work but block their worker as before.
 """
 
 import os
@@ -0,0 +1,248 @@
+# config/dbpool/__init__.py
+"""Bounded per-process connection pool behind the ``config.dbpool.*`` engines.
+
+``config.dbpool.mysql`` wraps Django's MySQL backend (and
+``config.dbpool.sqlite3`` the SQLite one, for tests): opening a connection
+checks one out of the alias's pool and closing it hands it back, so with
+``CONN_MAX_AGE = 0`` every request borrows a connection instead of dialling
+the server. Pool behaviour is set by a ``POOL`` dict next to ``OPTIONS``:
+
+* ``MAX_SIZE`` -- connections open at once, idle or in use (default 10);
+* ``TIMEOUT`` -- seconds a checkout waits for a free connection before
+  raising ``OperationalError`` (default 5);
+* ``MAX_LIFETIME`` -- seconds after which a connection is closed rather than
+  reused (default 1800, below MySQL's ``wait_timeout``);
+* ``CHECK_AFTER`` -- idle seconds after which a connection is pinged on
+  checkout; 0 pings every time (default 0).
+
+``stats()`` reports size, checkouts and wait times per alias for scraping.
+"""
+import threading
+import time
+from collections import deque
+
+DEFAULTS = {"MAX_SIZE": 10, "TIMEOUT": 5.0, "MAX_LIFETIME": 1800.0, "CHECK_AFTER": 0.0}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """At most ``max_size`` driver connections, reused most-recently-returned first.
+
+    ``checkout(connect, check)`` returns ``(raw, reused)``; ``connect()``
+    opens a new driver connection and ``check(raw)`` pings an idle one.
+    """
+
+    def __init__(self, max_size, timeout, max_lifetime, check_after):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self._idle = deque()  # (raw, created, returned)
+        self._born = {}  # id(raw) -> created, for checked-out connections
+        self._open = 0
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.created = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.recycled = 0
+        self.failed_checks = 0
+
+    def _expired(self, created, now):
+        return now - created >= self.max_lifetime
+
+    def _forget(self, raw):
+        """Close ``raw`` and free its slot; callers hold ``_cond``."""
+        self._open -= 1
+        self._cond.notify()
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def checkout(self, connect, check):
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._cond:
+                raw = None
+                while raw is None:
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate, created, returned = self._idle.pop()
+                        if self._expired(created, now):
+                            self.recycled += 1
+                            self._forget(candidate)
+                            continue
+                        raw = candidate
+                        break
+                    if raw is not None:
+                        break
+                    if self._open < self.max_size:
+                        self._open += 1
+                        break
+                    remaining = started + self.timeout - now
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        self.wait_time += now - started
+                        raise PoolTimeout(
+                            f"No database connection free within {self.timeout:g}s "
+                            f"({self.max_size} in use)."
+                        )
+                    if not waited:
+                        waited = True
+                        self.waits += 1
+                    self._cond.wait(remaining)
+
+            if raw is not None and now - returned >= self.check_after and not check(raw):
+                with self._cond:
+                    self.failed_checks += 1
+                    self._forget(raw)
+                continue
+
+            reused = raw is not None
+            if not reused:
+                try:
+                    raw = connect()
+                except BaseException:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                created = time.monotonic()
+            with self._cond:
+                if not reused:
+                    self.created += 1
+                self.checkouts += 1
+                if waited:
+                    self.wait_time += time.monotonic() - started
+                self._born[id(raw)] = created
+            return raw, reused
+
+    def checkin(self, raw, reusable=True):
+        """Return ``raw``; unusable or expired connections are closed instead."""
+        now = time.monotonic()
+        with self._cond:
+            created = self._born.pop(id(raw), None)
+            if created is None:
+                return
+            if not reusable or self._expired(created, now):
+                if reusable:
+                    self.recycled += 1
+                self._forget(raw)
+                return
+            self._idle.append((raw, created, now))
+            self._cond.notify()
+
+    def close_idle(self):
+        with self._cond:
+            while self._idle:
+                self._forget(self._idle.popleft()[0])
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "checkouts": self.checkouts,
+                "created": self.created,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_time, 6),
+                "timeouts": self.timeouts,
+                "recycled": self.recycled,
+                "failed_checks": self.failed_checks,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(alias, settings_dict):
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            options = {**DEFAULTS, **settings_dict.get("POOL", {})}
+            pool = _pools[alias] = ConnectionPool(
+                int(options["MAX_SIZE"]),
+                float(options["TIMEOUT"]),
+                float(options["MAX_LIFETIME"]),
+                float(options["CHECK_AFTER"]),
+            )
+        return pool
+
+
+def stats():
+    """``{alias: {...}}`` for every pool opened in this process."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+def close_pools():
+    """Close idle connections and drop every pool (tests, worker shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_idle()
+
+
+class PooledDatabaseWrapperMixin:
+    """Borrow driver connections from the alias's ``ConnectionPool``.
+
+    Mixed in ahead of a backend's ``DatabaseWrapper``; subclasses override
+    ``ping`` with a cheaper driver-level check where there is one.
+    """
+
+    _pool_reused = False
+
+    @property
+    def pool(self):
+        return pool_for(self.alias, self.settings_dict)
+
+    def ping(self, raw):
+        try:
+            cursor = raw.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        try:
+            raw, self._pool_reused = self.pool.checkout(
+                lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+                self.ping,
+            )
+        except PoolTimeout as exc:
+            raise self.Database.OperationalError(str(exc)) from exc
+        return raw
+
+    def init_connection_state(self):
+        # Session settings were applied when the connection was first opened.
+        if not self._pool_reused:
+            super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        reusable = not (self.errors_occurred and not self.is_usable())
+        if reusable and (self.in_atomic_block or not self.get_autocommit()):
+            # Never lend out a connection with a transaction still open.
+            try:
+                with self.wrap_database_errors:
+                    self.connection.rollback()
+                    self._set_autocommit(self.settings_dict["AUTOCOMMIT"])
+            except Exception:
+                reusable = False
+        self.pool.checkin(self.connection, reusable)
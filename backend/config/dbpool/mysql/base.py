@@ -0,0 +1,14 @@
+# config/dbpool/mysql/base.py
+"""Django's MySQL backend with connections borrowed from ``config.dbpool``."""
+from django.db.backends.mysql import base
+
+from .. import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def ping(self, raw):
+        try:
+            raw.ping(reconnect=False)
+        except Exception:
+            return False
+        return True
@@ -0,0 +1,13 @@
+# config/dbpool/sqlite3/base.py
+"""Django's SQLite backend with connections borrowed from ``config.dbpool``.
+
+Lets the pool be exercised without a MySQL server; use a file database, as
+every new connection to ``:memory:`` opens a separate empty one.
+"""
+from django.db.backends.sqlite3 import base
+
+from .. import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
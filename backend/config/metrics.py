@@ -0,0 +1,324 @@
+# config/metrics.py
+"""Per-route request metrics, served in Prometheus text format at ``/api/metrics``.
+
+``MetricsMiddleware`` times every request and, through an ``execute_wrapper``
+installed on each database connection, counts the SQL statements it ran and
+the time they took. Samples are filed under the resolved URL pattern (for
+example ``api/training/sessions/<pk>/``) and method, so a route's numbers
+do not split by object id.
+
+Counters are kept per thread: each thread only ever writes its own shard, so
+recording takes no lock, and a scrape sums the shards. When a thread gets a
+new shard, the shards of threads that have exited are folded into one
+retired shard, so the list stays as long as the number of live threads.
+Numbers are for this process only; Prometheus adds up the workers.
+
+Scraping needs ``METRICS_TOKEN``: until it is set, ``/api/metrics`` answers
+401 to everyone, because route names, error rates and pool sizes are not
+meant to be public.
+"""
+import hmac
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, JsonResponse
+
+# Upper bounds, in seconds, of the latency histogram buckets (+Inf is implied).
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED = "<unmatched>"
+
+# [count, seconds, queries, sql seconds, response bytes, *bucket counts]
+COUNT, SECONDS, QUERIES, SQL_SECONDS, BYTES = range(5)
+
+_shards = []  # shards of live threads, plus the retired shard
+_shards_lock = threading.Lock()  # taken to add or fold shards and to scrape, never to record
+_local = threading.local()
+_request_sql = ContextVar("request_sql", default=None)  # [queries, seconds]
+
+
+class _Shard:
+    def __init__(self, thread=None):
+        self.thread = thread  # the only writer; None for the retired shard
+        self.routes = {}  # (route, method) -> list as above
+        self.statuses = {}  # (route, method, status) -> count
+
+    def row(self, key):
+        row = self.routes.get(key)
+        if row is None:
+            row = self.routes[key] = [0, 0.0, 0, 0.0, 0] + [0] * (len(BUCKETS) + 1)
+        return row
+
+    def merge(self, other):
+        for key, row in other.routes.items():
+            total = self.row(key)
+            for i, value in enumerate(row):
+                total[i] += value
+        for key, count in other.statuses.items():
+            self.statuses[key] = self.statuses.get(key, 0) + count
+
+
+_retired = _Shard()
+_shards.append(_retired)
+
+
+def _shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = _Shard(threading.current_thread())
+        with _shards_lock:
+            for old in [old for old in _shards if old.thread and not old.thread.is_alive()]:
+                _retired.merge(old)
+                _shards.remove(old)
+            _shards.append(shard)
+    return shard
+
+
+def _record_sql(execute, sql, params, many, context):
+    tally = _request_sql.get()
+    if tally is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        tally[0] += 1
+        tally[1] += time.perf_counter() - started
+
+
+def _instrument(connection, **kwargs):
+    if _record_sql not in connection.execute_wrappers:
+        # At the bottom: execute_wrapper() contexts pop from the top when they exit.
+        connection.execute_wrappers.insert(0, _record_sql)
+
+
+connection_created.connect(_instrument)
+
+_GROUP = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+
+
+def route_label(request):
+    """The matched URL pattern with named groups as ``<name>``."""
+    match = getattr(request, "resolver_match", None)
+    if match is None or match.route is None:
+        return UNMATCHED
+    return _GROUP.sub(r"<\1>", match.route).replace("^", "").replace("$", "")
+
+
+def record(route, method, status, seconds, queries=0, sql_seconds=0.0, size=0):
+    shard = _shard()
+    row = shard.row((route, method))
+    row[COUNT] += 1
+    row[SECONDS] += seconds
+    row[QUERIES] += queries
+    row[SQL_SECONDS] += sql_seconds
+    row[BYTES] += size
+    row[5 + bisect_left(BUCKETS, seconds)] += 1
+    status_key = (route, method, status)
+    shard.statuses[status_key] = shard.statuses.get(status_key, 0) + 1
+
+
+def _add_bytes(route, method, content):
+    size = 0
+    for chunk in content:
+        size += len(chunk)
+        yield chunk
+    # The server may drain the body on another thread than the one that
+    # recorded the request; the bytes go to whichever thread this is.
+    _shard().row((route, method))[BYTES] += size
+
+
+def snapshot():
+    """``(routes, statuses)`` summed over every thread's shard."""
+    routes, statuses = {}, {}
+    with _shards_lock:
+        for shard in _shards:
+            for key, row in dict(shard.routes).items():
+                total = routes.setdefault(key, [0] * len(row))
+                for i, value in enumerate(list(row)):
+                    total[i] += value
+            for key, count in dict(shard.statuses).items():
+                statuses[key] = statuses.get(key, 0) + count
+    return routes, statuses
+
+
+def reset():
+    with _shards_lock:
+        for shard in _shards:
+            shard.routes.clear()
+            shard.statuses.clear()
+
+
+class MetricsMiddleware:
+    """Records latency, SQL and response size per route; keep it first in ``MIDDLEWARE``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        tally, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_sql.reset(token)
+        return self._finish(request, response, tally, started)
+
+    async def __acall__(self, request):
+        tally, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_sql.reset(token)
+        return self._finish(request, response, tally, started)
+
+    def _start(self):
+        # Connections opened before the middleware loaded missed connection_created.
+        for connection in connections.all(initialized_only=True):
+            _instrument(connection)
+        tally = [0, 0.0]
+        return tally, _request_sql.set(tally), time.perf_counter()
+
+    def _finish(self, request, response, tally, started):
+        seconds = time.perf_counter() - started
+        route, method = route_label(request), request.method
+        if response.streaming:
+            size = 0
+            if not response.is_async:
+                response.streaming_content = _add_bytes(route, method, response.streaming_content)
+        else:
+            size = len(response.content)
+        record(route, method, response.status_code, seconds, tally[0], tally[1], size)
+        return response
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for suffix, labels, value in samples:
+        labels = f"{{{_labels(labels)}}}" if labels else ""
+        lines.append(f"{name}{suffix}{labels} {_number(value)}")
+
+
+def render():
+    """Every metric of this process in Prometheus text exposition format."""
+    from config import dbpool
+    from training.response_cache import stats as response_cache_stats
+    from users.login import pool_stats as login_pool_stats
+
+    routes, statuses = snapshot()
+    lines = []
+    histogram = []
+    for (route, method), row in sorted(routes.items()):
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, "+Inf"), row[5:]):
+            cumulative += count
+            histogram.append(("_bucket", {"route": route, "method": method, "le": bound}, cumulative))
+        histogram.append(("_sum", {"route": route, "method": method}, row[SECONDS]))
+        histogram.append(("_count", {"route": route, "method": method}, row[COUNT]))
+    _family(lines, "gym_http_request_duration_seconds", "histogram",
+            "Time to build the response, by route and method.", histogram)
+    _family(lines, "gym_http_responses_total", "counter", "Responses by route, method and status.", [
+        ("", {"route": route, "method": method, "status": status}, count)
+        for (route, method, status), count in sorted(statuses.items())
+    ])
+    for name, index, help_text in (
+        ("gym_http_db_queries_total", QUERIES, "SQL statements run while handling requests."),
+        ("gym_http_db_query_seconds_total", SQL_SECONDS, "Time spent in SQL while handling requests."),
+        ("gym_http_response_bytes_total", BYTES, "Response body bytes sent."),
+    ):
+        _family(lines, name, "counter", help_text, [
+            ("", {"route": route, "method": method}, row[index])
+            for (route, method), row in sorted(routes.items())
+        ])
+
+    _family(lines, "gym_response_cache_events_total", "counter",
+            "Reference-data response cache hits, misses and lock waits.", [
+                ("", {"namespace": namespace, "event": event}, count)
+                for (namespace, event), count in sorted(response_cache_stats().items())
+            ])
+
+    pools = dbpool.stats()
+    for name, key, kind, help_text in (
+        ("gym_db_pool_size", "size", "gauge", "Open pooled database connections."),
+        ("gym_db_pool_in_use", "in_use", "gauge", "Pooled database connections checked out."),
+        ("gym_db_pool_max_size", "max_size", "gauge", "Pool size limit."),
+        ("gym_db_pool_checkouts_total", "checkouts", "counter", "Connection checkouts."),
+        ("gym_db_pool_waits_total", "waits", "counter", "Checkouts that had to wait for a connection."),
+        ("gym_db_pool_wait_seconds_total", "wait_seconds", "counter", "Time checkouts spent waiting."),
+        ("gym_db_pool_timeouts_total", "timeouts", "counter", "Checkouts that gave up waiting."),
+        ("gym_db_pool_recycled_total", "recycled", "counter", "Connections closed at their maximum lifetime."),
+        ("gym_db_pool_failed_checks_total", "failed_checks", "counter", "Idle connections that failed the ping."),
+    ):
+        _family(lines, name, kind, help_text, [
+            ("", {"alias": alias}, stats[key]) for alias, stats in sorted(pools.items())
+        ])
+
+    login = login_pool_stats()
+    if login is not None:
+        _family(lines, "gym_login_hash_workers", "gauge", "Password hashing threads.",
+                [("", {}, login["workers"])])
+        _family(lines, "gym_login_hash_pending", "gauge", "Logins hashing or queued.",
+                [("", {}, login["pending"])])
+        _family(lines, "gym_login_hash_rejected_total", "counter", "Logins refused with 503.",
+                [("", {}, login["rejected"])])
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """``/api/metrics``; scrapers must send ``METRICS_TOKEN`` as a bearer token.
+
+    Without a configured token nobody can scrape.
+    """
+    expected = settings.METRICS_TOKEN
+    sent = request.headers.get("Authorization", "")
+    if not expected or not hmac.compare_digest(sent.encode(), f"Bearer {expected}".encode()):
+        return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+def health_view(request):
+    """``/api/health``; ``?deep=1`` also times a ``SELECT 1`` on the primary and replicas."""
+    if request.GET.get("deep") not in ("1", "true"):
+        return JsonResponse({"status": "ok"})
+    databases, healthy = {}, True
+    for alias in (DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS):
+        started = time.perf_counter()
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            databases[alias] = {"ok": True, "seconds": round(time.perf_counter() - started, 6)}
+        except Exception as exc:
+            healthy = False
+            databases[alias] = {"ok": False, "error": exc.__class__.__name__}
+    return JsonResponse(
+        {"status": "ok" if healthy else "unavailable", "databases": databases},
+        status=200 if healthy else 503,
+    )
@@ -0,0 +1,142 @@
+# config/replicas.py
+"""Read replicas for the training and users APIs, with read-your-writes stickiness.
+
+``ReplicaMiddleware`` decides, per request, where the ``training`` and
+``users`` models are read from, and ``ReplicaRouter`` applies it:
+
+* ``GET``/``HEAD``/``OPTIONS`` handled by a view of those apps read from a
+  random alias in ``DATABASE_REPLICAS``;
+* everything else (writes, admin, other apps, management commands, code
+  outside a request) uses ``default``.
+
+A write pins its client to ``default`` for ``REPLICA_PIN_SECONDS``, so a
+replica that is a few seconds behind never hides the client's own changes:
+the response sets the ``REPLICA_PIN_COOKIE`` cookie, and for JWT clients a
+marker keyed by the user id goes into the shared ``REPLICA_PIN_CACHE``,
+found again through the bearer token on the next request.
+
+Reports and exports decorated with ``force_replica`` read from a replica
+even while their client is pinned; a few seconds of lag do not matter to
+them, and they are the heaviest reads. With no replicas configured the
+middleware does nothing.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+ROUTED_APPS = ("training", "users")
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_on_replica = ContextVar("reads_on_replica", default=False)
+
+
+def force_replica(view):
+    """Mark a view class or viewset action to read from a replica even when pinned."""
+    view.force_replica = True
+    return view
+
+
+def read_alias():
+    """The alias ``training``/``users`` reads go to in the current context."""
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or not _on_replica.get():
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or rows read from a replica would be saved back to it.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def _marker(user_id):
+    return f"db-primary:{user_id}"
+
+
+def _token_user_id(request):
+    """User id of a valid bearer token on ``request``, without touching the database."""
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw = header and auth.get_raw_token(header)
+    if not raw:
+        return None
+    try:
+        return auth.get_validated_token(raw).get(api_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
+        return None
+
+
+def is_pinned(request):
+    if request.COOKIES.get(settings.REPLICA_PIN_COOKIE):
+        return True
+    user_id = _token_user_id(request)
+    return user_id is not None and caches[settings.REPLICA_PIN_CACHE].get(_marker(user_id)) is not None
+
+
+def _on_replica_while(content):
+    """Iterate ``content`` reading from replicas; streams are consumed after process_response."""
+    iterator = iter(content)
+    while True:
+        token = _on_replica.set(True)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _on_replica.reset(token)
+        yield chunk
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        cls = getattr(view_func, "cls", None)
+        if not settings.DATABASE_REPLICAS or cls is None:
+            return None
+        if cls.__module__.split(".")[0] not in ROUTED_APPS:
+            return None
+        request.replica_routed = True
+        if request.method not in SAFE_METHODS:
+            return None
+        action = (getattr(view_func, "actions", None) or {}).get(request.method.lower())
+        forced = getattr(getattr(cls, action, None) if action else cls, "force_replica", False)
+        if forced or not is_pinned(request):
+            request.replica_reads = _on_replica.set(True)
+        return None
+
+    def process_response(self, request, response):
+        token = getattr(request, "replica_reads", None)
+        if token is not None:
+            if response.streaming and not response.is_async:
+                response.streaming_content = _on_replica_while(response.streaming_content)
+            _on_replica.reset(token)
+        if getattr(request, "replica_routed", False) and request.method not in SAFE_METHODS:
+            self.pin(request, response)
+        return response
+
+    def pin(self, request, response):
+        seconds = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(
+            settings.REPLICA_PIN_COOKIE, "1", max_age=seconds, httponly=True, samesite="Lax"
+        )
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            caches[settings.REPLICA_PIN_CACHE].set(_marker(user.pk), 1, seconds)
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 import pymysql
 
@@ -49,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.metrics.MetricsMiddleware",  # first, so it times the whole stack
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # CORS middleware (must be before CommonMiddleware)
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -57,6 +60,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "config.replicas.ReplicaMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -83,18 +87,47 @@ AUTH_USER_MODEL = "users.User"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# config.dbpool.mysql is Django's MySQL backend plus a per-process connection
+# pool; CONN_MAX_AGE stays 0 so each request hands its connection back.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
+        "ENGINE": "config.dbpool.mysql",
         "NAME": "gymdb",
         "USER": "gym",
         "PASSWORD": "gym_pass",
         "HOST": "127.0.0.1",
         "PORT": "3306",  # Using local MariaDB on port 3306
         "OPTIONS": {"charset": "utf8mb4"},
+        "POOL": {"MAX_SIZE": 10, "TIMEOUT": 5, "MAX_LIFETIME": 1800, "CHECK_AFTER": 0},
     }
 }
 
+# Read replicas (config.replicas): aliases in DATABASES that GET requests to the
+# training and users APIs read from, e.g. ("replica",) next to a "replica" entry
+# with the same settings as "default" but the replica's HOST. A write pins the
+# client to "default" for REPLICA_PIN_SECONDS (cookie, plus a per-user marker in
+# REPLICA_PIN_CACHE for JWT clients); keep it above the usual replication lag.
+DATABASE_REPLICAS = ()
+DATABASE_ROUTERS = ["config.replicas.ReplicaRouter"]
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = "db_primary"
+REPLICA_PIN_CACHE = "responses"
+
+# Caches
+# "responses" backs training.response_cache. The file-based backend is shared by
+# every worker process on the host, so an invalidation in one worker reaches all.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": str(Path(tempfile.gettempdir()) / "gym_fullstack_responses"),
+    },
+}
+RESPONSE_CACHE_ALIAS = "responses"
+RESPONSE_CACHE_TIMEOUT = 300  # seconds; bounds staleness after bulk updates
+
 # Use SQLite for tests (faster and no permission issues)
 import sys
 if 'test' in sys.argv:
@@ -102,16 +135,25 @@ if 'test' in sys.argv:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": ":memory:",
-        }
+        },
+        # Only used by tests that list it and override DATABASE_REPLICAS.
+        "replica": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": ":memory:",
+        },
+    }
+    CACHES["responses"] = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
     }
 
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "training.pagination.CountedPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
@@ -199,3 +241,38 @@ CORS_ALLOW_HEADERS = [
 
 # For development, you can allow all origins (NOT for production!)
 # CORS_ALLOW_ALL_ORIGINS = True
+
+# Per-process cache of (role, trainer, is_active) behind ClaimsJWTAuthentication
+AUTH_USER_CACHE_SIZE = 10_000
+AUTH_USER_CACHE_TTL = 60  # seconds
+
+# Async login (users.login): hashing threads, queued logins beyond them, 503 back-off.
+# A hash is ~0.5s of CPU, so threads beyond the cores only slow every login down,
+# and the queue holds two more hashes per thread (an accepted login waits ~1.5s at
+# most); the rest get a fast 503 rather than a wait longer than a client timeout.
+LOGIN_HASH_WORKERS = os.cpu_count() or 1
+LOGIN_HASH_QUEUE = 2 * LOGIN_HASH_WORKERS
+LOGIN_RETRY_AFTER = 1  # seconds
+
+# Password hashing processes for uploads to the members/import endpoint. 0 hashes
+# in the request's own process, so a web worker never forks a pool; big files go
+# through the import_members command, which uses one process per CPU by default.
+MEMBER_IMPORT_WORKERS = 0
+
+# Autocomplete prefix index (users.autocomplete): rebuilt in a background thread
+# after this many seconds so saves made by other processes show up
+AUTOCOMPLETE_MAX_AGE = 300
+
+# List routes (router basenames, plus "me") served by the async views in
+# training.async_reads; only worthwhile when running under config.asgi
+ASYNC_READ_ROUTES = ()
+
+# Trainer payroll (training.payroll): "hourly" pays hourly_rate per hour worked,
+# "commission" pays this fraction of the completed sessions' price
+PAYROLL_BASIS = "hourly"
+PAYROLL_COMMISSION = "0.40"
+
+# /api/metrics (config.metrics): scrapers must send "Authorization: Bearer <token>".
+# While this is None the endpoint answers 401 to every request; set a secret
+# token per deployment to enable scraping.
+METRICS_TOKEN = None
@@ -0,0 +1,111 @@
+# config/testing.py
+"""Query guards for the API test suites.
+
+``APITestCase`` is DRF's with a test client that records every SQL statement
+a request runs. When one request runs the same statement shape (the SQL with
+its parameters left out and ``IN (...)`` lists collapsed) ``REPEAT_LIMIT``
+times or more, the request fails with the shape and the stack that issued
+the repeat: the mark of an N+1, such as a serializer reaching through a
+relation the queryset did not ``select_related``. Tests that repeat a query
+on purpose (keyset batches, say) opt out with ``@allow_repeated_queries``.
+
+``assertMaxQueries(n)`` is ``assertNumQueries`` with ``n`` as a budget
+rather than an exact count.
+"""
+import functools
+import re
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework.test import APITestCase as BaseAPITestCase
+
+REPEAT_LIMIT = 2
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+IGNORED = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+PROJECT = str(Path(settings.BASE_DIR))
+
+
+def query_shape(sql):
+    return IN_LIST.sub("IN (...)", sql)
+
+
+def _project_stack():
+    """The caller's stack limited to project code, innermost last."""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(PROJECT)
+        and "site-packages" not in frame.filename
+        and not frame.filename.endswith(("manage.py", "config/testing.py", "config/metrics.py"))
+    ]
+    return "".join(traceback.format_list(frames))
+
+
+class QueryRecorder:
+    """``execute_wrapper`` counting statement shapes and keeping the stack of each repeat."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(IGNORED):
+            shape = query_shape(sql)
+            self.counts[shape] += 1
+            if self.counts[shape] == 2:
+                self.stacks[shape] = _project_stack()
+        return execute(sql, params, many, context)
+
+    def repeats(self, limit):
+        return {shape: n for shape, n in self.counts.items() if n >= limit}
+
+
+class RepeatedQueryError(AssertionError):
+    pass
+
+
+class QueryGuardClient(APIClient):
+    repeat_limit = REPEAT_LIMIT
+
+    def request(self, **kwargs):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = super().request(**kwargs)
+        repeats = recorder.repeats(self.repeat_limit) if self.repeat_limit else {}
+        if repeats:
+            shape, count = max(repeats.items(), key=lambda item: item[1])
+            raise RepeatedQueryError(
+                f"{kwargs.get('REQUEST_METHOD')} {kwargs.get('PATH_INFO')} ran the same query "
+                f"{count} times (N+1?):\n  {shape}\nRepeated from:\n{recorder.stacks[shape]}"
+            )
+        return response
+
+
+def allow_repeated_queries(test):
+    """Let ``test`` run requests that repeat a query shape."""
+
+    @functools.wraps(test)
+    def wrapper(self, *args, **kwargs):
+        self.client.repeat_limit = None
+        return test(self, *args, **kwargs)
+
+    return wrapper
+
+
+class APITestCase(BaseAPITestCase):
+    client_class = QueryGuardClient
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as captured:
+            yield captured
+        if len(captured) > budget:
+            queries = "\n".join(f"{n}. {query['sql']}" for n, query in enumerate(captured, 1))
+            self.fail(f"{len(captured)} queries ran, over the budget of {budget}:\n{queries}")
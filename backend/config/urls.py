@@ -1,21 +1,21 @@
 from django.contrib import admin
 from django.http import JsonResponse
 from django.urls import path, include
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from users.views import MeView  # new
+from rest_framework_simplejwt.views import TokenRefreshView
+from config.metrics import health_view, metrics_view
+from users.login import token_obtain_view
+from training.async_reads import selected as async_selected
+from users.views import MeView, async_me_view
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
 
-def health(_):
-    return JsonResponse({"status": "ok"})
-
-
 def api_root(_):
     return JsonResponse({
         "message": "Welcome to Gym Fullstack API!",
         "version": "1.0.0",
         "endpoints": {
             "health": "/api/health",
+            "metrics": "/api/metrics",
             "admin": "/admin/",
             "swagger": "/api/swagger/",
             "redoc": "/api/redoc/",
@@ -40,10 +40,11 @@ urlpatterns = [
     path("api/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
     
     # API Endpoints
-    path("api/health", health),
-    path("api/auth/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    path("api/health", health_view),
+    path("api/metrics", metrics_view),
+    path("api/auth/token/", token_obtain_view, name="token_obtain_pair"),
     path("api/auth/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
-    path("api/me", MeView.as_view(), name="me"),
+    path("api/me", async_me_view if async_selected("me") else MeView.as_view(), name="me"),
     path("api/training/", include("training.urls")),
     path("api/users/", include("users.urls")),
 ]
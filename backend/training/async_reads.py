@@ -0,0 +1,227 @@
+# training/async_reads.py
+"""Async ``list`` endpoints for ASGI deployments.
+
+``async_list(ViewSet, basename)`` serves ``GET`` on a viewset's list route
+from an ``async def`` view: authentication, scope lookup, the conditional-GET
+aggregate, pagination and the row fetch all use Django's async ORM
+(``afirst``, ``aaggregate``, ``aiterator``; keyset pages skip the
+aggregate), while filtering, permissions and
+serialization reuse the viewset's own (database-free) code. Cached
+viewsets take the same build lock on a miss as ``ResponseCacheMixin.list``.
+Other methods on the route, and list modes the viewset flags in
+``sync_list_params``, are handed to the regular sync viewset.
+
+Routes opt in through ``settings.ASYNC_READ_ROUTES`` (basenames, plus "me"),
+read once when the URLconf loads; ``async_list_paths`` returns nothing for
+routes left out, so the router's sync views keep serving them. Under WSGI
+each async view runs in its own event loop, so only enable this with
+``config.asgi``.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.db.models import Count, Max
+from django.urls import path
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from .conditional import ConditionalGetMixin, _etag, page_version, wants_cursor
+from .pagination import CountedPaginator, KeysetPagination
+from .response_cache import LOCK_TIMEOUT, ResponseCacheMixin, _cache, _count
+from .scope import scope_for
+
+READ_METHODS = ("GET", "HEAD")
+
+
+def selected(route):
+    return route in settings.ASYNC_READ_ROUTES
+
+
+async def authenticate(request):
+    """Run DRF-style authentication on ``request`` (a DRF ``Request``) without blocking.
+
+    Authenticators with an ``aauthenticate`` coroutine are awaited; others run
+    in a worker thread.
+    """
+    for authenticator in request.authenticators:
+        try:
+            if hasattr(authenticator, "aauthenticate"):
+                result = await authenticator.aauthenticate(request._request)
+            else:
+                result = await sync_to_async(authenticator.authenticate)(request)
+        except exceptions.APIException:
+            request._not_authenticated()
+            raise
+        if result is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = result
+            return
+    request._not_authenticated()
+
+
+async def _rows(queryset):
+    return [row async for row in queryset.aiterator()]
+
+
+async def _paginate(view, queryset):
+    """``view.paginator.paginate_queryset`` with the rows fetched asynchronously."""
+    paginator, request = view.paginator, view.request
+    if paginator is None:
+        return None
+    if isinstance(paginator, KeysetPagination):
+        paginator.cursor_mode = paginator.wants_cursor(request)
+        if paginator.cursor_mode:
+            window = paginator.cursor_window(queryset, request)
+            return None if window is None else paginator.cursor_page(await _rows(window))
+
+    if not isinstance(paginator, PageNumberPagination):
+        raise TypeError(f"{type(paginator).__name__} has no async variant")
+    paginator.request = request
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+    count = getattr(view, "known_count", None)
+    if count is None:
+        count = await queryset.acount()
+    django_paginator = CountedPaginator(queryset, page_size, count=count)
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise exceptions.NotFound(
+            paginator.invalid_page_message.format(page_number=page_number, message=str(exc))
+        )
+    page.object_list = await _rows(page.object_list)
+    if paginator.template is not None and django_paginator.num_pages > 1:
+        paginator.display_page_controls = True
+    paginator.page = page
+    return list(page)
+
+
+def _page_response(view, page):
+    return view.get_paginated_response(view.get_serializer(page, many=True).data)
+
+
+async def _list(view, queryset):
+    page = await _paginate(view, queryset)
+    if page is not None:
+        return _page_response(view, page)
+    return Response(view.get_serializer(await _rows(queryset), many=True).data)
+
+
+async def _conditional_list(view, queryset):
+    request = view.request
+    page = await _paginate(view, queryset) if wants_cursor(view) else None
+    if page is not None:
+        etag, last = page_version(view, page)
+        return view._conditional(request, etag, last, lambda: _page_response(view, page))
+    version = await queryset.order_by().aaggregate(
+        count=Count("pk"), last=Max(view.version_field)
+    )
+    view.known_count = version["count"]
+    etag = _etag(request, version["count"], version["last"])
+    timestamp = int(version["last"].timestamp()) if version["last"] else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    return view._stamp(not_modified or await _list(view, queryset), etag, timestamp)
+
+
+async def _respond(view, queryset):
+    if isinstance(view, ResponseCacheMixin):
+        # ResponseCacheMixin.list with awaited cache calls: the first miss
+        # takes the lock, concurrent ones wait for its entry.
+        cache = _cache()
+        key = await view._acache_key(view.request)
+        entry = await cache.aget(key)
+        if entry is None:
+            if await cache.aadd(f"{key}:lock", 1, LOCK_TIMEOUT):
+                _count(view.cache_namespace, "miss")
+                # finalize_response stores the rendered page under this key
+                # and releases the lock.
+                view._cache_store = key
+            else:
+                entry = await view._await_for(cache, key)
+                if entry is None:
+                    _count(view.cache_namespace, "miss")
+        else:
+            _count(view.cache_namespace, "hit")
+        if entry is not None:
+            return view._from_entry(view.request, entry)
+    if isinstance(view, ConditionalGetMixin):
+        return await _conditional_list(view, queryset)
+    return await _list(view, queryset)
+
+
+def async_get(view_class, respond, sync_view, sync_params=(), **initkwargs):
+    """An async view running ``await respond(view)`` for reads, ``sync_view`` otherwise.
+
+    Reads carrying any of ``sync_params`` in the query string also go to
+    ``sync_view``. Mirrors ``APIView.dispatch``: authentication is awaited
+    first, so the ``initial()`` checks (negotiation, permissions, throttles)
+    find the user already set and touch no database.
+    """
+
+    async def view(request, *args, **kwargs):
+        if request.method not in READ_METHODS or any(name in request.GET for name in sync_params):
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+        self = view_class(**initkwargs)
+        self.args, self.kwargs = args, kwargs
+        self.headers = self.default_response_headers
+        drf_request = self.initialize_request(request, *args, **kwargs)
+        self.request = drf_request
+        try:
+            await authenticate(drf_request)
+            self.initial(drf_request, *args, **kwargs)
+            response = await respond(self)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        # Renders (and, for cached viewsets, stores) like the sync dispatch;
+        # storing writes to the cache, so that runs off the event loop.
+        if getattr(self, "_cache_store", None) is None:
+            response = self.finalize_response(drf_request, response, *args, **kwargs)
+        else:
+            response = await sync_to_async(self.finalize_response)(
+                drf_request, response, *args, **kwargs
+            )
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    view.cls = view_class
+    view.initkwargs = initkwargs
+    return csrf_exempt(view)
+
+
+def async_list(viewset_class, basename, actions=None):
+    """An async view for the list route of ``viewset_class``.
+
+    List modes of the viewset's own ``list`` switched on by a query parameter
+    (``sync_list_params`` on the viewset) are served by the sync view.
+    """
+    actions = actions or {"get": "list", "post": "create"}
+
+    async def respond(view):
+        # Resolve the caller's scope up front; get_queryset then runs no queries.
+        await scope_for(view.request).aload()
+        return await _respond(view, view.filter_queryset(view.get_queryset()))
+
+    return async_get(
+        viewset_class,
+        respond,
+        viewset_class.as_view(actions, basename=basename, detail=False),
+        sync_params=getattr(viewset_class, "sync_list_params", ()),
+        basename=basename,
+        detail=False,
+        action="list",
+        action_map=actions,
+    )
+
+
+def async_list_paths(route, viewset_class, basename):
+    """``[path(...)]`` serving ``route`` asynchronously if ``basename`` is selected."""
+    if not selected(basename):
+        return []
+    return [path(route, async_list(viewset_class, basename), name=f"{basename}-list")]
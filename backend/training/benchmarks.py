@@ -0,0 +1,159 @@
+# training/benchmarks.py
+"""Payroll computation time, and async vs sync list endpoints under load.
+
+Not collected by the default test run; invoke explicitly::
+
+    python manage.py test training.benchmarks
+
+``AsyncReadBenchmark`` fires ``CONNECTIONS`` concurrent session-list
+requests at the async view (one event loop) and at the sync viewset (a
+``SYNC_WORKERS`` thread pool, like a threaded WSGI server), then prints
+requests/second and p50/p95/p99 for both. Latencies are timed from
+submission, queueing included; with the requests all in flight at once they
+mostly measure throughput, and the async p50 must stay within
+``ASYNC_P50_RATIO`` of the sync one.
+"""
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from users.models import MemberProfile, TrainerProfile
+from users.serializers import UserLoginSerializer
+from .async_reads import async_list
+from .models import TrainingSession
+from .payroll import compute_payroll
+from .views import TrainingSessionViewSet
+
+User = get_user_model()
+
+TRAINERS = 500
+SESSIONS_PER_TRAINER = 40
+BUDGET = 1.0  # seconds
+CONNECTIONS = 500
+SYNC_WORKERS = 8
+ASYNC_P50_RATIO = 2
+
+
+def _percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+class PayrollBenchmark(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        trainee = User.objects.create_user(username="bench-member", role="TRAINEE")
+        member = MemberProfile.objects.create(
+            user=trainee, membership_start_date=date(2025, 1, 1), membership_end_date=date(2030, 1, 1)
+        )
+        users = User.objects.bulk_create(
+            User(username=f"bench-trainer-{n}", role="TRAINER") for n in range(TRAINERS)
+        )
+        profiles = TrainerProfile.objects.bulk_create(
+            TrainerProfile(user=user, specialization="Bench", hourly_rate=Decimal("90.00"))
+            for user in users
+        )
+        first = timezone.make_aware(datetime(2025, 3, 1, 6))
+        types = [value for value, _ in TrainingSession.SESSION_TYPES]
+        sessions = []
+        for profile in profiles:
+            for n in range(SESSIONS_PER_TRAINER):
+                start = first + timedelta(hours=n * 17)
+                sessions.append(TrainingSession(
+                    trainer=profile, member=member, session_type=types[n % len(types)],
+                    scheduled_date=start, duration_minutes=60, ends_at=start + timedelta(minutes=60),
+                    price=Decimal("100.00"), status="completed",
+                ))
+        TrainingSession.objects.bulk_create(sessions, batch_size=2000)
+
+    def test_month_of_payroll(self):
+        for basis in ("hourly", "commission"):
+            started = time.perf_counter()
+            payroll = compute_payroll(date(2025, 3, 1), date(2025, 4, 1), basis, Decimal("0.4"))
+            elapsed = time.perf_counter() - started
+            print(f"\npayroll {basis}: {len(payroll['trainers'])} trainers, "
+                  f"{payroll['totals']['sessions']} sessions in {elapsed * 1000:.1f}ms")
+            self.assertEqual(len(payroll["trainers"]), TRAINERS)
+            self.assertLess(elapsed, BUDGET)
+
+
+class AsyncReadBenchmark(TransactionTestCase):
+    def setUp(self):
+        trainer = User.objects.create_user(username="bench-trainer", role="TRAINER")
+        trainee = User.objects.create_user(username="bench-member", role="TRAINEE")
+        profile = TrainerProfile.objects.create(user=trainer, specialization="Bench")
+        member = MemberProfile.objects.create(
+            user=trainee, membership_start_date=date(2025, 1, 1), membership_end_date=date(2030, 1, 1)
+        )
+        start = timezone.now()
+        TrainingSession.objects.bulk_create(
+            TrainingSession(
+                trainer=profile, member=member, session_type="personal",
+                scheduled_date=start + timedelta(hours=n), ends_at=start + timedelta(hours=n, minutes=60),
+                duration_minutes=60, price=Decimal("100.00"),
+            )
+            for n in range(200)
+        )
+        self.auth = f"Bearer {UserLoginSerializer.get_token(trainer).access_token}"
+        self.path = "/api/training/sessions/"
+
+    def _report(self, label, samples, elapsed):
+        print(f"{label:<5} {CONNECTIONS / elapsed:8.0f} req/s "
+              + " ".join(f"{k}={v:.1f}ms" for k, v in _percentiles(samples).items()))
+
+    def _run_sync(self):
+        view = TrainingSessionViewSet.as_view({"get": "list"}, basename="session", detail=False)
+        factory = RequestFactory()
+
+        def one(submitted):
+            # Timed from submission, so time queued for a worker counts, as
+            # it does for the coroutines waiting on the event loop.
+            try:
+                response = view(factory.get(self.path, HTTP_AUTHORIZATION=self.auth))
+                response.render()
+                return response.status_code, (time.perf_counter() - submitted) * 1000
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+            futures = [pool.submit(one, time.perf_counter()) for _ in range(CONNECTIONS)]
+            results = [future.result() for future in futures]
+        return results, time.perf_counter() - started
+
+    async def _run_async(self):
+        view = async_list(TrainingSessionViewSet, "session")
+        factory = AsyncRequestFactory()
+
+        async def one():
+            started = time.perf_counter()
+            response = await view(factory.get(self.path, headers={"Authorization": self.auth}))
+            return response.status_code, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(CONNECTIONS)))
+        return results, time.perf_counter() - started
+
+    def test_session_list_under_load(self):
+        print()
+        p50 = {}
+        for label, (results, elapsed) in (
+            ("sync", self._run_sync()),
+            ("async", asyncio.run(self._run_async())),
+        ):
+            self.assertTrue(all(code == 200 for code, _ in results))
+            samples = [ms for _, ms in results]
+            self._report(label, samples, elapsed)
+            p50[label] = statistics.median(samples)
+        # Every request is submitted at once and both servers are CPU-bound,
+        # so latency is mostly queueing behind the others; the async view
+        # must not queue worse than the thread pool.
+        self.assertLess(p50["async"], ASYNC_P50_RATIO * p50["sync"])
@@ -0,0 +1,149 @@
+# training/calendar.py
+"""Merged, time-ordered feed of training sessions, lessons and series occurrences.
+
+Both tables are projected onto the same columns and combined with a single
+``UNION ALL`` ordered by ``(start_at, kind, item_id)``. Continuation seeks on
+that triple inside each branch, so every page is an index range scan on
+``scheduled_date`` / ``start`` (or the per-trainer / per-member variants once
+the caller's scope is applied). Recurring series are expanded in Python for
+the window only and merged into the page by the same key.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+
+from .models import Lesson, SessionSeries, TrainingSession
+from .recurrence import occurrence_rows
+from .scheduling import MAX_BOOKING
+
+FEED_SALT = "training.calendar.feed"
+
+
+def _session_rows(queryset):
+    return queryset.values(
+        kind=Value("session", output_field=CharField()),
+        item_id=F("id"),
+        start_at=F("scheduled_date"),
+        end_at=F("ends_at"),
+        trainer_user=F("trainer__user_id"),
+        trainee_user=F("member__user_id"),
+        trainer_username=F("trainer__user__username"),
+        trainee_username=F("member__user__username"),
+        state=F("status"),
+        category=F("session_type"),
+        place=Value("", output_field=CharField()),
+    )
+
+
+def _lesson_rows(queryset):
+    return queryset.values(
+        kind=Value("lesson", output_field=CharField()),
+        item_id=F("id"),
+        start_at=F("start"),
+        end_at=F("end"),
+        trainer_user=F("trainer_id"),
+        trainee_user=F("student__user_id"),
+        trainer_username=F("trainer__username"),
+        trainee_username=F("student__user__username"),
+        state=Case(
+            When(is_completed=True, then=Value("completed")),
+            default=Value("scheduled"),
+            output_field=CharField(),
+        ),
+        category=Value("lesson", output_field=CharField()),
+        place=F("location"),
+    )
+
+
+def _after(kind, start_field, cursor):
+    """Rows of branch ``kind`` that sort after ``cursor`` = (start, kind, id)."""
+    start, cursor_kind, cursor_id = cursor
+    if kind > cursor_kind:
+        return Q(**{f"{start_field}__gte": start})
+    if kind < cursor_kind:
+        return Q(**{f"{start_field}__gt": start})
+    return Q(**{f"{start_field}__gt": start}) | Q(**{start_field: start, "id__gt": cursor_id})
+
+
+def calendar_items(scope, start, end, cursor=None, limit=None):
+    """Sessions, lessons and series occurrences overlapping ``[start, end)``."""
+    # MAX_BOOKING bounds the start column from below so the scan stays a range.
+    sessions = scope.filter(TrainingSession.objects.order_by()).filter(
+        scheduled_date__gt=start - MAX_BOOKING, scheduled_date__lt=end, ends_at__gt=start
+    )
+    lessons = scope.filter(Lesson.objects.order_by()).filter(
+        start__gt=start - MAX_BOOKING, start__lt=end, end__gt=start
+    )
+    if cursor is not None:
+        sessions = sessions.filter(_after("session", "scheduled_date", cursor))
+        lessons = lessons.filter(_after("lesson", "start", cursor))
+    combined = _session_rows(sessions).union(_lesson_rows(lessons), all=True)
+    combined = combined.order_by("start_at", "kind", "item_id")
+    if limit is not None:
+        combined = combined[:limit]
+    rows = [_normalise(row) for row in combined]
+
+    # Recurring series are expanded for the window and merged in.
+    virtual = occurrence_rows(scope.filter(SessionSeries.objects.order_by()), start, end)
+    if cursor is not None:
+        virtual = [row for row in virtual if _sort_key(row) > cursor]
+    if virtual:
+        rows = sorted(rows + virtual, key=_sort_key)
+        if limit is not None:
+            rows = rows[:limit]
+    return rows
+
+
+def _sort_key(row):
+    return (row["start_at"], row["kind"], row["item_id"])
+
+
+def _normalise(row):
+    # Some backends hand back UNION'd datetimes as strings.
+    for name in ("start_at", "end_at"):
+        if isinstance(row[name], str):
+            row[name] = parse_datetime(row[name])
+    return row
+
+
+def encode_cursor(row):
+    token = json.dumps([row["start_at"].isoformat(), row["kind"], row["item_id"]])
+    return urlsafe_b64encode(token.encode("ascii")).decode("ascii")
+
+
+def decode_cursor(encoded):
+    try:
+        start, kind, item_id = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+        start = datetime.fromisoformat(start)
+        if start.tzinfo is None:
+            raise ValueError(start)
+        if kind not in ("lesson", "occurrence", "session"):
+            raise ValueError(kind)
+        return start, kind, int(item_id)
+    except (TypeError, ValueError, UnicodeError, BinasciiError):
+        raise NotFound("Invalid cursor")
+
+
+def feed_token(user_id, version):
+    """Signed token that identifies a user in an .ics feed URL.
+
+    Calendar clients poll a subscribed URL for as long as it works, so the
+    token has no ``max_age``. It carries the user's ``calendar_feed_version``
+    instead, and rotating that version revokes every URL issued before.
+    """
+    return signing.dumps({"u": user_id, "v": version}, salt=FEED_SALT, compress=True)
+
+
+def feed_claims(token):
+    """``(user_id, version)`` from a feed token, or ``None`` if it is not valid."""
+    try:
+        claims = signing.loads(token, salt=FEED_SALT)
+        return int(claims["u"]), int(claims["v"])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
@@ -0,0 +1,112 @@
+# training/conditional.py
+"""Conditional GET (ETag / Last-Modified) for viewsets over ``updated_at`` models.
+
+A page-number list's version is ``(count, max(updated_at))`` over the same
+filtered, scoped queryset the list would serialize, read with one aggregate
+query that the paginator reuses as its count (``(scope, updated_at)``
+indexes keep it off the table). A keyset (cursor) page is versioned by the
+rows it holds instead: their ids and ``updated_at`` plus the page links,
+all taken from the one query that fetches the page, so deep pages never
+aggregate the whole queryset. A detail's version is the object's own
+``updated_at``. Versions are hashed with the caller's identity and the
+request URL into a weak ETag, and a matching ``If-None-Match`` /
+``If-Modified-Since`` is answered with 304 before anything is serialized.
+
+Limitation, visible to API clients: the version only covers the listed
+model's own rows. A change that only touches a related row shown in the
+response (for example a renamed trainer in ``trainer_name``) keeps the old
+ETag until the row itself is saved again, so clients that must see such
+changes at once should not send ``If-None-Match``. Deletions are caught by
+the count (or the page's ids) in the ETag; ``Last-Modified`` alone cannot
+see them.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .pagination import KeysetPagination
+
+
+def _etag(request, *parts):
+    user = request.user
+    key = "|".join(
+        str(part)
+        for part in (
+            request.get_full_path(),
+            getattr(request, "accepted_media_type", ""),
+            user.pk,
+            getattr(user, "role", None),
+            *parts,
+        )
+    )
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+def wants_cursor(view):
+    """Whether ``view`` will serve this request as a keyset page."""
+    paginator = view.paginator
+    return isinstance(paginator, KeysetPagination) and paginator.wants_cursor(view.request)
+
+
+def page_version(view, page):
+    """ETag and last modification of a keyset page, from its rows and links alone."""
+    stamps = [(row.pk, getattr(row, view.version_field)) for row in page]
+    last = max((stamp for _, stamp in stamps if stamp is not None), default=None)
+    links = (view.paginator.get_next_link(), view.paginator.get_previous_link())
+    return _etag(view.request, *links, *stamps), last
+
+
+class ConditionalGetMixin:
+    """Answer unchanged ``list`` / ``retrieve`` requests with 304 Not Modified."""
+
+    version_field = "updated_at"
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset) if wants_cursor(self) else None
+        if page is not None:
+            etag, last = page_version(self, page)
+            return self._conditional(
+                request, etag, last,
+                lambda: self.get_paginated_response(self.get_serializer(page, many=True).data),
+            )
+        version = queryset.order_by().aggregate(
+            count=Count("pk"), last=Max(self.version_field)
+        )
+        # Page-number pagination reuses this instead of its own COUNT(*).
+        self.known_count = version["count"]
+        return self._conditional(
+            request,
+            _etag(request, version["count"], version["last"]),
+            version["last"],
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last = getattr(instance, self.version_field)
+        return self._conditional(
+            request,
+            _etag(request, last),
+            last,
+            lambda: Response(self.get_serializer(instance).data),
+        )
+
+    def _conditional(self, request, etag, last_modified, respond):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        return self._stamp(not_modified or respond(), etag, timestamp)
+
+    def _stamp(self, response, etag, timestamp):
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+            # Let browsers keep the body but revalidate on every use.
+            response["Cache-Control"] = "private, no-cache"
+        return response
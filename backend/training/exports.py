@@ -0,0 +1,87 @@
+# training/exports.py
+"""Streaming CSV / NDJSON exports of list endpoints.
+
+Rows are read as tuples with ``values_list`` (no model instances) in
+primary-key keyset batches of ``EXPORT_CHUNK_SIZE``, encoded and handed to
+``StreamingHttpResponse`` one batch at a time. Each batch is a fresh
+``WHERE id > last ORDER BY id LIMIT n`` query, so memory stays flat on every
+backend, including MySQL, whose driver buffers whole result sets.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import action
+
+from config.replicas import force_replica
+
+from .renderers import CSVRenderer, NDJSONRenderer
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, lookups, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield ``values_list`` tuples of ``queryset`` in primary-key order."""
+    queryset = queryset.order_by("pk").values_list("pk", *lookups)
+    last = None
+    while True:
+        batch = queryset if last is None else queryset.filter(pk__gt=last)
+        rows = list(batch[:chunk_size])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][0]
+
+
+def encode_csv(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def encode_ndjson(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson}
+
+
+class ExportMixin:
+    """Adds ``GET <list>/export/?format=csv|ndjson`` to a viewset.
+
+    ``export_columns`` is a sequence of ``(header, lookup)`` pairs. The export
+    applies the viewset's filter backends and role scope, but not pagination,
+    and reads from a read replica when one is configured.
+    """
+
+    export_columns = ()
+
+    @force_replica
+    @action(detail=False, methods=["get"], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        fmt = request.accepted_renderer.format
+        headers = [header for header, _ in self.export_columns]
+        rows = export_rows(
+            self.filter_queryset(self.get_queryset()),
+            [lookup for _, lookup in self.export_columns],
+        )
+        response = StreamingHttpResponse(
+            ENCODERS[fmt](headers, rows),
+            content_type=f"{request.accepted_renderer.media_type}; charset=utf-8",
+        )
+        name = self.basename or "export"
+        stamp = timezone.localdate().strftime("%Y%m%d")
+        response["Content-Disposition"] = f'attachment; filename="{name}s-{stamp}.{fmt}"'
+        return response
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from training.payroll import compute_payroll, payroll_options
+from training.reports import report_range
+
+
+class Command(BaseCommand):
+    help = "Compute trainer payroll from completed sessions for a pay period (this month by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="from", help="First day of the period (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="to", help="Day after the period ends (YYYY-MM-DD)")
+        parser.add_argument("--basis", choices=["hourly", "commission"])
+        parser.add_argument("--commission", help="Fraction of session price paid on the commission basis")
+        parser.add_argument("--json", action="store_true", help="Print the full result as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            start, end = report_range(options, period="month")
+            basis, commission = payroll_options(options)
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+        payroll = compute_payroll(start, end, basis, commission)
+
+        if options["json"]:
+            self.stdout.write(json.dumps({"from": str(start), "to": str(end), **payroll}, indent=2))
+            return
+        self.stdout.write(f"Payroll {start} to {end} ({basis})")
+        for row in payroll["trainers"]:
+            self.stdout.write(
+                f"{row['username']:<24} {row['hours']:>8}h {row['sessions']:>5} sessions "
+                f"{row['earnings']:>12}"
+            )
+        totals = payroll["totals"]
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(payroll['trainers'])} trainer(s), {totals['hours']}h, "
+            f"{totals['sessions']} sessions, {totals['earnings']} total"
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from training import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily session and payment rollups behind /api/training/dashboard/"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        sessions, payments = rollups.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {sessions} session rollup rows and {payments} payment rollup rows."
+            )
+        )
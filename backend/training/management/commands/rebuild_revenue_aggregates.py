@@ -0,0 +1,63 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from training import rollups
+from training.models import Payment, TrainingSession
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily rollups behind /api/training/reports/revenue/ "
+        "for a date range, one chunk of days at a time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="First day (YYYY-MM-DD); defaults to the oldest row")
+        parser.add_argument("--to", dest="end", help="Day after the last one (YYYY-MM-DD); defaults to past the newest row")
+        parser.add_argument("--chunk-days", type=int, default=31)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = self._date(options["start"], "--from")
+        end = self._date(options["end"], "--to")
+        if start is None or end is None:
+            first, last = self._extent()
+            if first is None:
+                self.stdout.write("No sessions or payments to aggregate.")
+                return
+            start = start or first
+            end = end or date.fromordinal(last.toordinal() + 1)
+        if end <= start:
+            raise CommandError("--to must be after --from.")
+
+        chunks = 0
+        for chunk_start, chunk_end in rollups.rebuild_range(
+            start, end, chunk_days=options["chunk_days"], batch_size=options["batch_size"]
+        ):
+            chunks += 1
+            self.stdout.write(f"Rebuilt {chunk_start} to {chunk_end}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {chunks} chunk(s) from {start} to {end}."))
+
+    def _date(self, raw, flag):
+        if raw is None:
+            return None
+        try:
+            value = parse_date(raw)
+        except ValueError:
+            value = None
+        if value is None:
+            raise CommandError(f"{flag} must be a date (YYYY-MM-DD).")
+        return value
+
+    def _extent(self):
+        sessions = TrainingSession.objects.aggregate(first=Min("scheduled_date"), last=Max("scheduled_date"))
+        payments = Payment.objects.aggregate(first=Min("paid_at"), last=Max("paid_at"))
+        stamps = [value for value in (*sessions.values(), *payments.values()) if value is not None]
+        if not stamps:
+            return None, None
+        days = [timezone.localtime(stamp).date() for stamp in stamps]
+        return min(days), max(days)
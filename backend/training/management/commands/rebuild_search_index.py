@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from training import response_cache, search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ?search= token index for all rows (or only the given kinds)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kinds", nargs="*", metavar="kind", help=f"Any of: {', '.join(search.SPECS)}")
+        parser.add_argument("--batch-size", type=int, default=search.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        unknown = set(options["kinds"]) - set(search.SPECS)
+        if unknown:
+            raise CommandError(f"Unknown kind(s): {', '.join(sorted(unknown))}")
+        totals = {}
+        for kind, rows in search.rebuild(options["kinds"] or None, batch_size=options["batch_size"]):
+            totals[kind] = totals.get(kind, 0) + rows
+        if "machine" in totals:
+            # Machine lists are cached as rendered responses, searches included.
+            response_cache.invalidate("machines")
+        summary = ", ".join(f"{rows} {kind}" for kind, rows in totals.items()) or "nothing"
+        self.stdout.write(self.style.SUCCESS(f"Indexed {summary}."))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0003_machine_plan'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['paid_at'], name='training_pa_paid_at_4a0292_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['student', 'paid_at'], name='training_pa_student_9948ec_idx'),
+        ),
+    ]
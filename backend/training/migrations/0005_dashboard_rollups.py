@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    db = schema_editor.connection.alias
+    DailyPaymentStat = apps.get_model('training', 'DailyPaymentStat')
+    DailySessionStat = apps.get_model('training', 'DailySessionStat')
+    Payment = apps.get_model('training', 'Payment')
+    TrainingSession = apps.get_model('training', 'TrainingSession')
+    sessions = (
+        TrainingSession.objects.using(db).order_by()
+        .values('trainer_id', 'session_type', 'status', day=TruncDate('scheduled_date'))
+        .annotate(session_count=Count('id'), revenue=Sum('price'))
+    )
+    DailySessionStat.objects.using(db).bulk_create(
+        (DailySessionStat(**row) for row in sessions.iterator()), batch_size=1000,
+    )
+    payments = (
+        Payment.objects.using(db).order_by()
+        .values('method', day=TruncDate('paid_at'), trainer_id=F('student__user__trainer_id'))
+        .annotate(payment_count=Count('id'), amount=Sum('amount_ils'))
+    )
+    DailyPaymentStat.objects.using(db).bulk_create(
+        (DailyPaymentStat(**row) for row in payments.iterator()), batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0004_payment_indexes'),
+        ('users', '0002_alter_user_role_memberprofile_trainerprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPaymentStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('method', models.CharField(choices=[('CASH', 'Cash'), ('CARD', 'Card'), ('TRANSFER', 'Transfer')], max_length=32)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('trainer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_payment_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'trainer', 'method'], name='training_da_day_5ee259_idx'), models.Index(fields=['trainer', 'day'], name='training_da_trainer_22b8a9_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySessionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('session_type', models.CharField(choices=[('personal', 'Personal'), ('group', 'Group'), ('class', 'Class')], max_length=16)),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=16)),
+                ('session_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_session_stats', to='users.trainerprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'trainer', 'session_type', 'status'], name='training_da_day_9ae8c0_idx'), models.Index(fields=['trainer', 'day'], name='training_da_trainer_389a16_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
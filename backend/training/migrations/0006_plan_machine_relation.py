@@ -0,0 +1,87 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def split_machine_ids(apps, schema_editor):
+    """Turn each plan's comma-separated ``machines`` string into PlanMachine rows."""
+    db = schema_editor.connection.alias
+    Machine = apps.get_model('training', 'Machine')
+    Plan = apps.get_model('training', 'Plan')
+    PlanMachine = apps.get_model('training', 'PlanMachine')
+    known = set(Machine.objects.using(db).values_list('id', flat=True))
+    rows = []
+    plans = Plan.objects.using(db).order_by('id').values_list('id', 'machines')
+    for plan_id, raw in plans.iterator(chunk_size=BATCH_SIZE):
+        position = 0
+        for token in (raw or '').split(','):
+            token = token.strip()
+            if token.isdigit() and int(token) in known:
+                rows.append(PlanMachine(plan_id=plan_id, machine_id=int(token), position=position))
+                position += 1
+        if len(rows) >= BATCH_SIZE:
+            PlanMachine.objects.using(db).bulk_create(rows)
+            rows = []
+    PlanMachine.objects.using(db).bulk_create(rows)
+
+
+def join_machine_ids(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Plan = apps.get_model('training', 'Plan')
+    PlanMachine = apps.get_model('training', 'PlanMachine')
+    ids = {}
+    for plan_id, machine_id in PlanMachine.objects.using(db).order_by('plan', 'position').values_list('plan_id', 'machine_id'):
+        ids.setdefault(plan_id, []).append(str(machine_id))
+    for plan_id, machine_ids in ids.items():
+        Plan.objects.using(db).filter(pk=plan_id).update(machines=','.join(machine_ids))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0005_dashboard_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanMachine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('sets', models.IntegerField(blank=True, help_text="Defaults to the plan's sets", null=True)),
+                ('reps', models.IntegerField(blank=True, help_text="Defaults to the plan's reps", null=True)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plan_machines', to='training.machine')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plan_machines', to='training.plan')),
+            ],
+            options={
+                'ordering': ['plan', 'position'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='planmachine',
+            index=models.Index(fields=['machine', 'plan'], name='training_pl_machine_c47932_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='planmachine',
+            constraint=models.UniqueConstraint(fields=('plan', 'position'), name='uniq_plan_machine_position'),
+        ),
+        migrations.RunPython(split_machine_ids, join_machine_ids),
+        # Give the old column a default so the migration can be reversed.
+        migrations.AlterField(
+            model_name='plan',
+            name='machines',
+            field=models.CharField(default='', help_text='Comma-separated machine IDs', max_length=255),
+        ),
+        migrations.RemoveField(
+            model_name='plan',
+            name='machines',
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='machines',
+            field=models.ManyToManyField(related_name='plans', through='training.PlanMachine', to='training.machine'),
+        ),
+    ]
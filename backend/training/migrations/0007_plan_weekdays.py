@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:58
+
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def weekday_mask(days):
+    # Frozen copy of training.models.weekday_mask.
+    mask = 0
+    for token in re.split(r'[\s,;/|]+', (days or '').lower()):
+        if token in ('daily', 'everyday'):
+            return (1 << len(WEEKDAYS)) - 1
+        for index, name in enumerate(WEEKDAYS):
+            if len(token) >= 2 and (name.startswith(token) or token.startswith(name)):
+                mask |= 1 << index
+                break
+    return mask
+
+
+def backfill_weekdays(apps, schema_editor):
+    """Parse every plan's ``days`` text and store it as a bitmask, one UPDATE per mask."""
+    db = schema_editor.connection.alias
+    Plan = apps.get_model('training', 'Plan')
+    by_mask = {}
+    for plan_id, days in Plan.objects.using(db).order_by().values_list('id', 'days').iterator(chunk_size=BATCH_SIZE):
+        mask = weekday_mask(days)
+        if mask:
+            by_mask.setdefault(mask, []).append(plan_id)
+    for mask, ids in by_mask.items():
+        for start in range(0, len(ids), BATCH_SIZE):
+            Plan.objects.using(db).filter(pk__in=ids[start:start + BATCH_SIZE]).update(weekdays=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0006_plan_machine_relation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='weekdays',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False, help_text='Bitmask of days, Monday = 1'),
+        ),
+        migrations.RunPython(backfill_weekdays, migrations.RunPython.noop),
+    ]
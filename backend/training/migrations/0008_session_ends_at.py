@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def backfill_ends_at(apps, schema_editor):
+    db = schema_editor.connection.alias
+    TrainingSession = apps.get_model('training', 'TrainingSession')
+    batch = []
+    rows = TrainingSession.objects.using(db).order_by().only('id', 'scheduled_date', 'duration_minutes')
+    for session in rows.iterator(chunk_size=BATCH_SIZE):
+        session.ends_at = session.scheduled_date + timedelta(minutes=session.duration_minutes)
+        batch.append(session)
+        if len(batch) >= BATCH_SIZE:
+            TrainingSession.objects.using(db).bulk_update(batch, ['ends_at'])
+            batch = []
+    TrainingSession.objects.using(db).bulk_update(batch, ['ends_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0007_plan_weekdays'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingsession',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, help_text='scheduled_date + duration_minutes', null=True),
+        ),
+        migrations.RunPython(backfill_ends_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='trainingsession',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, help_text='scheduled_date + duration_minutes'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['start'], name='training_le_start_1e60f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingsession',
+            index=models.Index(fields=['scheduled_date'], name='training_tr_schedul_ad6c54_idx'),
+        ),
+    ]
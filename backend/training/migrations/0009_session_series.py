@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0008_session_ends_at'),
+        ('users', '0003_trainer_working_hours'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingsession',
+            name='occurrence_start',
+            field=models.DateTimeField(blank=True, help_text='Original slot of a materialized series occurrence', null=True),
+        ),
+        migrations.CreateModel(
+            name='SessionSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_type', models.CharField(choices=[('personal', 'Personal'), ('group', 'Group'), ('class', 'Class')], max_length=16)),
+                ('starts_at', models.DateTimeField(help_text='First occurrence; sets the time of day')),
+                ('duration_minutes', models.PositiveIntegerField()),
+                ('weekdays', models.PositiveSmallIntegerField(help_text='Bitmask of days, Monday = 1')),
+                ('until', models.DateField(help_text='Last day an occurrence may fall on')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session_series', to='users.memberprofile')),
+                ('trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session_series', to='users.trainerprofile')),
+            ],
+            options={
+                'ordering': ['-starts_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='trainingsession',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='exceptions', to='training.sessionseries'),
+        ),
+        migrations.AddConstraint(
+            model_name='trainingsession',
+            constraint=models.UniqueConstraint(fields=('series', 'occurrence_start'), name='uniq_series_occurrence'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionseries',
+            index=models.Index(fields=['trainer', 'until'], name='training_se_trainer_4b5625_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionseries',
+            index=models.Index(fields=['member', 'until'], name='training_se_member__776293_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionseries',
+            index=models.Index(fields=['until'], name='training_se_until_414ea0_idx'),
+        ),
+    ]
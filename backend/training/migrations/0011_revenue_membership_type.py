@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0010_row_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailypaymentstat',
+            name='membership_type',
+            field=models.CharField(blank=True, default='', help_text='Empty when the student has no membership', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='dailysessionstat',
+            name='membership_type',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+    ]
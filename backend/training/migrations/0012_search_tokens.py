@@ -0,0 +1,72 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:27
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of ``training.search.SPECS`` as of this migration: kind ->
+# (app label, model, {lookup: weight}).
+SPECS = {
+    'student': ('training', 'Student', {'user__username': 3, 'user__first_name': 2, 'user__last_name': 2}),
+    'member': ('users', 'MemberProfile', {
+        'user__username': 3, 'user__first_name': 2, 'user__last_name': 2,
+        'user__email': 1, 'membership_type': 1,
+    }),
+    'session': ('training', 'TrainingSession', {
+        'session_type': 2, 'status': 2, 'notes': 1,
+        'trainer__user__username': 2, 'member__user__username': 2,
+    }),
+    'plan': ('training', 'Plan', {'description': 1, 'trainee__username': 3}),
+    'machine': ('training', 'Machine', {'code': 3, 'name': 2, 'description': 1}),
+}
+TOKEN_RE = re.compile(r'\w+')
+BATCH_SIZE = 500
+
+
+def backfill_search_tokens(apps, schema_editor):
+    db = schema_editor.connection.alias
+    SearchToken = apps.get_model('training', 'SearchToken')
+    for kind, (app_label, model_name, fields) in SPECS.items():
+        model = apps.get_model(app_label, model_name)
+        lookups = list(fields)
+        tokens = []
+        rows = model.objects.using(db).order_by('pk').values_list('pk', *lookups)
+        for pk, *values in rows.iterator(chunk_size=BATCH_SIZE):
+            weights = {}
+            for lookup, value in zip(lookups, values):
+                for token in TOKEN_RE.findall(str(value or '').lower()):
+                    token = token[:64]
+                    weights[token] = max(weights.get(token, 0), fields[lookup])
+            tokens.extend(
+                SearchToken(kind=kind, object_id=pk, token=token, weight=weight)
+                for token, weight in weights.items()
+            )
+            if len(tokens) >= BATCH_SIZE:
+                SearchToken.objects.using(db).bulk_create(tokens, batch_size=BATCH_SIZE)
+                tokens = []
+        SearchToken.objects.using(db).bulk_create(tokens, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0011_revenue_membership_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'token', 'object_id'], name='training_se_kind_860372_idx'), models.Index(fields=['kind', 'object_id'], name='training_se_kind_570bea_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id', 'token'), name='uniq_search_token')],
+            },
+        ),
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+    ]
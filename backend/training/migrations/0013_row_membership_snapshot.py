@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:06
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_membership_type(apps, schema_editor):
+    db = schema_editor.connection.alias
+    MemberProfile = apps.get_model('users', 'MemberProfile')
+    Payment = apps.get_model('training', 'Payment')
+    TrainingSession = apps.get_model('training', 'TrainingSession')
+    TrainingSession.objects.using(db).update(membership_type=Coalesce(
+        Subquery(MemberProfile.objects.filter(pk=OuterRef('member_id')).values('membership_type')[:1]),
+        Value(''),
+    ))
+    Payment.objects.using(db).update(membership_type=Coalesce(
+        Subquery(
+            MemberProfile.objects.filter(user__student_profile=OuterRef('student_id'))
+            .values('membership_type')[:1]
+        ),
+        Value(''),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0012_search_tokens'),
+        ('users', '0004_member_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='membership_type',
+            field=models.CharField(blank=True, default='', editable=False, help_text="Payer's membership type when the payment was last saved", max_length=16),
+        ),
+        migrations.AddField(
+            model_name='trainingsession',
+            name='membership_type',
+            field=models.CharField(blank=True, default='', editable=False, help_text="Member's membership type when the session was last saved", max_length=16),
+        ),
+        migrations.RunPython(backfill_membership_type, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0013_row_membership_snapshot'),
+        ('users', '0005_calendar_feed_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['trainer', 'updated_at'], name='training_le_trainer_22f216_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['student', 'updated_at'], name='training_le_student_6594ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['updated_at'], name='training_le_updated_f1c0fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['updated_at'], name='training_ma_updated_012e32_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['student', 'updated_at'], name='training_pa_student_73d541_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['updated_at'], name='training_pa_updated_2106b4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['trainee', 'updated_at'], name='training_pl_trainee_b000a4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['updated_at'], name='training_pl_updated_c33b96_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['updated_at'], name='training_st_updated_587bcf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingsession',
+            index=models.Index(fields=['trainer', 'updated_at'], name='training_tr_trainer_e15289_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingsession',
+            index=models.Index(fields=['member', 'updated_at'], name='training_tr_member__5d2913_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingsession',
+            index=models.Index(fields=['updated_at'], name='training_tr_updated_e664ce_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:40
+
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def rebuild_rollups(apps, schema_editor):
+    """Re-derive the dashboard buckets now that rows carry ``membership_type``.
+
+    0011 added the column to the stat tables with a blank default and 0013
+    backfilled it on the rows, so the buckets from 0005 no longer match the
+    keys the signal handlers bump. Mirrors ``training.rollups.rebuild``.
+    """
+    db = schema_editor.connection.alias
+    DailyPaymentStat = apps.get_model('training', 'DailyPaymentStat')
+    DailySessionStat = apps.get_model('training', 'DailySessionStat')
+    Payment = apps.get_model('training', 'Payment')
+    TrainingSession = apps.get_model('training', 'TrainingSession')
+    DailySessionStat.objects.using(db).all().delete()
+    DailyPaymentStat.objects.using(db).all().delete()
+    sessions = (
+        TrainingSession.objects.using(db).order_by()
+        .values(
+            'trainer_id', 'session_type', 'status', 'membership_type',
+            day=TruncDate('scheduled_date'),
+        )
+        .annotate(session_count=Count('id'), revenue=Sum('price'))
+    )
+    DailySessionStat.objects.using(db).bulk_create(
+        (DailySessionStat(**row) for row in sessions.iterator()), batch_size=1000,
+    )
+    payments = (
+        Payment.objects.using(db).order_by()
+        .values(
+            'method', 'membership_type',
+            day=TruncDate('paid_at'), trainer_id=F('student__user__trainer_id'),
+        )
+        .annotate(payment_count=Count('id'), amount=Sum('amount_ils'))
+    )
+    DailyPaymentStat.objects.using(db).bulk_create(
+        (DailyPaymentStat(**row) for row in payments.iterator()), batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0014_version_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,17 @@
+import re
+from datetime import datetime, timedelta
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from users.models import MemberProfile
 
 User = settings.AUTH_USER_MODEL
 
+# Longest booking (session, lesson or series occurrence) the API accepts.
+MAX_BOOKING = timedelta(hours=24)
+
 
 class Machine(models.Model):
     """Gym equipment/machines"""
@@ -10,36 +19,107 @@ class Machine(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=["updated_at"])]
 
     def __str__(self):
         return f"{self.code} - {self.name}"
 
 
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+ALL_WEEKDAYS = (1 << len(WEEKDAYS)) - 1
+
+
+def weekday_mask(days):
+    """Parse free text like "Monday,Wednesday,Friday" or "mon/thu" into a bitmask.
+
+    Bit ``n`` is set for ``WEEKDAYS[n]`` (Monday is bit 0, as in ``date.weekday()``).
+    """
+    mask = 0
+    for token in re.split(r"[\s,;/|]+", (days or "").lower()):
+        if token in ("daily", "everyday"):
+            return ALL_WEEKDAYS
+        for index, name in enumerate(WEEKDAYS):
+            name = name.lower()
+            if len(token) >= 2 and (name.startswith(token) or token.startswith(name)):
+                mask |= 1 << index
+                break
+    return mask
+
+
+def masks_with_weekday(weekday):
+    """Every bitmask value that includes ``weekday`` (0 = Monday).
+
+    Filtering ``weekdays__in=`` this list lets the weekdays index answer
+    "who trains on day N" instead of evaluating ``weekdays & bit`` per row.
+    """
+    bit = 1 << weekday
+    return [mask for mask in range(ALL_WEEKDAYS + 1) if mask & bit]
+
+
 class Plan(models.Model):
     """Workout plans for trainees"""
     trainee = models.ForeignKey(User, on_delete=models.CASCADE, related_name="workout_plans")
     description = models.CharField(max_length=100)
-    machines = models.CharField(max_length=255, help_text="Comma-separated machine IDs")
+    machines = models.ManyToManyField(Machine, through="PlanMachine", related_name="plans")
     days = models.CharField(max_length=100, help_text="e.g., Monday,Wednesday,Friday")
+    weekdays = models.PositiveSmallIntegerField(
+        default=0, db_index=True, editable=False, help_text="Bitmask of days, Monday = 1"
+    )
     sets = models.IntegerField(default=3)
     reps = models.IntegerField(default=15)
     duration_minutes = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=["trainee", "updated_at"]),
+            models.Index(fields=["updated_at"]),
+        ]
 
     def __str__(self):
         return f"Plan for {self.trainee.username}: {self.description}"
 
+    def save(self, *args, **kwargs):
+        self.weekdays = weekday_mask(self.days)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "days" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "weekdays"}
+        super().save(*args, **kwargs)
+
+
+class PlanMachine(models.Model):
+    """A machine in a plan, in workout order, with optional per-machine volume"""
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name="plan_machines")
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name="plan_machines")
+    position = models.PositiveIntegerField(default=0)
+    sets = models.IntegerField(null=True, blank=True, help_text="Defaults to the plan's sets")
+    reps = models.IntegerField(null=True, blank=True, help_text="Defaults to the plan's reps")
+
+    class Meta:
+        ordering = ["plan", "position"]
+        constraints = [
+            models.UniqueConstraint(fields=["plan", "position"], name="uniq_plan_machine_position"),
+        ]
+        indexes = [models.Index(fields=["machine", "plan"])]
+
+    def __str__(self):
+        return f"{self.plan_id}#{self.position}: machine {self.machine_id}"
+
 
 class Student(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="student_profile")
     phone = models.CharField(max_length=30, blank=True)
     notes = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["updated_at"])]
 
     def __str__(self):
         return getattr(self.user, "username", "student")
@@ -52,20 +132,54 @@ class Lesson(models.Model):
     location = models.CharField(max_length=120, blank=True)
     is_completed = models.BooleanField(default=False)
     price_ils = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-start"]
-        indexes = [models.Index(fields=["trainer", "start"])]
+        indexes = [
+            models.Index(fields=["trainer", "start"]),
+            models.Index(fields=["start"]),
+            models.Index(fields=["trainer", "updated_at"]),
+            models.Index(fields=["student", "updated_at"]),
+            models.Index(fields=["updated_at"]),
+        ]
 
 class Payment(models.Model):
+    METHOD_CHOICES = [("CASH", "Cash"), ("CARD", "Card"), ("TRANSFER", "Transfer")]
+
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="payments")
     amount_ils = models.DecimalField(max_digits=8, decimal_places=2)
     paid_at = models.DateTimeField(auto_now_add=True)
-    method = models.CharField(max_length=32, choices=[("CASH","Cash"),("CARD","Card"),("TRANSFER","Transfer")])
+    method = models.CharField(max_length=32, choices=METHOD_CHOICES)
     note = models.CharField(max_length=140, blank=True)
+    membership_type = models.CharField(
+        max_length=16, blank=True, default="", editable=False,
+        help_text="Payer's membership type when the payment was last saved",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-paid_at"]
+        indexes = [
+            models.Index(fields=["paid_at"]),
+            models.Index(fields=["student", "paid_at"]),
+            models.Index(fields=["student", "updated_at"]),
+            models.Index(fields=["updated_at"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Revenue rollups bucket by this snapshot, so a later upgrade moves
+        # nothing already counted.
+        self.membership_type = (
+            MemberProfile.objects.filter(user__student_profile=self.student_id)
+            .values_list("membership_type", flat=True)
+            .first()
+            or ""
+        )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "membership_type"}
+        super().save(*args, **kwargs)
 
 
 class TrainingSession(models.Model):
@@ -93,9 +207,24 @@ class TrainingSession(models.Model):
     session_type = models.CharField(max_length=16, choices=SESSION_TYPES)
     scheduled_date = models.DateTimeField()
     duration_minutes = models.PositiveIntegerField()
+    ends_at = models.DateTimeField(editable=False, help_text="scheduled_date + duration_minutes")
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="scheduled")
     notes = models.TextField(blank=True)
     price = models.DecimalField(max_digits=8, decimal_places=2)
+    membership_type = models.CharField(
+        max_length=16, blank=True, default="", editable=False,
+        help_text="Member's membership type when the session was last saved",
+    )
+    series = models.ForeignKey(
+        "SessionSeries",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="exceptions",
+    )
+    occurrence_start = models.DateTimeField(
+        null=True, blank=True, help_text="Original slot of a materialized series occurrence"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -104,7 +233,167 @@ class TrainingSession(models.Model):
         indexes = [
             models.Index(fields=["trainer", "scheduled_date"]),
             models.Index(fields=["member", "scheduled_date"]),
+            models.Index(fields=["scheduled_date"]),
+            models.Index(fields=["trainer", "updated_at"]),
+            models.Index(fields=["member", "updated_at"]),
+            models.Index(fields=["updated_at"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["series", "occurrence_start"], name="uniq_series_occurrence"
+            ),
         ]
 
     def __str__(self):
         return f"Session({self.session_type}) on {self.scheduled_date:%Y-%m-%d}"
+
+    def save(self, *args, **kwargs):
+        self.ends_at = self.scheduled_date + timedelta(minutes=self.duration_minutes)
+        self.membership_type = (
+            MemberProfile.objects.filter(pk=self.member_id)
+            .values_list("membership_type", flat=True)
+            .first()
+            or ""
+        )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = {*update_fields, "membership_type"}
+            if {"scheduled_date", "duration_minutes"} & update_fields:
+                update_fields.add("ends_at")
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
+
+class SessionSeries(models.Model):
+    """Weekly recurring sessions; occurrences are expanded on read.
+
+    Only exceptions (moved, cancelled or completed occurrences) are stored, as
+    ``TrainingSession`` rows pointing back here with their ``occurrence_start``.
+    """
+    trainer = models.ForeignKey(
+        "users.TrainerProfile",
+        on_delete=models.CASCADE,
+        related_name="session_series",
+    )
+    member = models.ForeignKey(
+        "users.MemberProfile",
+        on_delete=models.CASCADE,
+        related_name="session_series",
+    )
+    session_type = models.CharField(max_length=16, choices=TrainingSession.SESSION_TYPES)
+    starts_at = models.DateTimeField(help_text="First occurrence; sets the time of day")
+    duration_minutes = models.PositiveIntegerField()
+    weekdays = models.PositiveSmallIntegerField(help_text="Bitmask of days, Monday = 1")
+    until = models.DateField(help_text="Last day an occurrence may fall on")
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-starts_at"]
+        indexes = [
+            models.Index(fields=["trainer", "until"]),
+            models.Index(fields=["member", "until"]),
+            models.Index(fields=["until"]),
+        ]
+
+    def __str__(self):
+        return f"SessionSeries({self.session_type}) from {self.starts_at:%Y-%m-%d}"
+
+    def occurrences(self, start, end):
+        """Aware start times of occurrences overlapping ``[start, end)``.
+
+        Only days inside the window are visited, so the cost is bounded by
+        the window rather than by the length of the series.
+        """
+        tz = timezone.get_current_timezone()
+        first = timezone.localtime(self.starts_at, tz)
+        length = timedelta(minutes=self.duration_minutes)
+        day = max(first.date(), timezone.localtime(start - length, tz).date())
+        last = min(self.until, timezone.localtime(end, tz).date())
+        while day <= last:
+            if self.weekdays & (1 << day.weekday()):
+                at = timezone.make_aware(datetime.combine(day, first.time()), tz)
+                if at >= self.starts_at and at < end and at + length > start:
+                    yield at
+            day += timedelta(days=1)
+
+    def is_occurrence(self, at):
+        return any(
+            occurrence == at
+            for occurrence in self.occurrences(at, at + timedelta(microseconds=1))
+        )
+
+
+class DailySessionStat(models.Model):
+    """Per-day session counts and value, maintained by training.rollups"""
+    day = models.DateField()
+    trainer = models.ForeignKey(
+        "users.TrainerProfile",
+        on_delete=models.CASCADE,
+        related_name="daily_session_stats",
+    )
+    session_type = models.CharField(max_length=16, choices=TrainingSession.SESSION_TYPES)
+    status = models.CharField(max_length=16, choices=TrainingSession.STATUS_CHOICES)
+    membership_type = models.CharField(max_length=16, blank=True, default="")
+    session_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["day", "trainer", "session_type", "status"]),
+            models.Index(fields=["trainer", "day"]),
+        ]
+
+    def __str__(self):
+        return f"DailySessionStat({self.day}, trainer={self.trainer_id})"
+
+
+class DailyPaymentStat(models.Model):
+    """Per-day payment totals keyed by the paying student's trainer"""
+    day = models.DateField()
+    trainer = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="daily_payment_stats",
+    )
+    method = models.CharField(max_length=32, choices=Payment.METHOD_CHOICES)
+    membership_type = models.CharField(
+        max_length=16, blank=True, default="", help_text="Empty when the student has no membership"
+    )
+    payment_count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["day", "trainer", "method"]),
+            models.Index(fields=["trainer", "day"]),
+        ]
+
+    def __str__(self):
+        return f"DailyPaymentStat({self.day}, trainer={self.trainer_id})"
+
+
+class SearchToken(models.Model):
+    """One word of an indexed row, maintained by training.search"""
+    kind = models.CharField(max_length=16)
+    object_id = models.PositiveBigIntegerField()
+    token = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "token", "object_id"]),
+            models.Index(fields=["kind", "object_id"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id", "token"], name="uniq_search_token"
+            ),
+        ]
+
+    def __str__(self):
+        return f"SearchToken({self.kind}:{self.object_id}, {self.token})"
@@ -0,0 +1,206 @@
+# training/pagination.py
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from decimal import Decimal
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CountedPaginator(Paginator):
+    """``Paginator`` that can be handed a row count instead of running ``COUNT(*)``."""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class CountedPagination(PageNumberPagination):
+    """Page-number pagination that reuses ``view.known_count`` when the view set one.
+
+    ``ConditionalGetMixin.list`` counts the filtered queryset for its ETag;
+    the paginator takes that number instead of counting again. Keyset pages
+    are not counted at all.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count = getattr(view, "known_count", None)
+        self.django_paginator_class = partial(CountedPaginator, count=count)
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(CountedPagination):
+    """Page-number pagination with an opt-in keyset (cursor) mode.
+
+    ``?pagination=cursor`` (or any ``?cursor=`` token) switches from
+    ``COUNT(*)`` + ``OFFSET`` to seeking on ``(<ordering field>, id)``, so deep
+    pages cost the same as the first one. The ordering field is whatever the
+    ``OrderingFilter`` left on the queryset, falling back to the model's
+    ``Meta.ordering``; ``id`` breaks ties in the same direction.
+    """
+
+    cursor_query_param = "cursor"
+    mode_query_param = "pagination"
+    invalid_cursor_message = "Invalid cursor"
+
+    def wants_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.wants_cursor(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        window = self.cursor_window(queryset, request)
+        if window is None:
+            return None
+        return self.cursor_page(list(window))
+
+    def cursor_window(self, queryset, request):
+        """The (unevaluated) slice holding the requested cursor page plus one row.
+
+        ``cursor_page`` turns the fetched rows into the page; the split lets
+        async views fetch the rows themselves.
+        """
+        self.request = request
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.page_query_param
+        )
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.ordering = self._get_ordering(queryset)
+        name = self.ordering.lstrip("-")
+        opts = queryset.model._meta
+        field = opts.pk if name == "pk" else opts.get_field(name)
+        cursor = self._decode_cursor(request, field)
+        reverse = bool(cursor and cursor["reverse"])
+
+        # Walk backwards through the ordering when following a "previous" link.
+        descending = self.ordering.startswith("-") != reverse
+        lookup = "lt" if descending else "gt"
+        if field.primary_key:
+            qs = queryset.order_by(f"-{name}" if descending else name)
+        else:
+            qs = queryset.order_by(
+                f"-{name}" if descending else name, "-pk" if descending else "pk"
+            )
+        if cursor:
+            seek = Q(**{f"{name}__{lookup}": cursor["value"]})
+            if not field.primary_key:
+                seek |= Q(**{name: cursor["value"], f"pk__{lookup}": cursor["pk"]})
+            qs = qs.filter(seek)
+
+        self.field = field
+        self._cursor = cursor
+        self._page_size = page_size
+        return qs[: page_size + 1]
+
+    def cursor_page(self, rows):
+        cursor, page_size = self._cursor, self._page_size
+        reverse = bool(cursor and cursor["reverse"])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows:
+            if has_more or reverse:
+                self.next_position = rows[-1]
+            if (has_more and reverse) or (cursor and not reverse):
+                self.previous_position = rows[0]
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return self._encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if self.previous_position is None:
+            return None
+        return self._encode_cursor(self.previous_position, reverse=True)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to `cursor` to use keyset pagination.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+        ]
+        return parameters
+
+    def _get_ordering(self, queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering or ["-pk"]
+        term = ordering[0]
+        if not isinstance(term, str):
+            # Expressions cannot be encoded into a cursor; seek on the primary key.
+            return "-pk"
+        return term
+
+    def _decode_cursor(self, request, field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            ordering, reverse, value, pk = json.loads(
+                urlsafe_b64decode(encoded.encode("ascii"))
+            )
+            if ordering != self.ordering:
+                raise ValueError("cursor belongs to a different ordering")
+            return {
+                "reverse": bool(reverse),
+                "value": field.to_python(value),
+                "pk": int(pk),
+            }
+        except (TypeError, ValueError, UnicodeError, BinasciiError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _encode_cursor(self, instance, reverse):
+        value = getattr(instance, self.field.attname)
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        token = json.dumps([self.ordering, int(reverse), value, instance.pk])
+        encoded = urlsafe_b64encode(token.encode("ascii")).decode("ascii")
+        url = remove_query_param(self.base_url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
@@ -0,0 +1,118 @@
+# training/payroll.py
+"""Trainer payroll for a pay period, from completed training sessions.
+
+One grouped query sums minutes, session counts and prices per trainer and
+session type; the per-trainer arithmetic then runs over those few rows
+(at most one per session type), never over individual sessions.
+
+Earnings are either ``hourly_rate * hours`` (basis ``hourly``) or a
+commission on the sessions' ``price`` (basis ``commission``). Amounts stay
+``Decimal`` and are rounded half-up to cents once per trainer.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from rest_framework.exceptions import ValidationError
+
+from .models import TrainingSession
+from .rollups import _aware
+
+BASES = ("hourly", "commission")
+CENTS = Decimal("0.01")
+MINUTES_PER_HOUR = Decimal(60)
+
+
+def _cents(value):
+    return value.quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def payroll_options(params):
+    """``(basis, commission)`` from query params or command options, with settings as defaults."""
+    basis = params.get("basis") or settings.PAYROLL_BASIS
+    if basis not in BASES:
+        raise ValidationError({"basis": f"Choose one of: {', '.join(BASES)}."})
+    raw = params.get("commission")
+    try:
+        commission = Decimal(str(settings.PAYROLL_COMMISSION if raw in (None, "") else raw).strip())
+    except InvalidOperation:
+        commission = None
+    if commission is None or not commission.is_finite() or not 0 <= commission <= 1:
+        raise ValidationError({"commission": "Use a fraction between 0 and 1."})
+    return basis, commission
+
+
+def compute_payroll(start, end, basis="hourly", commission=Decimal("0"), trainers=None):
+    """Payroll rows for sessions completed in ``[start, end)`` (dates).
+
+    ``trainers`` optionally limits the run to a queryset or list of
+    ``TrainerProfile`` ids. Returns ``{"trainers": [...], "totals": {...}}``.
+    """
+    sessions = TrainingSession.objects.filter(
+        status="completed",
+        scheduled_date__gte=_aware(start),
+        scheduled_date__lt=_aware(end),
+    )
+    if trainers is not None:
+        sessions = sessions.filter(trainer_id__in=trainers)
+    groups = (
+        sessions.order_by()
+        .values("trainer_id", "trainer__user_id", "trainer__user__username", "trainer__hourly_rate", "session_type")
+        .annotate(minutes=Sum("duration_minutes"), sessions=Count("pk"), gross=Sum("price"))
+        .order_by("trainer_id", "session_type")
+    )
+
+    empty_types = {value: 0 for value, _ in TrainingSession.SESSION_TYPES}
+    by_trainer = {}
+    for group in groups:
+        row = by_trainer.get(group["trainer_id"])
+        if row is None:
+            row = by_trainer[group["trainer_id"]] = {
+                "trainer_id": group["trainer_id"],
+                "user_id": group["trainer__user_id"],
+                "username": group["trainer__user__username"],
+                "hourly_rate": group["trainer__hourly_rate"],
+                "minutes": 0,
+                "sessions": 0,
+                "by_type": dict(empty_types),
+                "gross": Decimal("0"),
+            }
+        row["minutes"] += group["minutes"]
+        row["sessions"] += group["sessions"]
+        row["by_type"][group["session_type"]] = group["sessions"]
+        row["gross"] += group["gross"]
+
+    totals = {"minutes": 0, "sessions": 0, "gross": Decimal("0"), "earnings": Decimal("0")}
+    results = []
+    for row in by_trainer.values():
+        hours = Decimal(row["minutes"]) / MINUTES_PER_HOUR
+        if basis == "hourly":
+            earnings = _cents(row["hourly_rate"] * hours)
+        else:
+            earnings = _cents(row["gross"] * commission)
+        totals["minutes"] += row["minutes"]
+        totals["sessions"] += row["sessions"]
+        totals["gross"] += row["gross"]
+        totals["earnings"] += earnings
+        results.append({
+            "trainer_id": row["trainer_id"],
+            "user_id": row["user_id"],
+            "username": row["username"],
+            "hourly_rate": str(row["hourly_rate"]),
+            "hours": str(_cents(hours)),
+            "sessions": row["sessions"],
+            "sessions_by_type": row["by_type"],
+            "gross": str(_cents(row["gross"])),
+            "earnings": str(earnings),
+        })
+    return {
+        "basis": basis,
+        "commission": str(commission) if basis == "commission" else None,
+        "trainers": results,
+        "totals": {
+            "hours": str(_cents(Decimal(totals["minutes"]) / MINUTES_PER_HOUR)),
+            "sessions": totals["sessions"],
+            "gross": str(_cents(totals["gross"])),
+            "earnings": str(totals["earnings"]),
+        },
+    }
@@ -0,0 +1,87 @@
+# training/recurrence.py
+"""Lazy expansion of ``SessionSeries`` into calendar rows.
+
+Occurrences are generated in Python for the requested window only; stored
+exceptions (``TrainingSession`` rows with ``series`` set) replace the virtual
+occurrence they were materialized from.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import MAX_BOOKING, TrainingSession
+
+
+def series_in_window(queryset, start, end):
+    """Series from ``queryset`` that may have an occurrence in ``[start, end)``."""
+    return queryset.filter(
+        starts_at__lt=end, until__gte=timezone.localdate(start - MAX_BOOKING)
+    ).select_related("trainer__user", "member__user")
+
+
+def _occurrences(queryset, start, end):
+    """``(series, start_at)`` for every virtual occurrence in ``[start, end)``."""
+    series = list(series_in_window(queryset, start, end))
+    if not series:
+        return
+    taken = set(
+        TrainingSession.objects.filter(
+            series__in=series,
+            occurrence_start__gt=start - MAX_BOOKING,
+            occurrence_start__lt=end,
+        ).values_list("series_id", "occurrence_start")
+    )
+    for item in series:
+        for at in item.occurrences(start, end):
+            if (item.pk, at) not in taken:
+                yield item, at
+
+
+def occurrence_rows(queryset, start, end):
+    """Virtual occurrences in ``[start, end)`` shaped like ``calendar`` rows.
+
+    ``item_id`` is the series id; ``(start_at, item_id)`` identifies an occurrence.
+    """
+    rows = [
+        {
+            "kind": "occurrence",
+            "item_id": item.pk,
+            "start_at": at,
+            "end_at": at + timedelta(minutes=item.duration_minutes),
+            "trainer_user": item.trainer.user_id,
+            "trainee_user": item.member.user_id,
+            "trainer_username": item.trainer.user.username,
+            "trainee_username": item.member.user.username,
+            "state": "scheduled",
+            "category": item.session_type,
+            "place": "",
+        }
+        for item, at in _occurrences(queryset, start, end)
+    ]
+    rows.sort(key=lambda row: (row["start_at"], row["item_id"]))
+    return rows
+
+
+def occurrence_sessions(queryset, start, end):
+    """Virtual occurrences in ``[start, end)`` as unsaved ``TrainingSession`` objects.
+
+    They serialize like stored sessions, with no ``id`` and ``series`` /
+    ``occurrence_start`` identifying the slot.
+    """
+    sessions = [
+        TrainingSession(
+            series=item,
+            occurrence_start=at,
+            trainer=item.trainer,
+            member=item.member,
+            session_type=item.session_type,
+            scheduled_date=at,
+            duration_minutes=item.duration_minutes,
+            ends_at=at + timedelta(minutes=item.duration_minutes),
+            notes=item.notes,
+            price=item.price,
+        )
+        for item, at in _occurrences(queryset, start, end)
+    ]
+    sessions.sort(key=lambda session: (session.scheduled_date, session.series_id))
+    return sessions
@@ -0,0 +1,104 @@
+# training/renderers.py
+from datetime import timezone as dt_timezone
+
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+
+def _escape(text):
+    return (
+        str(text)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _stamp(value):
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _fold(line):
+    """Fold a content line to 75 octets as RFC 5545 requires."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts, chunk = [], b""
+    for char in line:
+        piece = char.encode("utf-8")
+        if len(chunk) + len(piece) > (75 if not parts else 74):
+            parts.append(chunk.decode("utf-8"))
+            chunk = b""
+        chunk += piece
+    parts.append(chunk.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+
+class ICalendarRenderer(BaseRenderer):
+    """Render calendar feed rows (``data["results"]``) as an iCalendar document."""
+
+    media_type = "text/calendar"
+    format = "ics"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict) or "results" not in data:
+            # Errors (401/404/...) carry no events; render them as an empty calendar.
+            data = {"results": []}
+        now = _stamp(timezone.now())
+        lines = [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//Gym Fullstack//Training Calendar//EN",
+            "CALSCALE:GREGORIAN",
+            "X-WR-CALNAME:Gym training",
+        ]
+        for row in data["results"]:
+            if row["kind"] == "lesson":
+                summary = f"Lesson: {row['trainee_username']}"
+            else:
+                summary = f"{row['category'].title()} session: {row['trainee_username']}"
+            uid = f"{row['kind']}-{row['item_id']}"
+            if row["kind"] == "occurrence":
+                uid += f"-{_stamp(row['start_at'])}"
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:{uid}@gym-fullstack",
+                f"DTSTAMP:{now}",
+                f"DTSTART:{_stamp(row['start_at'])}",
+                f"DTEND:{_stamp(row['end_at'])}",
+                f"SUMMARY:{_escape(summary)}",
+                f"DESCRIPTION:{_escape('Trainer: ' + str(row['trainer_username']))}",
+                f"STATUS:{'CANCELLED' if row['state'] == 'cancelled' else 'CONFIRMED'}",
+            ]
+            if row.get("place"):
+                lines.append(f"LOCATION:{_escape(row['place'])}")
+            lines.append("END:VEVENT")
+        lines.append("END:VCALENDAR")
+        return ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode(self.charset)
+
+
+class _ExportRenderer(BaseRenderer):
+    """Content-negotiation target for streamed exports.
+
+    The export action streams its own body; this only renders error
+    responses (401/403/...) that reach it, as plain text.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and "detail" in data:
+            data = data["detail"]
+        return f"{data}\n".encode(self.charset)
+
+
+class CSVRenderer(_ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class NDJSONRenderer(_ExportRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
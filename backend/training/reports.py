@@ -0,0 +1,197 @@
+# training/reports.py
+"""Revenue report read from the daily rollup tables.
+
+Payments come from ``DailyPaymentStat`` and session revenue from completed
+buckets of ``DailySessionStat``, both maintained by ``training.rollups``.
+Monthly buckets are generated in SQL with a recursive CTE and left-joined
+to the rollups, so months without revenue come back as zero rows.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connections, router
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from users.models import MemberProfile
+from .models import DailyPaymentStat, DailySessionStat, Payment
+from .rollups import _money
+
+GROUPINGS = ("month", "method", "trainer", "membership_type")
+MAX_DAYS = 5 * 366
+
+# Per-vendor spelling of "this date" and "one month after this date".
+DATE_SQL = {
+    "sqlite": ("date(%s)", "date({}, '+1 month')"),
+    "mysql": ("CAST(%s AS DATE)", "DATE_ADD({}, INTERVAL 1 MONTH)"),
+    "postgresql": ("%s::date", "({} + INTERVAL '1 month')::date"),
+}
+
+
+def report_range(params, period="year"):
+    """Parse ``?from=`` / ``?to=`` dates into ``[start, end)``.
+
+    Missing bounds default to the current ``period`` ("year" or "month").
+    """
+    today = timezone.localdate()
+
+    def parse(name, default):
+        raw = params.get(name)
+        if not raw:
+            return default
+        try:
+            value = parse_date(raw)
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValidationError({name: "Use YYYY-MM-DD."})
+        return value
+
+    if period == "month":
+        start = parse("from", today.replace(day=1))
+        end = parse("to", (start.replace(day=1) + timedelta(days=32)).replace(day=1))
+    else:
+        start = parse("from", date(today.year, 1, 1))
+        end = parse("to", date(start.year + 1, 1, 1))
+    if end <= start:
+        raise ValidationError({"to": "to must be after from."})
+    if (end - start).days > MAX_DAYS:
+        raise ValidationError({"to": f"The range may span at most {MAX_DAYS} days."})
+    return start, end
+
+
+def _row(key, payments=None, payment_count=0, sessions=None, session_count=0, **extra):
+    payments = payments or Decimal("0")
+    sessions = sessions or Decimal("0")
+    return {
+        "key": key,
+        **extra,
+        "payments": _money(payments),
+        "payment_count": payment_count or 0,
+        "sessions": _money(sessions),
+        "session_count": session_count or 0,
+        "total": _money(payments + sessions),
+    }
+
+
+def _scoped(scope, start, end):
+    """Rollup querysets for ``[start, end)`` limited to what the caller may see."""
+    if not scope.is_admin and scope.role != "TRAINER":
+        raise PermissionDenied("Revenue reports are available to admins and trainers.")
+    payments = DailyPaymentStat.objects.filter(day__gte=start, day__lt=end)
+    sessions = DailySessionStat.objects.filter(day__gte=start, day__lt=end, status="completed")
+    if not scope.is_admin:
+        payments = payments.filter(trainer_id=scope.user.pk)
+        sessions = sessions.filter(trainer_id=scope.trainer_profile_id)
+    return payments.order_by(), sessions.order_by()
+
+
+def _monthly(model, amount, count, start, end, where, params):
+    connection = connections[router.db_for_read(model)]
+    anchor, step = DATE_SQL[connection.vendor]
+    table = model._meta.db_table
+    sql = f"""
+        WITH RECURSIVE months (month_start) AS (
+            SELECT {anchor}
+            UNION ALL
+            SELECT {step.format("month_start")} FROM months
+            WHERE {step.format("month_start")} < {anchor}
+        )
+        SELECT m.month_start, COALESCE(SUM(r.{amount}), 0), COALESCE(SUM(r.{count}), 0)
+        FROM months m
+        LEFT JOIN {table} r
+            ON r.day >= m.month_start AND r.day < {step.format("m.month_start")}
+            AND r.day >= {anchor} AND r.day < {anchor}{where}
+        GROUP BY m.month_start
+        ORDER BY m.month_start
+    """
+    first = start.replace(day=1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [first, end, start, end, *params])
+        return {
+            str(month)[:7]: (Decimal(str(total)), int(n)) for month, total, n in cursor.fetchall()
+        }
+
+
+def _by_month(scope, start, end):
+    payment_where, payment_params = "", []
+    session_where, session_params = "", []
+    if not scope.is_admin:
+        payment_where, payment_params = " AND r.trainer_id = %s", [scope.user.pk]
+        session_where, session_params = " AND r.trainer_id = %s", [scope.trainer_profile_id]
+    payments = _monthly(
+        DailyPaymentStat, "amount", "payment_count",
+        start, end, payment_where, payment_params,
+    )
+    sessions = _monthly(
+        DailySessionStat, "revenue", "session_count",
+        start, end, f" AND r.status = 'completed'{session_where}", session_params,
+    )
+    return [
+        _row(month, *payments[month], *sessions.get(month, (None, 0)))
+        for month in payments
+    ]
+
+
+def revenue_report(scope, start, end, group_by):
+    """Revenue in ``[start, end)`` grouped by ``group_by`` (one of ``GROUPINGS``).
+
+    ``method`` only covers payments; sessions carry no payment method.
+    """
+    if group_by not in GROUPINGS:
+        raise ValidationError({"group_by": f"Choose one of: {', '.join(GROUPINGS)}."})
+    payments, sessions = _scoped(scope, start, end)
+    if group_by == "month":
+        return _by_month(scope, start, end)
+
+    if group_by == "method":
+        totals = {
+            row["method"]: row
+            for row in payments.values("method").annotate(total=Sum("amount"), n=Sum("payment_count"))
+        }
+        return [
+            _row(method, totals.get(method, {}).get("total"), totals.get(method, {}).get("n"), label=label)
+            for method, label in Payment.METHOD_CHOICES
+        ]
+
+    if group_by == "membership_type":
+        paid = {
+            row["membership_type"]: row
+            for row in payments.values("membership_type").annotate(total=Sum("amount"), n=Sum("payment_count"))
+        }
+        earned = {
+            row["membership_type"]: row
+            for row in sessions.values("membership_type").annotate(total=Sum("revenue"), n=Sum("session_count"))
+        }
+        choices = [*MemberProfile.MEMBERSHIP_CHOICES, ("", "No membership")]
+        return [
+            _row(
+                value,
+                paid.get(value, {}).get("total"), paid.get(value, {}).get("n"),
+                earned.get(value, {}).get("total"), earned.get(value, {}).get("n"),
+                label=label,
+            )
+            for value, label in choices
+        ]
+
+    # group_by == "trainer": payments are keyed by trainer user, sessions by profile.
+    paid = {
+        row["trainer_id"]: row
+        for row in payments.values("trainer_id", "trainer__username")
+        .annotate(total=Sum("amount"), n=Sum("payment_count"))
+    }
+    earned = {
+        row["trainer__user_id"]: row
+        for row in sessions.values("trainer__user_id", "trainer__user__username")
+        .annotate(total=Sum("revenue"), n=Sum("session_count"))
+    }
+    results = []
+    for trainer_id in sorted(paid.keys() | earned.keys(), key=lambda pk: (pk is None, pk)):
+        p, e = paid.get(trainer_id, {}), earned.get(trainer_id, {})
+        username = p.get("trainer__username") or e.get("trainer__user__username")
+        results.append(_row(
+            trainer_id, p.get("total"), p.get("n"), e.get("total"), e.get("n"), label=username,
+        ))
+    return results
@@ -0,0 +1,168 @@
+# training/response_cache.py
+"""Rendered-response cache for reference-data list endpoints.
+
+Entries are keyed by namespace generation, role, media type and the full
+query string (so every page, search and ordering is its own entry). Each
+namespace ("machines", "trainers") has a generation token in the cache;
+``invalidate`` replaces it, which orphans every entry of that namespace at
+once. ``training.signals`` calls it from ``post_save`` / ``post_delete``.
+
+On a miss, the first request takes a short lock with ``cache.add`` and
+builds the response; concurrent requests for the same key wait for it for
+up to ``LOCK_TIMEOUT`` rather than all hitting the database.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+LOCK_TIMEOUT = 5  # seconds
+POLL_INTERVAL = 0.05
+CACHED_HEADERS = ("ETag", "Last-Modified", "Cache-Control")
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _count(namespace, event):
+    with _stats_lock:
+        _stats[(namespace, event)] += 1
+
+
+def stats():
+    """``{(namespace, event): count}`` for this process; events are hit, miss, wait."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _generation(namespace):
+    cache = _cache()
+    key = f"gen:{namespace}"
+    token = cache.get(key)
+    if token is None:
+        # A lost token must never come back as an old value, hence a fresh uuid.
+        cache.add(key, uuid.uuid4().hex, None)
+        token = cache.get(key)
+    return token
+
+
+async def _ageneration(namespace):
+    """``_generation`` for async views, without blocking the event loop."""
+    cache = _cache()
+    key = f"gen:{namespace}"
+    token = await cache.aget(key)
+    if token is None:
+        await cache.aadd(key, uuid.uuid4().hex, None)
+        token = await cache.aget(key)
+    return token
+
+
+def invalidate(namespace):
+    _cache().set(f"gen:{namespace}", uuid.uuid4().hex, None)
+
+
+class ResponseCacheMixin:
+    """Cache the rendered ``list`` response of a viewset in ``cache_namespace``."""
+
+    cache_namespace = None
+
+    def _cache_key(self, request):
+        return self._key(request, _generation(self.cache_namespace))
+
+    async def _acache_key(self, request):
+        return self._key(request, await _ageneration(self.cache_namespace))
+
+    def _key(self, request, generation):
+        raw = "|".join((
+            generation,
+            str(getattr(request.user, "role", None)),
+            request.accepted_media_type,
+            request.get_full_path(),
+        ))
+        return f"resp:{self.cache_namespace}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+    def list(self, request, *args, **kwargs):
+        cache = _cache()
+        key = self._cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            if cache.add(f"{key}:lock", 1, LOCK_TIMEOUT):
+                _count(self.cache_namespace, "miss")
+                self._cache_store = key
+                return super().list(request, *args, **kwargs)
+            entry = self._wait_for(cache, key)
+            if entry is None:
+                # The builder is slow or gone; serve this one uncached.
+                _count(self.cache_namespace, "miss")
+                return super().list(request, *args, **kwargs)
+        else:
+            _count(self.cache_namespace, "hit")
+        return self._from_entry(request, entry)
+
+    def _wait_for(self, cache, key):
+        _count(self.cache_namespace, "wait")
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+            if cache.get(f"{key}:lock") is None:
+                return None
+        return None
+
+    async def _await_for(self, cache, key):
+        """``_wait_for`` for async views, sleeping on the event loop."""
+        _count(self.cache_namespace, "wait")
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            entry = await cache.aget(key)
+            if entry is not None:
+                return entry
+            if await cache.aget(f"{key}:lock") is None:
+                return None
+        return None
+
+    def _from_entry(self, request, entry):
+        headers = entry["headers"]
+        not_modified = get_conditional_response(
+            request,
+            etag=headers.get("ETag"),
+            last_modified=parse_http_date_safe(headers.get("Last-Modified", "")),
+        )
+        response = not_modified or HttpResponse(entry["content"], content_type=entry["content_type"])
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, "_cache_store", None)
+        if key is None:
+            return response
+        cache = _cache()
+        try:
+            if response.status_code == 200:
+                response.render()
+                cache.set(key, {
+                    "content": response.content,
+                    "content_type": response["Content-Type"],
+                    "headers": {name: response[name] for name in CACHED_HEADERS if name in response},
+                }, settings.RESPONSE_CACHE_TIMEOUT)
+        finally:
+            cache.delete(f"{key}:lock")
+            self._cache_store = None
+        return response
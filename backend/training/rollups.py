@@ -0,0 +1,356 @@
+# training/rollups.py
+"""Daily rollups behind the dashboard endpoint.
+
+``training.signals`` feeds every saved or deleted ``TrainingSession`` and
+``Payment`` through ``apply_session`` / ``apply_payment``, which move the row's
+contribution between ``DailySessionStat`` / ``DailyPaymentStat`` buckets;
+rows loaded with deferred fields have their old bucket read back before the
+write. Payment buckets follow the student's current trainer, and
+``reassign_payments`` moves them when a trainee changes trainer. Buckets also
+record the membership type snapshotted on the row when it was
+last saved (``membership_type``), so a member's upgrade moves nothing already
+counted. Queryset ``update()``/``bulk_create()`` bypass signals; ``rebuild()``
+(the ``rebuild_dashboard_rollups`` command) recomputes everything from
+scratch and ``rebuild_range()`` (``rebuild_revenue_aggregates``) a date range.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from users.models import MemberProfile, TrainerProfile
+from .models import DailyPaymentStat, DailySessionStat, Payment, Student, TrainingSession
+
+SESSION_FIELDS = (
+    "scheduled_date", "trainer_id", "session_type", "status", "membership_type", "price",
+)
+PAYMENT_FIELDS = ("paid_at", "student_id", "method", "membership_type", "amount_ils")
+CENTS = Decimal("0.01")
+
+
+def _day(value):
+    if timezone.is_naive(value):
+        return value.date()
+    return timezone.localdate(value)
+
+
+def _loaded(instance, fields, load=False):
+    """Return the instance's values for ``fields``.
+
+    Deferred fields are read from the database when ``load`` is set;
+    otherwise (as in ``post_init``, where a query per row would be too
+    costly) an instance missing any of them gives None.
+    """
+    if instance.pk is None:
+        return None
+    data = instance.__dict__
+    missing = [name for name in fields if name not in data]
+    if missing:
+        if not load:
+            return None
+        row = type(instance)._base_manager.filter(pk=instance.pk).values(*missing).first()
+        if row is None:
+            return None
+        data = {**data, **row}
+    values = [data[name] for name in fields]
+    return None if any(value is None for value in values) else values
+
+
+def _stored(model, pk, fields):
+    return model._base_manager.filter(pk=pk).values_list(*fields).first()
+
+
+def _session_key(values):
+    scheduled, *bucket, price = values
+    return (_day(scheduled), *bucket, Decimal(str(price)))
+
+
+def _payment_key(values):
+    paid_at, *bucket, amount = values
+    return (_day(paid_at), *bucket, Decimal(str(amount)))
+
+
+def session_key(session, load=False):
+    """Return ``(day, trainer_id, session_type, status, membership_type, price)`` or None."""
+    values = _loaded(session, SESSION_FIELDS, load)
+    return None if values is None else _session_key(values)
+
+
+def payment_key(payment, load=False):
+    """Return ``(day, student_id, method, membership_type, amount)`` or None."""
+    values = _loaded(payment, PAYMENT_FIELDS, load)
+    return None if values is None else _payment_key(values)
+
+
+def stored_session_key(pk):
+    """The bucket of session ``pk`` as the database has it."""
+    values = _stored(TrainingSession, pk, SESSION_FIELDS)
+    return None if values is None else _session_key(values)
+
+
+def stored_payment_key(pk):
+    """The bucket of payment ``pk`` as the database has it."""
+    values = _stored(Payment, pk, PAYMENT_FIELDS)
+    return None if values is None else _payment_key(values)
+
+
+def _bump(model, keys, **deltas):
+    """Add ``deltas`` to one rollup row matching ``keys``, creating it if needed.
+
+    Readers always ``SUM`` over rows, so a duplicate bucket left by a racing
+    insert is harmless; only one row is ever adjusted.
+    """
+    pk = model.objects.filter(**keys).values_list("pk", flat=True).first()
+    if pk is None:
+        model.objects.create(**keys, **deltas)
+    else:
+        model.objects.filter(pk=pk).update(
+            **{name: F(name) + value for name, value in deltas.items()}
+        )
+
+
+@transaction.atomic
+def apply_session(old, new):
+    """Move a session's contribution from bucket ``old`` to bucket ``new``."""
+    if old == new:
+        return
+    for key, sign in ((old, -1), (new, 1)):
+        if key is None:
+            continue
+        day, trainer_id, session_type, status, membership_type, price = key
+        _bump(
+            DailySessionStat,
+            {
+                "day": day,
+                "trainer_id": trainer_id,
+                "session_type": session_type,
+                "status": status,
+                "membership_type": membership_type,
+            },
+            session_count=sign,
+            revenue=sign * price,
+        )
+
+
+@transaction.atomic
+def apply_payment(old, new):
+    """Move a payment's contribution from bucket ``old`` to bucket ``new``."""
+    if old == new:
+        return
+    student_ids = {key[1] for key in (old, new) if key is not None}
+    trainers = dict(
+        Student.objects.filter(pk__in=student_ids).values_list("pk", "user__trainer_id")
+    )
+    for key, sign in ((old, -1), (new, 1)):
+        if key is None:
+            continue
+        day, student_id, method, membership_type, amount = key
+        trainer_id = trainers.get(student_id)
+        _bump(
+            DailyPaymentStat,
+            {
+                "day": day,
+                "trainer_id": trainer_id,
+                "method": method,
+                "membership_type": membership_type,
+            },
+            payment_count=sign,
+            amount=sign * amount,
+        )
+
+
+@transaction.atomic
+def reassign_payments(user_id, old_trainer_id, new_trainer_id):
+    """Move the payments of trainee ``user_id`` to their new trainer's buckets.
+
+    Payment buckets are keyed by the student's current trainer, so a
+    reassignment moves every day's contribution; one grouped read, then two
+    bumps per (day, method, membership) bucket the student paid into.
+    """
+    if old_trainer_id == new_trainer_id:
+        return
+    buckets = (
+        Payment.objects.filter(student__user_id=user_id)
+        .order_by()
+        .values("method", "membership_type", day=TruncDate("paid_at"))
+        .annotate(payment_count=Count("id"), amount=Sum("amount_ils"))
+    )
+    for row in buckets:
+        keys = {"day": row["day"], "method": row["method"], "membership_type": row["membership_type"]}
+        _bump(
+            DailyPaymentStat,
+            {**keys, "trainer_id": old_trainer_id},
+            payment_count=-row["payment_count"],
+            amount=-row["amount"],
+        )
+        _bump(
+            DailyPaymentStat,
+            {**keys, "trainer_id": new_trainer_id},
+            payment_count=row["payment_count"],
+            amount=row["amount"],
+        )
+
+
+def _session_buckets(sessions):
+    return (
+        sessions.order_by()
+        .values(
+            "trainer_id",
+            "session_type",
+            "status",
+            "membership_type",
+            day=TruncDate("scheduled_date"),
+        )
+        .annotate(session_count=Count("id"), revenue=Sum("price"))
+    )
+
+
+def _payment_buckets(payments):
+    return (
+        payments.order_by()
+        .values(
+            "method",
+            "membership_type",
+            day=TruncDate("paid_at"),
+            trainer_id=F("student__user__trainer_id"),
+        )
+        .annotate(payment_count=Count("id"), amount=Sum("amount_ils"))
+    )
+
+
+def _insert_buckets(sessions, payments, batch_size):
+    DailySessionStat.objects.bulk_create(
+        (DailySessionStat(**row) for row in _session_buckets(sessions).iterator()),
+        batch_size=batch_size,
+    )
+    DailyPaymentStat.objects.bulk_create(
+        (DailyPaymentStat(**row) for row in _payment_buckets(payments).iterator()),
+        batch_size=batch_size,
+    )
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Recompute both rollup tables from the source rows."""
+    DailySessionStat.objects.all().delete()
+    DailyPaymentStat.objects.all().delete()
+    _insert_buckets(TrainingSession.objects.all(), Payment.objects.all(), batch_size)
+    return DailySessionStat.objects.count(), DailyPaymentStat.objects.count()
+
+
+def rebuild_range(start, end, chunk_days=31, batch_size=1000):
+    """Recompute the rollups for days in ``[start, end)``, one transaction per chunk.
+
+    Yields ``(chunk_start, chunk_end)`` after each chunk is committed.
+    """
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end)
+        lower, upper = _aware(chunk_start), _aware(chunk_end)
+        with transaction.atomic():
+            DailySessionStat.objects.filter(day__gte=chunk_start, day__lt=chunk_end).delete()
+            DailyPaymentStat.objects.filter(day__gte=chunk_start, day__lt=chunk_end).delete()
+            _insert_buckets(
+                TrainingSession.objects.filter(scheduled_date__gte=lower, scheduled_date__lt=upper),
+                Payment.objects.filter(paid_at__gte=lower, paid_at__lt=upper),
+                batch_size,
+            )
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end
+
+
+def _money(value):
+    return str((value or Decimal("0")).quantize(CENTS))
+
+
+def _month_bounds(today):
+    start = today.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def dashboard_summary(user, today=None):
+    """Return dashboard totals scoped to ``user``'s role."""
+    today = today or timezone.localdate()
+    month_start, month_end = _month_bounds(today)
+    role = getattr(user, "role", None)
+
+    members = MemberProfile.objects.filter(is_active=True)
+    if role == "TRAINER":
+        members = members.filter(user__trainer_id=user.id)
+    elif role != "ADMIN":
+        members = members.filter(user_id=user.id)
+
+    if role in ("ADMIN", "TRAINER"):
+        stats = DailySessionStat.objects.all()
+        payments = DailyPaymentStat.objects.filter(day__gte=month_start, day__lt=month_end)
+        if role == "TRAINER":
+            stats = stats.filter(trainer__user_id=user.id)
+            payments = payments.filter(trainer_id=user.id)
+        breakdown = stats.values_list("status", "session_type").annotate(
+            n=Sum("session_count")
+        )
+        month = stats.filter(
+            day__gte=month_start, day__lt=month_end, status="completed"
+        ).aggregate(
+            revenue=Sum("revenue"),
+            today=Sum("session_count", filter=Q(day=today)),
+        )
+        payment_total = payments.aggregate(amount=Sum("amount"))["amount"]
+    else:
+        # Trainees only ever see their own rows; the (member, scheduled_date)
+        # and (student, paid_at) indexes keep these bounded without a rollup.
+        sessions = TrainingSession.objects.filter(member__user_id=user.id).order_by()
+        breakdown = sessions.values_list("status", "session_type").annotate(n=Count("id"))
+        month = sessions.filter(
+            scheduled_date__gte=_aware(month_start),
+            scheduled_date__lt=_aware(month_end),
+            status="completed",
+        ).aggregate(
+            revenue=Sum("price"),
+            today=Count(
+                "id",
+                filter=Q(
+                    scheduled_date__gte=_aware(today),
+                    scheduled_date__lt=_aware(today + timedelta(days=1)),
+                ),
+            ),
+        )
+        payment_total = Payment.objects.filter(
+            student__user_id=user.id,
+            paid_at__gte=_aware(month_start),
+            paid_at__lt=_aware(month_end),
+        ).aggregate(amount=Sum("amount_ils"))["amount"]
+
+    by_status = {value: 0 for value, _ in TrainingSession.STATUS_CHOICES}
+    by_type = {value: 0 for value, _ in TrainingSession.SESSION_TYPES}
+    for status, session_type, n in breakdown:
+        by_status[status] = by_status.get(status, 0) + (n or 0)
+        by_type[session_type] = by_type.get(session_type, 0) + (n or 0)
+
+    session_revenue = month["revenue"] or Decimal("0")
+    payment_revenue = payment_total or Decimal("0")
+    return {
+        "role": role,
+        "month": month_start.strftime("%Y-%m"),
+        "members": {"active": members.count()},
+        "trainers": {"available": TrainerProfile.objects.filter(is_available=True).count()},
+        "sessions": {
+            "total": sum(by_status.values()),
+            "by_status": by_status,
+            "by_type": by_type,
+            "completed_today": month["today"] or 0,
+        },
+        "revenue": {
+            "payments": _money(payment_revenue),
+            "sessions": _money(session_revenue),
+            "total": _money(payment_revenue + session_revenue),
+        },
+    }
@@ -0,0 +1,174 @@
+# training/scheduling.py
+"""Trainer booking intervals across TrainingSession, Lesson and SessionSeries.
+
+Sessions and series are keyed by ``TrainerProfile`` and lessons by the trainer
+``User``; everything here reports trainers by user id. Series contribute their
+virtual occurrences in the window, so a recurring slot blocks the trainer just
+like a stored session. Bookings are capped at
+``MAX_BOOKING`` so an overlap query can bound its range scan on the
+``(trainer, scheduled_date)`` / ``(trainer, start)`` indexes from both sides.
+"""
+import heapq
+from datetime import datetime, time, timedelta
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import MAX_BOOKING, Lesson, SessionSeries, TrainingSession
+from .recurrence import occurrence_rows
+
+
+def _sessions_overlapping(start, end):
+    return (
+        TrainingSession.objects.exclude(status="cancelled")
+        .filter(
+            scheduled_date__lt=end,
+            scheduled_date__gt=start - MAX_BOOKING,
+            ends_at__gt=start,
+        )
+        .order_by()
+    )
+
+
+def _lessons_overlapping(start, end):
+    return Lesson.objects.filter(
+        start__lt=end,
+        start__gt=start - MAX_BOOKING,
+        end__gt=start,
+    ).order_by()
+
+
+def _parse(value, stored_tz, tz):
+    parsed = datetime.fromisoformat(value)
+    if tz is None:
+        return parsed
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=stored_tz)
+    return parsed.astimezone(tz)
+
+
+def booking_conflicts(
+    trainer_user_id, start, end,
+    exclude_session=None, exclude_lesson=None, exclude_occurrence=None,
+):
+    """Bookings of one trainer overlapping ``[start, end)``.
+
+    ``exclude_occurrence`` is a ``(series_id, occurrence_start)`` slot to leave
+    out, such as the occurrence an exception is being materialized from.
+    """
+    sessions = _sessions_overlapping(start, end).filter(trainer__user_id=trainer_user_id)
+    lessons = _lessons_overlapping(start, end).filter(trainer_id=trainer_user_id)
+    if exclude_session is not None:
+        sessions = sessions.exclude(pk=exclude_session)
+    if exclude_lesson is not None:
+        lessons = lessons.exclude(pk=exclude_lesson)
+    occurrences = occurrence_rows(
+        SessionSeries.objects.filter(trainer__user_id=trainer_user_id), start, end
+    )
+    return [
+        {"kind": "session", "id": pk, "start": s, "end": e}
+        for pk, s, e in sessions.values_list("pk", "scheduled_date", "ends_at")
+    ] + [
+        {"kind": "lesson", "id": pk, "start": s, "end": e}
+        for pk, s, e in lessons.values_list("pk", "start", "end")
+    ] + [
+        {"kind": "occurrence", "id": row["item_id"], "start": row["start_at"], "end": row["end_at"]}
+        for row in occurrences
+        if (row["item_id"], row["start_at"]) != exclude_occurrence
+    ]
+
+
+def trainer_bookings(start, end, trainer_user_ids=None):
+    """Every booking overlapping ``[start, end)`` as ``(trainer_user_id, start, end, kind, id)``.
+
+    At most four queries in total, whatever the number of trainers: sessions,
+    lessons, series in the window and, if there are any, their stored exceptions.
+    """
+    sessions = _sessions_overlapping(start, end)
+    lessons = _lessons_overlapping(start, end)
+    series = SessionSeries.objects.order_by()
+    if trainer_user_ids is not None:
+        sessions = sessions.filter(trainer__user_id__in=trainer_user_ids)
+        lessons = lessons.filter(trainer_id__in=trainer_user_ids)
+        series = series.filter(trainer__user_id__in=trainer_user_ids)
+    # Start and end are read as text and parsed once per distinct value
+    # (bookings cluster on a few times) instead of the driver and the ORM
+    # building a datetime for every row. They come back in the current time
+    # zone: datetimes sharing a tzinfo compare and subtract without utcoffset().
+    parse = lru_cache(maxsize=None)(partial(
+        _parse,
+        stored_tz=connections[sessions.db].timezone,
+        tz=timezone.get_current_timezone() if settings.USE_TZ else None,
+    ))
+    rows = [
+        (trainer, parse(s), parse(e), "session", pk)
+        for pk, trainer, s, e in sessions.values_list(
+            "pk", "trainer__user_id", Cast("scheduled_date", CharField()), Cast("ends_at", CharField())
+        )
+    ]
+    rows += [
+        (trainer, parse(s), parse(e), "lesson", pk)
+        for pk, trainer, s, e in lessons.values_list(
+            "pk", "trainer_id", Cast("start", CharField()), Cast("end", CharField())
+        )
+    ]
+    rows += [
+        (row["trainer_user"], row["start_at"], row["end_at"], "occurrence", row["item_id"])
+        for row in occurrence_rows(series, start, end)
+    ]
+    return rows
+
+
+def find_conflicts(bookings):
+    """Every overlapping pair among ``bookings`` (as from ``trainer_bookings``).
+
+    Sorts once and sweeps each trainer's intervals with a min-heap of end
+    times, so the cost is O(n log n + k) for k reported pairs.
+    """
+    conflicts = []
+    active = []
+    current_trainer = None
+    for trainer, start, end, kind, pk in sorted(bookings, key=lambda b: (b[0], b[1], b[2])):
+        if trainer != current_trainer:
+            current_trainer, active = trainer, []
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        booking = {"kind": kind, "id": pk, "start": start, "end": end}
+        for _, _, other in active:
+            conflicts.append({"trainer": trainer, "first": other, "second": booking})
+        heapq.heappush(active, (end, (kind, pk), booking))
+    return conflicts
+
+
+def requested_window(params, default_days=7, max_days=62):
+    """Parse ``?from=`` / ``?to=`` (dates or datetimes) into an aware ``[start, end)``."""
+    def parse(name):
+        raw = params.get(name)
+        if not raw:
+            return None
+        try:
+            value = parse_datetime(raw)
+            day = None if value else parse_date(raw)
+        except ValueError:
+            value = day = None
+        if value is None:
+            if day is None:
+                raise ValidationError({name: "Use YYYY-MM-DD or an ISO 8601 datetime."})
+            value = datetime.combine(day, time.min)
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+    start = parse("from") or timezone.make_aware(
+        datetime.combine(timezone.localdate(), time.min)
+    )
+    end = parse("to") or start + timedelta(days=default_days)
+    if end <= start:
+        raise ValidationError({"to": "to must be after from."})
+    if end - start > timedelta(days=max_days):
+        raise ValidationError({"to": f"The window may span at most {max_days} days."})
+    return start, end
@@ -0,0 +1,146 @@
+# training/scope.py
+"""Role-based visibility rules, resolved once per request.
+
+``scope_for(request)`` returns an ``AccessScope`` cached on the request. Viewsets
+call ``scope.filter(queryset)`` and ``IsAdminOrTrainerReadOwn`` calls
+``scope.allows(obj)``; both read the same rules, and object checks compare
+foreign-key ids against values the scope has already fetched, so they never
+follow ``obj.student.user`` style relations.
+"""
+from functools import cached_property
+
+from django.contrib.auth import get_user_model
+
+from .models import Lesson, Payment, Plan, SessionSeries, Student, TrainingSession
+
+User = get_user_model()
+
+
+class AccessScope:
+    def __init__(self, user):
+        self.user = user
+        self.role = getattr(user, "role", None) if user.is_authenticated else None
+
+    @property
+    def is_admin(self):
+        return self.role == "ADMIN"
+
+    @cached_property
+    def _identity(self):
+        """The caller's own profile ids, fetched in one query."""
+        row = (
+            User.objects.filter(pk=self.user.pk)
+            .values_list("student_profile__id", "member_profile__id", "trainer_profile__id")
+            .first()
+        )
+        return row or (None, None, None)
+
+    async def aload(self):
+        """Fetch the caller's profile ids with an async query, for async views.
+
+        ``filter`` reads nothing else from the database for list endpoints.
+        """
+        if "_identity" not in self.__dict__ and self.role not in (None, "ADMIN"):
+            row = await (
+                User.objects.filter(pk=self.user.pk)
+                .values_list("student_profile__id", "member_profile__id", "trainer_profile__id")
+                .afirst()
+            )
+            self.__dict__["_identity"] = row or (None, None, None)
+        return self
+
+    @property
+    def student_id(self):
+        return self._identity[0]
+
+    @property
+    def member_profile_id(self):
+        return self._identity[1]
+
+    @property
+    def trainer_profile_id(self):
+        return self._identity[2]
+
+    @cached_property
+    def trainee_user_ids(self):
+        """Ids of users the caller may see plans and students for."""
+        if self.role == "TRAINER":
+            return frozenset(
+                User.objects.filter(trainer_id=self.user.pk).values_list("pk", flat=True)
+            )
+        return frozenset([self.user.pk])
+
+    @cached_property
+    def student_ids(self):
+        """Ids of Student rows visible to the caller."""
+        if self.role == "TRAINER":
+            return frozenset(
+                Student.objects.filter(user__trainer_id=self.user.pk).values_list("pk", flat=True)
+            )
+        return frozenset([self.student_id]) if self.student_id else frozenset()
+
+    def filter(self, queryset):
+        """Limit ``queryset`` to rows the caller may see."""
+        if self.is_admin:
+            return queryset
+        uid = self.user.pk
+        model = queryset.model
+        if self.role == "TRAINER":
+            if model is Student:
+                return queryset.filter(user__trainer_id=uid)
+            if model is Lesson:
+                return queryset.filter(trainer_id=uid)
+            if model is Payment:
+                return queryset.filter(student__user__trainer_id=uid)
+            if model in (TrainingSession, SessionSeries):
+                return queryset.filter(trainer_id=self.trainer_profile_id)
+            if model is Plan:
+                # Trainers can see plans for their trainees
+                return queryset.filter(trainee__trainer_id=uid)
+        elif self.role == "TRAINEE":
+            if model is Student:
+                return queryset.filter(user_id=uid)
+            if model in (Lesson, Payment):
+                return queryset.filter(student_id=self.student_id)
+            if model in (TrainingSession, SessionSeries):
+                return queryset.filter(member_id=self.member_profile_id)
+            if model is Plan:
+                # Trainees can only see their own plans
+                return queryset.filter(trainee_id=uid)
+        return queryset.none()
+
+    def allows(self, obj):
+        """Whether ``obj`` is visible to the caller, without lazy loads."""
+        if self.is_admin:
+            return True
+        uid = self.user.pk
+        if self.role == "TRAINER":
+            if isinstance(obj, Student):
+                return obj.pk in self.student_ids
+            if isinstance(obj, Lesson):
+                return obj.trainer_id == uid
+            if isinstance(obj, Payment):
+                return obj.student_id in self.student_ids
+            if isinstance(obj, (TrainingSession, SessionSeries)):
+                return obj.trainer_id == self.trainer_profile_id
+            if isinstance(obj, Plan):
+                return obj.trainee_id in self.trainee_user_ids
+        elif self.role == "TRAINEE":
+            if isinstance(obj, Student):
+                return obj.user_id == uid
+            if isinstance(obj, (Lesson, Payment)):
+                return self.student_id is not None and obj.student_id == self.student_id
+            if isinstance(obj, (TrainingSession, SessionSeries)):
+                return self.member_profile_id is not None and obj.member_id == self.member_profile_id
+            if isinstance(obj, Plan):
+                return obj.trainee_id == uid
+        return False
+
+
+def scope_for(request):
+    """Return the request's ``AccessScope``, building it on first use."""
+    scope = getattr(request, "_access_scope", None)
+    if scope is None or scope.user is not request.user:
+        scope = AccessScope(request.user)
+        request._access_scope = scope
+    return scope
@@ -0,0 +1,183 @@
+# training/search.py
+"""Token index behind ``?search=`` on the main list endpoints.
+
+Each indexed row's searchable text (including joined fields such as the
+member's username) is split into lower-case words and stored in
+``SearchToken`` with a per-field weight. ``training.signals`` re-indexes a
+row whenever it, or a user whose names it shows, is saved.
+
+A search matches rows that have, for every term, a token starting with that
+term, using the ``(kind, token, object_id)`` index instead of ``icontains``
+scans over joins. Rows are ranked by the summed weight of the tokens they
+matched, exact words counting double; an explicit ``?ordering=`` wins.
+"""
+import re
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from rest_framework.filters import SearchFilter
+
+from users.models import MemberProfile
+from .models import Machine, Plan, SearchToken, Student, TrainingSession
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TOKEN = SearchToken._meta.get_field("token").max_length
+MAX_TERMS = 8
+BATCH_SIZE = 500
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    model: type
+    fields: dict  # lookup -> weight
+    user_paths: tuple = field(default=())  # lookups to users whose names are indexed
+
+
+SPECS = {
+    "student": IndexSpec(
+        Student,
+        {"user__username": 3, "user__first_name": 2, "user__last_name": 2},
+        ("user",),
+    ),
+    "member": IndexSpec(
+        MemberProfile,
+        {
+            "user__username": 3, "user__first_name": 2, "user__last_name": 2,
+            "user__email": 1, "membership_type": 1,
+        },
+        ("user",),
+    ),
+    "session": IndexSpec(
+        TrainingSession,
+        {
+            "session_type": 2, "status": 2, "notes": 1,
+            "trainer__user__username": 2, "member__user__username": 2,
+        },
+        ("trainer__user", "member__user"),
+    ),
+    "plan": IndexSpec(Plan, {"description": 1, "trainee__username": 3}, ("trainee",)),
+    "machine": IndexSpec(Machine, {"code": 3, "name": 2, "description": 1}),
+}
+KINDS = {spec.model: kind for kind, spec in SPECS.items()}
+
+# User fields that appear in some index; saving anything else skips re-indexing.
+USER_FIELDS = ("username", "first_name", "last_name", "email")
+
+
+def tokenize(text):
+    return [token[:MAX_TOKEN] for token in TOKEN_RE.findall(str(text or "").lower())]
+
+
+def index(kind, ids):
+    """(Re)build the tokens of ``kind`` rows with primary keys ``ids``."""
+    spec = SPECS[kind]
+    ids = list(ids)
+    lookups = list(spec.fields)
+    tokens = []
+    for pk, *values in spec.model.objects.filter(pk__in=ids).values_list("pk", *lookups):
+        weights = {}
+        for lookup, value in zip(lookups, values):
+            for token in tokenize(value):
+                weights[token] = max(weights.get(token, 0), spec.fields[lookup])
+        tokens.extend(
+            SearchToken(kind=kind, object_id=pk, token=token, weight=weight)
+            for token, weight in weights.items()
+        )
+    with transaction.atomic():
+        SearchToken.objects.filter(kind=kind, object_id__in=ids).delete()
+        SearchToken.objects.bulk_create(tokens, batch_size=BATCH_SIZE)
+
+
+def unindex(kind, ids):
+    SearchToken.objects.filter(kind=kind, object_id__in=list(ids)).delete()
+
+
+def reindex_user(user_id):
+    """Re-index every row that shows this user's names."""
+    for kind, spec in SPECS.items():
+        if not spec.user_paths:
+            continue
+        match = Q()
+        for path in spec.user_paths:
+            match |= Q(**{path: user_id})
+        ids = list(spec.model.objects.filter(match).values_list("pk", flat=True))
+        for start in range(0, len(ids), BATCH_SIZE):
+            index(kind, ids[start:start + BATCH_SIZE])
+
+
+def rebuild(kinds=None, batch_size=BATCH_SIZE):
+    """Re-index all rows of ``kinds`` (default: all); yields ``(kind, rows)`` per batch."""
+    for kind in kinds or SPECS:
+        model = SPECS[kind].model
+        SearchToken.objects.filter(kind=kind).exclude(
+            object_id__in=model.objects.values("pk")
+        ).delete()
+        last = 0
+        while True:
+            ids = list(
+                model.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            index(kind, ids)
+            last = ids[-1]
+            yield kind, len(ids)
+
+
+def search(queryset, kind, terms):
+    """``queryset`` narrowed to rows matching every term, annotated and ordered by ``search_rank``."""
+    terms = list(dict.fromkeys(terms))[:MAX_TERMS]
+    any_term = Q()
+    for term in terms:
+        any_term |= Q(token__startswith=term)
+    per_term = {
+        f"term_{n}": Max(Case(When(token__startswith=term, then=Value(1)), default=Value(0)))
+        for n, term in enumerate(terms)
+    }
+    score = Sum(sum(
+        (
+            Case(
+                When(token=term, then=F("weight") * 2),
+                When(token__startswith=term, then=F("weight")),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            for term in terms
+        ),
+        Value(0),
+    ))
+    matches = (
+        SearchToken.objects.filter(any_term, kind=kind)
+        .values("object_id")
+        .annotate(score=score, **per_term)
+        .filter(**{name: 1 for name in per_term})
+        .order_by()
+    )
+    return (
+        queryset.filter(pk__in=matches.values("object_id"))
+        .annotate(search_rank=Subquery(
+            matches.filter(object_id=OuterRef("pk")).values("score")[:1],
+            output_field=IntegerField(),
+        ))
+        .order_by(
+            F("search_rank").desc(),
+            *queryset.query.order_by or queryset.model._meta.ordering or ["-pk"],
+        )
+    )
+
+
+class IndexedSearchFilter(SearchFilter):
+    """``SearchFilter`` that answers from ``SearchToken`` for views with a ``search_index``.
+
+    Views without one keep the ``icontains`` search over ``search_fields``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        kind = getattr(view, "search_index", None)
+        if kind is None:
+            return super().filter_queryset(request, queryset, view)
+        terms = [token for term in self.get_search_terms(request) for token in tokenize(term)]
+        if not terms:
+            return queryset
+        return search(queryset, kind, terms)
@@ -1,11 +1,42 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Student, Lesson, Payment, TrainingSession, Machine, Plan
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+from .models import (
+    Student, Lesson, Payment, TrainingSession, SessionSeries, Machine, Plan, PlanMachine,
+    WEEKDAYS, weekday_mask,
+)
 from users.models import TrainerProfile, MemberProfile
+from .scheduling import MAX_BOOKING, booking_conflicts
 
 User = get_user_model()
 
 
+def check_trainer_free(
+    trainer_user_id, start, end,
+    exclude_session=None, exclude_lesson=None, exclude_occurrence=None,
+):
+    """Raise a ValidationError if the trainer already has a booking in ``[start, end)``."""
+    if end - start > MAX_BOOKING:
+        raise serializers.ValidationError(
+            f"A booking cannot be longer than {int(MAX_BOOKING.total_seconds() // 3600)} hours."
+        )
+    clashes = booking_conflicts(
+        trainer_user_id, start, end,
+        exclude_session=exclude_session, exclude_lesson=exclude_lesson,
+        exclude_occurrence=exclude_occurrence,
+    )
+    if clashes:
+        clash = min(clashes, key=lambda c: c["start"])
+        raise serializers.ValidationError(
+            f"Trainer is already booked for a {clash['kind']} "
+            f"from {clash['start']:%Y-%m-%d %H:%M} to {clash['end']:%Y-%m-%d %H:%M}."
+        )
+
+
 class UserMiniSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -23,14 +54,17 @@ class StudentSerializer(serializers.ModelSerializer):
         fields = ("id", "user", "user_id", "phone", "notes")
 
     def validate(self, data):
-        user = data["user"]
+        user = data.get("user")
+        if user is None:
+            # partial update that leaves the user alone
+            return data
         # must be a trainee
         if getattr(user, "role", None) != "TRAINEE":
             raise serializers.ValidationError(
                 {"user_id": "User must have role TRAINEE."}
             )
         # duplicate one-to-one protection
-        if Student.objects.filter(user=user).exists():
+        if Student.objects.filter(user=user).exclude(pk=getattr(self.instance, "pk", None)).exists():
             raise serializers.ValidationError(
                 {"user_id": "Student profile already exists for this user."}
             )
@@ -58,8 +92,16 @@ class LessonSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, data):
-        if data["end"] <= data["start"]:
+        start = data.get("start", getattr(self.instance, "start", None))
+        end = data.get("end", getattr(self.instance, "end", None))
+        trainer = data.get("trainer", getattr(self.instance, "trainer", None))
+        if start and end and end <= start:
             raise serializers.ValidationError("end must be after start")
+        if start and end and trainer:
+            check_trainer_free(
+                trainer.pk, start, end,
+                exclude_lesson=self.instance.pk if self.instance else None,
+            )
         return data
 
 
@@ -94,10 +136,28 @@ class TrainingSessionSerializer(serializers.ModelSerializer):
             "status",
             "notes",
             "price",
+            "series",
+            "occurrence_start",
             "created_at",
             "updated_at",
         )
-        read_only_fields = ("created_at", "updated_at")
+        read_only_fields = ("series", "occurrence_start", "created_at", "updated_at")
+
+    def validate(self, attrs):
+        def current(name):
+            return attrs.get(name, getattr(self.instance, name, None))
+
+        trainer = current("trainer")
+        start = current("scheduled_date")
+        duration = current("duration_minutes")
+        if trainer and start and duration and current("status") != "cancelled":
+            check_trainer_free(
+                trainer.user_id, start, start + timedelta(minutes=duration),
+                exclude_session=self.instance.pk if self.instance else None,
+                # A new exception replaces the occurrence it is materialized from.
+                exclude_occurrence=self.context.get("occurrence"),
+            )
+        return attrs
 
     def get_trainer_name(self, obj):
         user = obj.trainer.user
@@ -110,6 +170,110 @@ class TrainingSessionSerializer(serializers.ModelSerializer):
         return full_name if full_name else user.username
 
 
+class WeekdaysField(serializers.Field):
+    """Weekday bitmask, read as a list of day names.
+
+    Accepts a list of names or free text such as "Monday,Thursday".
+    """
+
+    def to_representation(self, value):
+        return [name for index, name in enumerate(WEEKDAYS) if value & (1 << index)]
+
+    def to_internal_value(self, data):
+        if isinstance(data, (list, tuple)):
+            data = ",".join(str(day) for day in data)
+        if not isinstance(data, str):
+            raise serializers.ValidationError("Expected a list of weekday names.")
+        mask = weekday_mask(data)
+        if not mask:
+            raise serializers.ValidationError("Name at least one weekday, e.g. Monday,Thursday.")
+        return mask
+
+
+class SessionSeriesSerializer(serializers.ModelSerializer):
+    trainer = serializers.PrimaryKeyRelatedField(
+        queryset=TrainerProfile.objects.select_related("user")
+    )
+    member = serializers.PrimaryKeyRelatedField(
+        queryset=MemberProfile.objects.select_related("user")
+    )
+    weekdays = WeekdaysField()
+
+    class Meta:
+        model = SessionSeries
+        fields = (
+            "id",
+            "trainer",
+            "member",
+            "session_type",
+            "starts_at",
+            "duration_minutes",
+            "weekdays",
+            "until",
+            "price",
+            "notes",
+            "created_at",
+            "updated_at",
+        )
+        read_only_fields = ("created_at", "updated_at")
+
+    def validate_duration_minutes(self, value):
+        if not 0 < value <= MAX_BOOKING.total_seconds() // 60:
+            raise serializers.ValidationError(
+                f"Duration must be between 1 and {int(MAX_BOOKING.total_seconds() // 60)} minutes."
+            )
+        return value
+
+    def validate(self, attrs):
+        starts_at = attrs.get("starts_at", getattr(self.instance, "starts_at", None))
+        until = attrs.get("until", getattr(self.instance, "until", None))
+        if starts_at and until and until < timezone.localdate(starts_at):
+            raise serializers.ValidationError({"until": "until must not be before starts_at."})
+        return attrs
+
+
+class SeriesExceptionSerializer(serializers.Serializer):
+    """One occurrence of a series, materialized as a ``TrainingSession``."""
+
+    occurrence_start = serializers.DateTimeField()
+    status = serializers.ChoiceField(choices=TrainingSession.STATUS_CHOICES, required=False)
+    scheduled_date = serializers.DateTimeField(required=False)
+    duration_minutes = serializers.IntegerField(min_value=1, required=False)
+    notes = serializers.CharField(allow_blank=True, required=False)
+
+    def validate_occurrence_start(self, value):
+        if not self.context["series"].is_occurrence(value):
+            raise serializers.ValidationError("Not an occurrence of this series.")
+        return value
+
+    @transaction.atomic
+    def save(self):
+        series = self.context["series"]
+        data = dict(self.validated_data)
+        occurrence = data.pop("occurrence_start")
+        session = TrainingSession.objects.filter(
+            series=series, occurrence_start=occurrence
+        ).first()
+        if session is not None:
+            serializer = TrainingSessionSerializer(session, data=data, partial=True)
+        else:
+            serializer = TrainingSessionSerializer(
+                data={
+                    "trainer": series.trainer_id,
+                    "member": series.member_id,
+                    "session_type": series.session_type,
+                    "scheduled_date": occurrence,
+                    "duration_minutes": series.duration_minutes,
+                    "price": series.price,
+                    "notes": series.notes,
+                    **data,
+                },
+                context={"occurrence": (series.pk, occurrence)},
+            )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save(series=series, occurrence_start=occurrence)
+
+
 class MachineSerializer(serializers.ModelSerializer):
     class Meta:
         model = Machine
@@ -117,6 +281,76 @@ class MachineSerializer(serializers.ModelSerializer):
         read_only_fields = ("created_at",)
 
 
+def plan_machines_prefetch():
+    """Prefetch a plan's machines, in order, with machine details joined in."""
+    return Prefetch(
+        "plan_machines",
+        queryset=PlanMachine.objects.select_related("machine").order_by("position"),
+    )
+
+
+class PlanMachinesField(serializers.Field):
+    """Plan machines in workout order.
+
+    Reads as inline machine details. Accepts a list of machine ids, a list of
+    ``{"machine": id, "sets": n, "reps": n}`` objects, or the legacy
+    comma-separated id string.
+    """
+
+    default_error_messages = {
+        "invalid": "Expected a list of machines or comma-separated machine IDs.",
+        "unknown": "Unknown machine IDs: {ids}.",
+    }
+
+    def to_representation(self, value):
+        rows = []
+        if "plan_machines" in getattr(value.instance, "_prefetched_objects_cache", {}):
+            plan_machines = value.all()
+        else:
+            # e.g. after an update, which drops the prefetch
+            plan_machines = value.select_related("machine").order_by("position")
+        for pm in plan_machines:
+            sets = pm.sets if pm.sets is not None else pm.plan.sets
+            reps = pm.reps if pm.reps is not None else pm.plan.reps
+            rows.append(
+                {
+                    "machine": pm.machine_id,
+                    "code": pm.machine.code,
+                    "name": pm.machine.name,
+                    "position": pm.position,
+                    "sets": sets,
+                    "reps": reps,
+                }
+            )
+        return rows
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [token.strip() for token in data.split(",") if token.strip()]
+        if not isinstance(data, list):
+            self.fail("invalid")
+        entries = []
+        for item in data:
+            if not isinstance(item, dict):
+                item = {"machine": item}
+            try:
+                entries.append(
+                    {
+                        "machine": int(item["machine"]),
+                        "sets": None if item.get("sets") is None else int(item["sets"]),
+                        "reps": None if item.get("reps") is None else int(item["reps"]),
+                    }
+                )
+            except (KeyError, TypeError, ValueError):
+                self.fail("invalid")
+        requested = {entry["machine"] for entry in entries}
+        found = set(Machine.objects.filter(pk__in=requested).values_list("pk", flat=True))
+        missing = sorted(requested - found)
+        if missing:
+            self.fail("unknown", ids=", ".join(map(str, missing)))
+        return entries
+
+
 class PlanSerializer(serializers.ModelSerializer):
     trainee = UserMiniSerializer(read_only=True)
     trainee_id = serializers.PrimaryKeyRelatedField(
@@ -125,6 +359,7 @@ class PlanSerializer(serializers.ModelSerializer):
         source="trainee"
     )
     trainee_name = serializers.SerializerMethodField()
+    machines = PlanMachinesField(source="plan_machines")
 
     class Meta:
         model = Plan
@@ -147,3 +382,36 @@ class PlanSerializer(serializers.ModelSerializer):
         user = obj.trainee
         full_name = f"{user.first_name} {user.last_name}".strip()
         return full_name if full_name else user.username
+
+    def validate_days(self, value):
+        if not weekday_mask(value):
+            raise serializers.ValidationError(
+                "Name at least one weekday, e.g. Monday,Wednesday,Friday."
+            )
+        return value
+
+    @transaction.atomic
+    def create(self, validated_data):
+        machines = validated_data.pop("plan_machines", [])
+        plan = super().create(validated_data)
+        self._set_machines(plan, machines)
+        return plan
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        machines = validated_data.pop("plan_machines", None)
+        plan = super().update(instance, validated_data)
+        if machines is not None:
+            plan.plan_machines.all().delete()
+            self._set_machines(plan, machines)
+        return plan
+
+    def _set_machines(self, plan, machines):
+        PlanMachine.objects.bulk_create(
+            PlanMachine(plan=plan, machine_id=entry["machine"], position=position,
+                        sets=entry["sets"], reps=entry["reps"])
+            for position, entry in enumerate(machines)
+        )
+        # Replace any stale prefetch so the response reflects the new rows.
+        getattr(plan, "_prefetched_objects_cache", {}).pop("plan_machines", None)
+        prefetch_related_objects([plan], plan_machines_prefetch())
@@ -0,0 +1,120 @@
+# training/signals.py
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from users.models import MemberProfile, TrainerProfile
+
+from . import response_cache, rollups, search
+from .models import Machine, Payment, Plan, Student, TrainingSession
+
+User = get_user_model()
+_UNLOADED = object()
+
+
+@receiver(post_init, sender=TrainingSession)
+def remember_session_bucket(sender, instance, **kwargs):
+    instance._rollup_key = rollups.session_key(instance)
+
+
+@receiver(pre_save, sender=TrainingSession)
+@receiver(pre_delete, sender=TrainingSession)
+def load_session_bucket(sender, instance, raw=False, **kwargs):
+    # Loaded with deferred fields: post_init could not tell the bucket.
+    if not raw and instance._rollup_key is None and not instance._state.adding:
+        instance._rollup_key = rollups.stored_session_key(instance.pk)
+
+
+@receiver(post_save, sender=TrainingSession)
+def roll_up_session(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    key = rollups.session_key(instance, load=True)
+    rollups.apply_session(getattr(instance, "_rollup_key", None), key)
+    instance._rollup_key = key
+
+
+@receiver(post_delete, sender=TrainingSession)
+def roll_back_session(sender, instance, **kwargs):
+    rollups.apply_session(getattr(instance, "_rollup_key", None), None)
+
+
+@receiver(post_init, sender=Payment)
+def remember_payment_bucket(sender, instance, **kwargs):
+    instance._rollup_key = rollups.payment_key(instance)
+
+
+@receiver(pre_save, sender=Payment)
+@receiver(pre_delete, sender=Payment)
+def load_payment_bucket(sender, instance, raw=False, **kwargs):
+    if not raw and instance._rollup_key is None and not instance._state.adding:
+        instance._rollup_key = rollups.stored_payment_key(instance.pk)
+
+
+@receiver(post_save, sender=Payment)
+def roll_up_payment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    key = rollups.payment_key(instance, load=True)
+    rollups.apply_payment(getattr(instance, "_rollup_key", None), key)
+    instance._rollup_key = key
+
+
+@receiver(post_delete, sender=Payment)
+def roll_back_payment(sender, instance, **kwargs):
+    rollups.apply_payment(getattr(instance, "_rollup_key", None), None)
+
+
+@receiver(post_save, sender=Machine)
+@receiver(post_delete, sender=Machine)
+def invalidate_machines(sender, **kwargs):
+    response_cache.invalidate("machines")
+
+
+@receiver(post_save, sender=TrainerProfile)
+@receiver(post_delete, sender=TrainerProfile)
+def invalidate_trainers(sender, **kwargs):
+    response_cache.invalidate("trainers")
+
+
+@receiver(post_save, sender=User)
+def move_trainee_payments(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw or not instance.changed(("trainer_id",)):
+        return
+    old = instance.loaded_value("trainer_id", default=_UNLOADED)
+    if old is not _UNLOADED:
+        rollups.reassign_payments(instance.pk, old, instance.trainer_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_trainer_user(sender, instance, **kwargs):
+    # Trainer lists show the user's names and email; other users never appear.
+    if User.Role.TRAINER in (instance.role, instance.loaded_value("role")):
+        response_cache.invalidate("trainers")
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=MemberProfile)
+@receiver(post_save, sender=TrainingSession)
+@receiver(post_save, sender=Plan)
+@receiver(post_save, sender=Machine)
+def index_for_search(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index(search.KINDS[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=MemberProfile)
+@receiver(post_delete, sender=TrainingSession)
+@receiver(post_delete, sender=Plan)
+@receiver(post_delete, sender=Machine)
+def unindex_for_search(sender, instance, **kwargs):
+    search.unindex(search.KINDS[sender], [instance.pk])
+
+
+@receiver(post_save, sender=User)
+def reindex_user_names(sender, instance, created=False, raw=False, **kwargs):
+    if not (created or raw) and instance.changed(search.USER_FIELDS):
+        search.reindex_user(instance.pk)
@@ -1,10 +1,62 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, date
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, OperationalError
+from django.db.models import Sum
+from django.db.utils import ConnectionHandler
+from django.test import TestCase, AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
-from decimal import Decimal
-from datetime import datetime, timedelta
-from .models import Student, Lesson, Payment
+
+from config import dbpool, metrics
+from config.dbpool.sqlite3.base import DatabaseWrapper
+from config.replicas import ReplicaRouter
+from config.testing import APITestCase
+from users.authentication import user_states
+from users.models import TrainerProfile, MemberProfile
+from users.serializers import UserLoginSerializer
+from users.views import TrainerViewSet, async_me_view
+
+from . import response_cache, rollups
+from .async_reads import async_list
+from .calendar import encode_cursor
+from .exports import export_rows
+from .models import (
+    Student,
+    Lesson,
+    Payment,
+    TrainingSession,
+    Machine,
+    Plan,
+    PlanMachine,
+    SessionSeries,
+    DailySessionStat,
+    DailyPaymentStat,
+    weekday_mask,
+    SearchToken,
+)
+from .payroll import compute_payroll
+from .response_cache import stats
+from .scheduling import find_conflicts
+from .scope import scope_for
+from .views import LessonViewSet, MachineViewSet, TrainingSessionViewSet
 
 User = get_user_model()
 
@@ -124,3 +176,1872 @@ class StudentAPITest(APITestCase):
         response = self.client.get('/api/students/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+
+class KeysetPaginationAPITest(APITestCase):
+    """Test cursor mode on the session, lesson and payment lists"""
+
+    def setUp(self):
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        other_trainer = User.objects.create_user(username='trainer2', role='TRAINER')
+        trainee = User.objects.create_user(
+            username='trainee1', role='TRAINEE', trainer=self.trainer
+        )
+        self.trainer_profile = TrainerProfile.objects.create(
+            user=self.trainer, specialization='Strength'
+        )
+        other_profile = TrainerProfile.objects.create(
+            user=other_trainer, specialization='Cardio'
+        )
+        member = MemberProfile.objects.create(
+            user=trainee,
+            membership_start_date='2025-01-01',
+            membership_end_date='2025-12-31',
+        )
+        base = timezone.now().replace(microsecond=123456)
+        for i in range(45):
+            # Pairs of sessions share a timestamp so the id tiebreaker matters.
+            TrainingSession.objects.create(
+                trainer=self.trainer_profile,
+                member=member,
+                session_type='personal',
+                scheduled_date=base - timedelta(hours=i // 2),
+                duration_minutes=60,
+                price=Decimal('100.00') + i,
+            )
+        TrainingSession.objects.create(
+            trainer=other_profile,
+            member=member,
+            session_type='group',
+            scheduled_date=base,
+            duration_minutes=60,
+            price=Decimal('50.00'),
+        )
+
+    def _walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor_walk_respects_scope_and_ordering(self):
+        """Test that following next links returns every scoped row once, in order"""
+        self.client.force_authenticate(user=self.trainer)
+        ids = self._walk('/api/training/sessions/?pagination=cursor')
+        expected = list(
+            TrainingSession.objects.filter(trainer=self.trainer_profile)
+            .order_by('-scheduled_date', '-pk')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_cursor_walk_follows_ordering_filter(self):
+        """Test that ?ordering= picks the seek column"""
+        self.client.force_authenticate(user=self.trainer)
+        ids = self._walk('/api/training/sessions/?pagination=cursor&ordering=price')
+        expected = list(
+            TrainingSession.objects.filter(trainer=self.trainer_profile)
+            .order_by('price', 'pk')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_prior_page(self):
+        """Test that the previous link of page 2 reproduces page 1"""
+        self.client.force_authenticate(user=self.trainer)
+        first = self.client.get('/api/training/sessions/?pagination=cursor')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [row['id'] for row in back.data['results']],
+            [row['id'] for row in first.data['results']],
+        )
+        self.assertIsNone(back.data['previous'])
+
+    def test_deep_page_skips_count_and_offset(self):
+        """Test that cursor pages issue neither COUNT(*) nor OFFSET"""
+        self.client.force_authenticate(user=self.trainer)
+        first = self.client.get('/api/training/sessions/?pagination=cursor')
+        second = self.client.get(first.data['next'])
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(second.data['next'])
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries).upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor(self):
+        """Test that a garbled cursor is rejected"""
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get('/api/training/sessions/?cursor=bogus')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_unchanged(self):
+        """Test that plain requests still get page-number pagination"""
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get('/api/training/sessions/')
+        self.assertEqual(response.data['count'], 45)
+
+
+class DashboardAPITest(APITestCase):
+    """Test the rollup-backed dashboard endpoint"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', role='ADMIN')
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.trainee = User.objects.create_user(
+            username='trainee1', role='TRAINEE', trainer=self.trainer
+        )
+        other = User.objects.create_user(username='trainer2', role='TRAINER')
+        self.profile = TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        other_profile = TrainerProfile.objects.create(
+            user=other, specialization='Cardio', is_available=False
+        )
+        self.member = MemberProfile.objects.create(
+            user=self.trainee,
+            membership_start_date='2025-01-01',
+            membership_end_date='2030-12-31',
+        )
+        self.student = Student.objects.create(user=self.trainee)
+        now = timezone.now()
+        self.session = TrainingSession.objects.create(
+            trainer=self.profile, member=self.member, session_type='personal',
+            scheduled_date=now, duration_minutes=60, price=Decimal('120.00'),
+            status='completed',
+        )
+        TrainingSession.objects.create(
+            trainer=other_profile, member=self.member, session_type='group',
+            scheduled_date=now, duration_minutes=45, price=Decimal('40.00'),
+        )
+        Payment.objects.create(student=self.student, amount_ils=Decimal('200.00'), method='CARD')
+
+    def _get(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/training/dashboard/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_admin_totals(self):
+        """Test that admins see gym-wide totals"""
+        data = self._get(self.admin)
+        self.assertEqual(data['members']['active'], 1)
+        self.assertEqual(data['trainers']['available'], 1)
+        self.assertEqual(data['sessions']['total'], 2)
+        self.assertEqual(data['sessions']['by_status']['completed'], 1)
+        self.assertEqual(data['sessions']['by_type']['group'], 1)
+        self.assertEqual(data['sessions']['completed_today'], 1)
+        self.assertEqual(data['revenue']['payments'], '200.00')
+        self.assertEqual(data['revenue']['sessions'], '120.00')
+        self.assertEqual(data['revenue']['total'], '320.00')
+
+    def test_trainer_and_trainee_scope(self):
+        """Test that trainers and trainees only see their own rows"""
+        trainer_data = self._get(self.trainer)
+        self.assertEqual(trainer_data['sessions']['total'], 1)
+        self.assertEqual(trainer_data['revenue']['payments'], '200.00')
+        trainee_data = self._get(self.trainee)
+        self.assertEqual(trainee_data['sessions']['total'], 2)
+        self.assertEqual(trainee_data['revenue']['sessions'], '120.00')
+
+    def test_rollups_follow_updates_and_deletes(self):
+        """Test that edits move a session between buckets and deletes remove it"""
+        self.session.status = 'cancelled'
+        self.session.save()
+        data = self._get(self.admin)
+        self.assertEqual(data['sessions']['by_status']['completed'], 0)
+        self.assertEqual(data['sessions']['by_status']['cancelled'], 1)
+        self.assertEqual(data['revenue']['sessions'], '0.00')
+        TrainingSession.objects.get(pk=self.session.pk).delete()
+        Payment.objects.all().delete()
+        data = self._get(self.admin)
+        self.assertEqual(data['sessions']['total'], 1)
+        self.assertEqual(data['revenue']['payments'], '0.00')
+
+    def test_rebuild_command_repairs_rollups(self):
+        """Test that the rebuild command recomputes drifted rollups"""
+        TrainingSession.objects.filter(pk=self.session.pk).update(status='scheduled')
+        DailySessionStat.objects.update(session_count=99)
+        call_command('rebuild_dashboard_rollups', stdout=StringIO())
+        data = self._get(self.admin)
+        self.assertEqual(data['sessions']['total'], 2)
+        self.assertEqual(data['sessions']['by_status']['scheduled'], 2)
+        self.assertEqual(data['revenue']['payments'], '200.00')
+
+    def test_rollups_follow_rows_loaded_with_deferred_fields(self):
+        """Test that saving or deleting a row loaded with only() still moves its bucket"""
+        session = TrainingSession.objects.only('id', 'status').get(pk=self.session.pk)
+        session.status = 'cancelled'
+        session.save()
+        data = self._get(self.admin)
+        self.assertEqual(data['sessions']['by_status']['completed'], 0)
+        self.assertEqual(data['sessions']['by_status']['cancelled'], 1)
+        payment = Payment.objects.defer('amount_ils').get()
+        payment.method = 'CASH'
+        payment.save()
+        self.assertEqual(
+            set(DailyPaymentStat.objects.values_list('method', 'payment_count')),
+            {('CARD', 0), ('CASH', 1)},
+        )
+        Payment.objects.only('id').get().delete()
+        self.assertEqual(self._get(self.admin)['revenue']['payments'], '0.00')
+
+    def test_reassigning_a_trainee_moves_their_payments(self):
+        """Test that payment buckets follow a trainee to their new trainer"""
+        other = User.objects.get(username='trainer2')
+        self.trainee.trainer = other
+        self.trainee.save()
+        self.assertEqual(self._get(self.trainer)['revenue']['payments'], '0.00')
+        self.assertEqual(self._get(other)['revenue']['payments'], '200.00')
+        moved = set(
+            DailyPaymentStat.objects.values_list('trainer_id').annotate(n=Sum('payment_count'))
+        )
+        self.assertEqual(moved, {(self.trainer.id, 0), (other.id, 1)})
+
+
+class PlanMachineAPITest(APITestCase):
+    """Test the plan-machine relation and the machine plans lookup"""
+
+    def setUp(self):
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.trainee = User.objects.create_user(
+            username='trainee1', role='TRAINEE', trainer=self.trainer
+        )
+        self.outsider = User.objects.create_user(username='trainee2', role='TRAINEE')
+        self.bench = Machine.objects.create(code='B1', name='Bench')
+        self.rower = Machine.objects.create(code='R1', name='Rower')
+
+    def _create_plan(self, machines, trainee=None):
+        self.client.force_authenticate(user=self.trainer)
+        return self.client.post('/api/training/plans/', {
+            'trainee_id': (trainee or self.trainee).id,
+            'description': 'Full body',
+            'machines': machines,
+            'days': 'Monday,Thursday',
+            'sets': 4,
+            'reps': 10,
+        }, format='json')
+
+    def test_legacy_string_is_parsed_in_order(self):
+        """Test that comma-separated ids still work and come back inline"""
+        response = self._create_plan(f'{self.rower.id}, {self.bench.id}')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        machines = response.data['machines']
+        self.assertEqual([m['name'] for m in machines], ['Rower', 'Bench'])
+        self.assertEqual(machines[0]['sets'], 4)
+
+    def test_per_machine_volume(self):
+        """Test that per-machine sets/reps override the plan defaults"""
+        response = self._create_plan([{'machine': self.bench.id, 'sets': 5, 'reps': 5}])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['machines'][0]['reps'], 5)
+
+    def test_unknown_machine_rejected(self):
+        """Test that unknown machine ids fail validation"""
+        response = self._create_plan('999')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_machine_plans_action_is_scoped(self):
+        """Test the reverse lookup only returns plans the caller may see"""
+        self._create_plan([self.bench.id])
+        plan = Plan.objects.create(trainee=self.outsider, description='Other', days='Friday')
+        PlanMachine.objects.create(plan=plan, machine=self.bench)
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get(f'/api/training/machines/{self.bench.id}/plans/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_plan_list_uses_single_prefetch(self):
+        """Test that listing plans does not query machines per plan"""
+        for _ in range(3):
+            self._create_plan([self.bench.id, self.rower.id])
+        self.client.force_authenticate(user=self.trainer)
+        # version aggregate (doubles as the page count), plans + trainee, plan machines + machine
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/training/plans/')
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class PlanScheduleAPITest(APITestCase):
+    """Test the weekday index and the today's-workouts endpoint"""
+
+    def setUp(self):
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.alice = User.objects.create_user(
+            username='alice', role='TRAINEE', trainer=self.trainer
+        )
+        self.bob = User.objects.create_user(
+            username='bob', role='TRAINEE', trainer=self.trainer
+        )
+        stranger = User.objects.create_user(username='carol', role='TRAINEE')
+        bench = Machine.objects.create(code='B1', name='Bench')
+        for trainee, days in [
+            (self.alice, 'Monday,Wednesday,Friday'),
+            (self.alice, 'mon/thu'),
+            (self.bob, 'Tuesday'),
+            (stranger, 'Mondays'),
+        ]:
+            plan = Plan.objects.create(trainee=trainee, description=days, days=days)
+            PlanMachine.objects.create(plan=plan, machine=bench)
+
+    def test_weekday_mask_parsing(self):
+        """Test that free-text days are stored as a bitmask"""
+        self.assertEqual(weekday_mask('Monday,Wednesday,Friday'), 0b10101)
+        self.assertEqual(weekday_mask('mon/thu'), 0b1001)
+        self.assertEqual(weekday_mask('Saturdays and Sundays'), 0b1100000)
+        self.assertEqual(weekday_mask('daily'), 0b1111111)
+        self.assertEqual(Plan.objects.get(days='Tuesday').weekdays, 0b10)
+
+    def test_today_groups_by_trainee_within_scope(self):
+        """Test that ?weekday= returns the caller's plans grouped by trainee"""
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get('/api/training/plans/today/?weekday=monday')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['day'], 'Monday')
+        groups = response.data['trainees']
+        self.assertEqual([g['trainee']['username'] for g in groups], ['alice'])
+        self.assertEqual(len(groups[0]['plans']), 2)
+        self.assertEqual(groups[0]['plans'][0]['machines'][0]['name'], 'Bench')
+
+    def test_invalid_weekday(self):
+        """Test that an unknown weekday is rejected"""
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get('/api/training/plans/today/?weekday=9')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AccessScopeTest(APITestCase):
+    """Test that scope resolution is shared and never lazy-loads relations"""
+
+    def setUp(self):
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.trainee = User.objects.create_user(
+            username='trainee1', role='TRAINEE', trainer=self.trainer
+        )
+        self.other = User.objects.create_user(username='trainee2', role='TRAINEE')
+        profile = TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        member = MemberProfile.objects.create(
+            user=self.trainee,
+            membership_start_date='2025-01-01',
+            membership_end_date='2030-12-31',
+        )
+        self.student = Student.objects.create(user=self.trainee)
+        self.other_student = Student.objects.create(user=self.other)
+        self.payments = [
+            Payment.objects.create(student=self.student, amount_ils=Decimal('10.00'), method='CASH')
+            for _ in range(5)
+        ]
+        self.foreign_payment = Payment.objects.create(
+            student=self.other_student, amount_ils=Decimal('10.00'), method='CASH'
+        )
+        self.session = TrainingSession.objects.create(
+            trainer=profile, member=member, session_type='personal',
+            scheduled_date=timezone.now(), duration_minutes=60, price=Decimal('50.00'),
+        )
+
+    def test_bulk_object_checks_resolve_scope_once(self):
+        """Test that checking many objects costs one query in total"""
+        request = SimpleNamespace(user=self.trainer)
+        payments = list(Payment.objects.order_by('pk'))
+        with self.assertNumQueries(1):
+            allowed = [scope_for(request).allows(p) for p in payments]
+        self.assertEqual(allowed, [True] * 5 + [False])
+
+    def test_trainer_payment_detail_query_count(self):
+        """Test a trainer's payment detail: the object plus the cached student ids"""
+        self.client.force_authenticate(user=self.trainer)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/training/payments/{self.payments[0].pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(f'/api/training/payments/{self.foreign_payment.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_trainee_session_detail_query_count(self):
+        """Test a trainee's session detail: one identity lookup shared by filter and check"""
+        self.client.force_authenticate(user=self.trainee)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/training/sessions/{self.session.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_other_trainee_cannot_see_session(self):
+        """Test that sessions of other members are hidden"""
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(f'/api/training/sessions/{self.session.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class DoubleBookingTest(APITestCase):
+    """Test trainer conflict detection across sessions and lessons"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', role='ADMIN')
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        trainee = User.objects.create_user(
+            username='trainee1', role='TRAINEE', trainer=self.trainer
+        )
+        self.profile = TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        self.member = MemberProfile.objects.create(
+            user=trainee,
+            membership_start_date='2025-01-01',
+            membership_end_date='2030-12-31',
+        )
+        self.student = Student.objects.create(user=trainee)
+        self.start = (timezone.now() + timedelta(days=1)).replace(
+            hour=10, minute=0, second=0, microsecond=0
+        )
+        self.session = TrainingSession.objects.create(
+            trainer=self.profile, member=self.member, session_type='personal',
+            scheduled_date=self.start, duration_minutes=60, price=Decimal('50.00'),
+        )
+
+    def _session_payload(self, start, minutes=30):
+        return {
+            'trainer': self.profile.pk,
+            'member': self.member.pk,
+            'session_type': 'personal',
+            'scheduled_date': start.isoformat(),
+            'duration_minutes': minutes,
+            'price': '40.00',
+        }
+
+    def test_ends_at_is_stored(self):
+        """Test that the session end is denormalised on save"""
+        self.assertEqual(self.session.ends_at, self.start + timedelta(hours=1))
+
+    def test_overlapping_session_rejected(self):
+        """Test that an overlapping session fails validation"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(
+            '/api/training/sessions/',
+            self._session_payload(self.start + timedelta(minutes=45)),
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('already booked', str(response.data))
+
+    def test_back_to_back_session_allowed(self):
+        """Test that a session starting when another ends is accepted"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(
+            '/api/training/sessions/',
+            self._session_payload(self.start + timedelta(hours=1)),
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_lesson_conflicts_with_session(self):
+        """Test that lessons are checked against sessions of the same trainer"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post('/api/training/lessons/', {
+            'trainer_id': self.trainer.pk,
+            'student': self.student.pk,
+            'start': (self.start + timedelta(minutes=30)).isoformat(),
+            'end': (self.start + timedelta(minutes=90)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rescheduling_does_not_conflict_with_itself(self):
+        """Test that updating a session excludes it from the conflict check"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.patch(
+            f'/api/training/sessions/{self.session.pk}/',
+            {'duration_minutes': 90},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.ends_at, self.start + timedelta(minutes=90))
+
+    def test_batch_conflicts_sweep(self):
+        """Test that the conflicts endpoint reports every overlapping pair"""
+        Lesson.objects.create(
+            trainer=self.trainer, student=self.student,
+            start=self.start + timedelta(minutes=30), end=self.start + timedelta(minutes=90),
+        )
+        Lesson.objects.create(
+            trainer=self.trainer, student=self.student,
+            start=self.start + timedelta(minutes=50), end=self.start + timedelta(minutes=70),
+        )
+        Lesson.objects.create(
+            trainer=self.trainer, student=self.student,
+            start=self.start + timedelta(hours=3), end=self.start + timedelta(hours=4),
+        )
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get('/api/training/conflicts/', {
+            'from': self.start.date().isoformat(),
+            'to': (self.start + timedelta(days=1)).date().isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['conflicts']), 3)
+
+    def test_sweep_is_output_sensitive(self):
+        """Test the sweep directly on a large synthetic day"""
+        bookings = [
+            (1, self.start + timedelta(minutes=i), self.start + timedelta(minutes=i + 1), 'lesson', i)
+            for i in range(5000)
+        ]
+        bookings.append((1, self.start, self.start + timedelta(minutes=2), 'session', 0))
+        self.assertEqual(len(find_conflicts(bookings)), 2)
+
+
+class CalendarAPITest(APITestCase):
+    """Test the merged session/lesson calendar feed"""
+
+    def setUp(self):
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.trainee = User.objects.create_user(
+            username='trainee1', role='TRAINEE', trainer=self.trainer
+        )
+        other_trainee = User.objects.create_user(username='trainee2', role='TRAINEE')
+        profile = TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        member = MemberProfile.objects.create(
+            user=self.trainee, membership_start_date='2025-01-01', membership_end_date='2030-12-31'
+        )
+        student = Student.objects.create(user=self.trainee)
+        other_student = Student.objects.create(user=other_trainee)
+        self.base = (timezone.now() + timedelta(days=1)).replace(
+            hour=8, minute=0, second=0, microsecond=0
+        )
+        self.expected = []
+        for hour in range(3):
+            session = TrainingSession.objects.create(
+                trainer=profile, member=member, session_type='personal',
+                scheduled_date=self.base + timedelta(hours=2 * hour), duration_minutes=60,
+                price=Decimal('10.00'),
+            )
+            lesson = Lesson.objects.create(
+                trainer=self.trainer, student=student, location='Hall, B',
+                start=self.base + timedelta(hours=2 * hour + 1),
+                end=self.base + timedelta(hours=2 * hour + 2),
+            )
+            self.expected += [('session', session.pk), ('lesson', lesson.pk)]
+        Lesson.objects.create(
+            trainer=self.trainer, student=other_student,
+            start=self.base, end=self.base + timedelta(minutes=30),
+        )
+        self.window = {
+            'from': self.base.date().isoformat(),
+            'to': (self.base + timedelta(days=1)).date().isoformat(),
+        }
+
+    def test_merged_stream_with_cursor(self):
+        """Test that pages merge both models in time order and continue by cursor"""
+        self.client.force_authenticate(user=self.trainee)
+        seen = []
+        response = self.client.get('/api/training/calendar/', {**self.window, 'limit': 4})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += [(row['kind'], row['item_id']) for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, self.expected)
+
+    def test_trainer_sees_all_own_bookings(self):
+        """Test that a trainer's scope includes every trainee's lessons"""
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get('/api/training/calendar/', self.window)
+        self.assertEqual(len(response.data['results']), 7)
+
+    def test_ics_rendering_and_feed(self):
+        """Test the iCalendar rendering and the token-authenticated feed"""
+        self.client.force_authenticate(user=self.trainee)
+        response = self.client.get('/api/training/calendar/', {**self.window, 'format': 'ics'})
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = response.content.decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 6)
+        self.assertIn('LOCATION:Hall\\, B', body)
+
+        feed_url = self.client.get('/api/training/calendar/', self.window).data['feed_url']
+        self.client.force_authenticate(user=None)
+        feed = self.client.get(feed_url)
+        self.assertEqual(feed.status_code, status.HTTP_200_OK)
+        self.assertEqual(feed.content.decode().count('BEGIN:VEVENT'), 6)
+        bogus = self.client.get('/api/training/calendar/feed/not-a-token/')
+        self.assertEqual(bogus.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rotating_the_feed_revokes_old_urls(self):
+        """Test that rotating the feed version retires previously issued URLs"""
+        self.client.force_authenticate(user=self.trainee)
+        old_url = self.client.get('/api/training/calendar/', self.window).data['feed_url']
+        response = self.client.post('/api/training/calendar/feed/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        new_url = response.data['feed_url']
+        self.assertNotEqual(new_url, old_url)
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(old_url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(new_url).status_code, status.HTTP_200_OK)
+
+    def test_naive_cursor_is_rejected(self):
+        """Test that a cursor without a UTC offset is refused instead of compared"""
+        self.client.force_authenticate(user=self.trainee)
+        cursor = encode_cursor(
+            {'start_at': self.base.replace(tzinfo=None), 'kind': 'session', 'item_id': 1}
+        )
+        response = self.client.get('/api/training/calendar/', {**self.window, 'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SessionSeriesAPITest(APITestCase):
+    """Test recurring session series, their exceptions and calendar expansion"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin1', role='ADMIN')
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.other_trainer = User.objects.create_user(username='trainer2', role='TRAINER')
+        self.trainee = User.objects.create_user(username='trainee1', role='TRAINEE')
+        self.profile = TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        TrainerProfile.objects.create(user=self.other_trainer, specialization='Cardio')
+        self.member = MemberProfile.objects.create(
+            user=self.trainee, membership_start_date='2025-01-01', membership_end_date='2030-12-31'
+        )
+        today = timezone.localdate()
+        monday = today - timedelta(days=today.weekday()) + timedelta(days=7)
+        self.first = timezone.make_aware(datetime.combine(monday, datetime.min.time()).replace(hour=18))
+        self.window = {
+            'from': monday.isoformat(),
+            'to': (monday + timedelta(days=14)).isoformat(),
+        }
+
+    def create_series(self, **overrides):
+        self.client.force_authenticate(user=self.admin)
+        payload = {
+            'trainer': self.profile.pk,
+            'member': self.member.pk,
+            'session_type': 'personal',
+            'starts_at': self.first.isoformat(),
+            'duration_minutes': 60,
+            'weekdays': ['Monday', 'Thursday'],
+            'until': (self.first + timedelta(days=60)).date().isoformat(),
+            'price': '50.00',
+            **overrides,
+        }
+        return self.client.post('/api/training/series/', payload, format='json')
+
+    def test_create_and_expand(self):
+        """Test that a series stores one row and expands to its weekdays"""
+        response = self.create_series()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['weekdays'], ['Monday', 'Thursday'])
+        self.assertEqual(TrainingSession.objects.count(), 0)
+
+        response = self.client.get(
+            f"/api/training/series/{response.data['id']}/occurrences/", self.window
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        starts = [row['occurrence_start'] for row in response.data['results']]
+        self.assertEqual(starts, [
+            self.first, self.first + timedelta(days=3),
+            self.first + timedelta(days=7), self.first + timedelta(days=10),
+        ])
+
+    def test_validation(self):
+        """Test that empty weekdays and an end before the start are rejected"""
+        response = self.create_series(weekdays=[])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('weekdays', response.data)
+        response = self.create_series(until=(self.first - timedelta(days=1)).date().isoformat())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('until', response.data)
+
+    def test_exception_replaces_occurrence(self):
+        """Test that a materialized occurrence replaces the virtual one"""
+        series_id = self.create_series().data['id']
+        url = f'/api/training/series/{series_id}/exceptions/'
+        response = self.client.post(url, {
+            'occurrence_start': (self.first + timedelta(days=3)).isoformat(),
+            'status': 'cancelled',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertEqual(response.data['series'], series_id)
+        session = TrainingSession.objects.get()
+        self.assertEqual(session.price, Decimal('50.00'))
+
+        # Posting the same occurrence again updates the stored row.
+        response = self.client.post(url, {
+            'occurrence_start': (self.first + timedelta(days=3)).isoformat(),
+            'notes': 'Moved to the small hall',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(TrainingSession.objects.count(), 1)
+        self.assertEqual(response.data['status'], 'cancelled')
+
+        response = self.client.post(url, {
+            'occurrence_start': (self.first + timedelta(days=1)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(f'/api/training/series/{series_id}/occurrences/', self.window)
+        self.assertEqual(len(response.data['results']), 3)
+
+        self.client.force_authenticate(user=self.trainee)
+        response = self.client.get('/api/training/calendar/', self.window)
+        rows = [(row['kind'], row['state']) for row in response.data['results']]
+        self.assertEqual(rows, [
+            ('occurrence', 'scheduled'), ('session', 'cancelled'),
+            ('occurrence', 'scheduled'), ('occurrence', 'scheduled'),
+        ])
+
+    def test_calendar_cursor_and_ics(self):
+        """Test that occurrences page by cursor and get stable iCalendar UIDs"""
+        self.create_series()
+        self.client.force_authenticate(user=self.trainer)
+        seen = []
+        response = self.client.get('/api/training/calendar/', {**self.window, 'limit': 3})
+        while True:
+            seen += [row['start_at'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(seen, sorted(seen))
+
+        response = self.client.get('/api/training/calendar/', {**self.window, 'format': 'ics'})
+        body = response.content.decode()
+        self.assertEqual(body.count('UID:occurrence-'), 4)
+
+    def test_sessions_list_expands_window(self):
+        """Test that a windowed sessions list merges stored rows and virtual occurrences"""
+        series_id = self.create_series().data['id']
+        self.client.post(f'/api/training/series/{series_id}/exceptions/', {
+            'occurrence_start': (self.first + timedelta(days=3)).isoformat(),
+            'scheduled_date': (self.first + timedelta(days=3, minutes=30)).isoformat(),
+        }, format='json')
+        stored = TrainingSession.objects.get()
+
+        self.client.force_authenticate(user=self.trainer)
+        with self.assertMaxQueries(4):
+            response = self.client.get('/api/training/sessions/', self.window)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [
+            (row['id'], row['series'], datetime.fromisoformat(row['scheduled_date']))
+            for row in response.data['results']
+        ]
+        self.assertEqual(rows, [
+            (None, series_id, self.first),
+            (stored.pk, series_id, self.first + timedelta(days=3, minutes=30)),
+            (None, series_id, self.first + timedelta(days=7)),
+            (None, series_id, self.first + timedelta(days=10)),
+        ])
+        self.assertEqual(response.data['results'][0]['trainer_name'], 'trainer1')
+
+        self.client.force_authenticate(user=self.other_trainer)
+        response = self.client.get('/api/training/sessions/', self.window)
+        self.assertEqual(response.data['results'], [])
+
+    def test_occurrences_block_double_booking(self):
+        """Test that booking checks and the conflict report see recurring slots"""
+        series_id = self.create_series().data['id']
+        response = self.client.post('/api/training/sessions/', {
+            'trainer': self.profile.pk,
+            'member': self.member.pk,
+            'session_type': 'personal',
+            'scheduled_date': (self.first + timedelta(days=7, minutes=30)).isoformat(),
+            'duration_minutes': 60,
+            'price': '10.00',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Moving an occurrence may overlap the slot it replaces.
+        response = self.client.post(f'/api/training/series/{series_id}/exceptions/', {
+            'occurrence_start': self.first.isoformat(),
+            'scheduled_date': (self.first + timedelta(minutes=30)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        student = Student.objects.create(user=self.trainee)
+        Lesson.objects.create(
+            trainer=self.trainer, student=student,
+            start=self.first + timedelta(days=10), end=self.first + timedelta(days=10, minutes=30),
+        )
+        response = self.client.get('/api/training/conflicts/', self.window)
+        pairs = [
+            {conflict['first']['kind'], conflict['second']['kind']}
+            for conflict in response.data['conflicts']
+        ]
+        self.assertEqual(pairs, [{'occurrence', 'lesson'}])
+
+    def test_scope(self):
+        """Test that other trainers cannot see a series"""
+        series_id = self.create_series().data['id']
+        self.client.force_authenticate(user=self.other_trainer)
+        response = self.client.get('/api/training/series/')
+        self.assertEqual(len(response.data['results']), 0)
+        response = self.client.get(f'/api/training/series/{series_id}/occurrences/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetTest(APITestCase):
+    """Test ETag / Last-Modified revalidation on list and detail endpoints"""
+
+    def setUp(self):
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        trainee = User.objects.create_user(username='trainee1', role='TRAINEE', trainer=self.trainer)
+        self.student = Student.objects.create(user=trainee)
+        self.lesson = Lesson.objects.create(
+            trainer=self.trainer, student=self.student,
+            start=timezone.make_aware(datetime(2025, 3, 1, 9, 0)), end=timezone.make_aware(datetime(2025, 3, 1, 10, 0)),
+        )
+        Lesson.objects.create(
+            trainer=self.trainer, student=self.student,
+            start=timezone.make_aware(datetime(2025, 3, 2, 9, 0)), end=timezone.make_aware(datetime(2025, 3, 2, 10, 0)),
+        )
+        self.client.force_authenticate(user=self.trainer)
+
+    def test_list_revalidation(self):
+        """Test that an unchanged list answers 304 and edits or deletes change the ETag"""
+        response = self.client.get('/api/training/lessons/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get('/api/training/lessons/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        # A different query is a different representation.
+        response = self.client.get('/api/training/lessons/?ordering=start', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.lesson.location = 'Studio B'
+        self.lesson.save()
+        response = self.client.get('/api/training/lessons/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        Lesson.objects.filter(pk=self.lesson.pk).delete()
+        response = self.client.get('/api/training/lessons/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_cursor_page_revalidation(self):
+        """Test that a keyset page is versioned by its own rows, without an aggregate"""
+        url = '/api/training/lessons/?pagination=cursor'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('MAX(', ctx.captured_queries[0]['sql'].upper())
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Lesson.objects.create(
+            trainer=self.trainer, student=self.student,
+            start=timezone.make_aware(datetime(2025, 3, 3, 9, 0)), end=timezone.make_aware(datetime(2025, 3, 3, 10, 0)),
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_etag_is_per_user(self):
+        """Test that another user's ETag for the same URL does not match"""
+        etag = self.client.get('/api/training/students/').get('ETag')
+        admin = User.objects.create_user(username='admin1', role='ADMIN')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/training/students/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_detail_revalidation(self):
+        """Test detail 304 by ETag and by If-Modified-Since"""
+        machine = Machine.objects.create(code='M1', name='Rower')
+        url = f'/api/training/machines/{machine.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class ResponseCacheTest(APITestCase):
+    """Test the signal-invalidated response cache for machines and trainers"""
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.admin = User.objects.create_user(username='admin1', role='ADMIN')
+        Machine.objects.create(code='M1', name='Rower')
+
+    def test_hit_skips_database_until_save(self):
+        """Test that repeated lists are served from cache and a save invalidates"""
+        self.client.force_authenticate(user=self.trainer)
+        first = self.client.get('/api/training/machines/')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        hits = stats().get(('machines', 'hit'), 0)
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/training/machines/')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(stats()[('machines', 'hit')], hits + 1)
+
+        # Each page and query string is its own entry.
+        with self.assertNumQueries(2):
+            self.client.get('/api/training/machines/?search=row')
+
+        Machine.objects.create(code='M2', name='Bike')
+        response = self.client.get('/api/training/machines/')
+        self.assertEqual(response.json()['count'], 2)
+
+        Machine.objects.filter(code='M2').get().delete()
+        response = self.client.get('/api/training/machines/')
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_cached_response_revalidates(self):
+        """Test that a cache hit still answers If-None-Match with 304"""
+        self.client.force_authenticate(user=self.trainer)
+        etag = self.client.get('/api/training/machines/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/training/machines/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_trainer_user_change_invalidates(self):
+        """Test that renaming a trainer's user refreshes the trainer list"""
+        TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        self.client.force_authenticate(user=self.admin)
+        self.client.get('/api/users/trainers/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/users/trainers/')
+
+        self.trainer.first_name = 'Dana'
+        self.trainer.save()
+        response = self.client.get('/api/users/trainers/')
+        self.assertEqual(response.json()['results'][0]['first_name'], 'Dana')
+
+        # Saving an unrelated trainee leaves the entry alone.
+        User.objects.create_user(username='trainee9', role='TRAINEE')
+        with self.assertNumQueries(0):
+            self.client.get('/api/users/trainers/')
+
+    def test_concurrent_miss_waits_for_builder(self):
+        """Test that a request finding the build lock taken waits instead of building"""
+        self.client.force_authenticate(user=self.trainer)
+        self.client.get('/api/training/machines/')
+        Machine.objects.create(code='M2', name='Bike')
+        # Pretend another worker is already rebuilding the list.
+        key = None
+        original = response_cache.ResponseCacheMixin._cache_key
+
+        def capture(view, request):
+            nonlocal key
+            key = original(view, request)
+            caches['responses'].add(f'{key}:lock', 1, 5)
+            return key
+
+        waits = response_cache.stats().get(('machines', 'wait'), 0)
+        with mock.patch.object(response_cache.ResponseCacheMixin, '_cache_key', capture), \
+                mock.patch.object(response_cache, 'LOCK_TIMEOUT', 0.1):
+            response = self.client.get('/api/training/machines/')
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(response_cache.stats()[('machines', 'wait')], waits + 1)
+        # The waiter served without storing, so the key is still empty.
+        self.assertIsNone(caches['responses'].get(key))
+
+    def test_stats_endpoint_is_admin_only(self):
+        """Test that cache counters are exposed to admins"""
+        self.client.force_authenticate(user=self.trainer)
+        self.client.get('/api/training/machines/')
+        response = self.client.get('/api/training/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/training/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.data['machines']['miss'], 1)
+
+
+class ExportTest(APITestCase):
+    """Test streaming CSV / NDJSON exports"""
+
+    def setUp(self):
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        trainee = User.objects.create_user(username='trainee1', role='TRAINEE', trainer=self.trainer)
+        outsider = User.objects.create_user(username='trainee2', role='TRAINEE')
+        student = Student.objects.create(user=trainee)
+        other = Student.objects.create(user=outsider)
+        for amount, method in (('10.00', 'CASH'), ('20.50', 'CARD'), ('30.00', 'CARD')):
+            Payment.objects.create(student=student, amount_ils=Decimal(amount), method=method, note='a, "quoted" note')
+        Payment.objects.create(student=other, amount_ils=Decimal('99.00'), method='CASH')
+
+    def _body(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_is_scoped_and_streamed(self):
+        """Test that the CSV export streams only the caller's rows"""
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get('/api/training/payments/export/?format=csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('attachment; filename="payments-', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(self._body(response))))
+        self.assertEqual(rows[0], ['id', 'student_id', 'student', 'amount_ils', 'paid_at', 'method', 'note'])
+        self.assertEqual([row[3] for row in rows[1:]], ['10.00', '20.50', '30.00'])
+        self.assertEqual(rows[1][6], 'a, "quoted" note')
+
+    def test_ndjson_applies_filters(self):
+        """Test that the NDJSON export honours search filters"""
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get('/api/training/payments/export/?format=ndjson&search=CARD')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = [json.loads(line) for line in self._body(response).splitlines()]
+        self.assertEqual([line['amount_ils'] for line in lines], ['20.50', '30.00'])
+        self.assertEqual(lines[0]['student'], 'trainee1')
+
+    def test_rows_are_read_in_keyset_batches(self):
+        """Test that exports fetch fixed-size batches without offsets"""
+        with CaptureQueriesContext(connection) as ctx:
+            rows = list(export_rows(Payment.objects.all(), ['amount_ils'], chunk_size=2))
+        self.assertEqual(len(rows), 4)
+        # Two full batches, then an empty one that ends the stream.
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertNotIn('OFFSET', ' '.join(q['sql'] for q in ctx.captured_queries).upper())
+
+    def test_other_exports_and_auth(self):
+        """Test session and lesson exports exist and require authentication"""
+        self.assertEqual(
+            self.client.get('/api/training/lessons/export/?format=csv').status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get('/api/training/sessions/export/?format=csv')
+        self.assertEqual(self._body(response).strip().split(',')[0], 'id')
+        response = self.client.get('/api/training/lessons/export/?format=ndjson')
+        self.assertEqual(self._body(response), '')
+
+
+class RevenueReportTest(APITestCase):
+    """Test the revenue report over the daily rollups"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', role='ADMIN')
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        other = User.objects.create_user(username='trainer2', role='TRAINER')
+        self.trainee = User.objects.create_user(
+            username='trainee1', role='TRAINEE', trainer=self.trainer
+        )
+        walk_in = User.objects.create_user(username='trainee2', role='TRAINEE', trainer=other)
+        profile = TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        member = MemberProfile.objects.create(
+            user=self.trainee, membership_type='premium',
+            membership_start_date='2025-01-01', membership_end_date='2030-12-31',
+        )
+        self.today = timezone.localdate()
+        TrainingSession.objects.create(
+            trainer=profile, member=member, session_type='personal',
+            scheduled_date=timezone.now(), duration_minutes=60, price=Decimal('120.00'),
+            status='completed',
+        )
+        Payment.objects.create(
+            student=Student.objects.create(user=self.trainee),
+            amount_ils=Decimal('200.00'), method='CARD',
+        )
+        Payment.objects.create(
+            student=Student.objects.create(user=walk_in),
+            amount_ils=Decimal('50.00'), method='CASH',
+        )
+
+    def _get(self, user, query):
+        self.client.force_authenticate(user=user)
+        return self.client.get(f'/api/training/reports/revenue/?{query}')
+
+    def test_months_are_zero_filled(self):
+        """Test that every month in the range is returned, with or without revenue"""
+        year = self.today.year
+        response = self._get(self.admin, f'from={year}-01-01&to={year + 1}-01-01')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {row['key']: row for row in response.data['results']}
+        self.assertEqual(len(rows), 12)
+        current = rows[self.today.strftime('%Y-%m')]
+        self.assertEqual(current['payments'], '250.00')
+        self.assertEqual(current['sessions'], '120.00')
+        self.assertEqual(current['total'], '370.00')
+        self.assertEqual(current['payment_count'], 2)
+        quiet = [row for key, row in rows.items() if key != self.today.strftime('%Y-%m')]
+        self.assertTrue(all(row['total'] == '0.00' for row in quiet))
+
+    def test_group_by_method_and_membership(self):
+        """Test grouping by payment method and by the payer's membership type"""
+        by_method = {
+            row['key']: row['payments']
+            for row in self._get(self.admin, 'group_by=method').data['results']
+        }
+        self.assertEqual(by_method, {'CASH': '50.00', 'CARD': '200.00', 'TRANSFER': '0.00'})
+        by_membership = {
+            row['key']: row['total']
+            for row in self._get(self.admin, 'group_by=membership_type').data['results']
+        }
+        self.assertEqual(by_membership['premium'], '320.00')
+        self.assertEqual(by_membership[''], '50.00')
+        self.assertEqual(by_membership['vip'], '0.00')
+
+    def test_trainer_scope_and_trainee_forbidden(self):
+        """Test that trainers only see their own revenue and trainees see none"""
+        rows = self._get(self.trainer, 'group_by=trainer').data['results']
+        self.assertEqual([(row['key'], row['total']) for row in rows], [(self.trainer.id, '320.00')])
+        response = self._get(self.trainee, 'group_by=month')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self._get(self.admin, 'group_by=weekday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command_backfills_moved_rows(self):
+        """Test that rebuilding a range re-buckets rows changed behind the rollups"""
+        # update() skips the signals, so the rollups still say "this month".
+        last_year = timezone.localtime() - timedelta(days=400)
+        Payment.objects.filter(method='CASH').update(paid_at=last_year)
+        start = last_year.date() - timedelta(days=1)
+        end = self.today + timedelta(days=1)
+        out = StringIO()
+        call_command(
+            'rebuild_revenue_aggregates', '--from', str(start), '--to', str(end),
+            '--chunk-days', '90', stdout=out,
+        )
+        self.assertIn('Rebuilt', out.getvalue())
+        month = last_year.strftime('%Y-%m')
+        response = self._get(
+            self.admin, f'from={start.replace(day=1)}&to={end}&group_by=month'
+        )
+        rows = {row['key']: row for row in response.data['results']}
+        self.assertEqual(rows[month]['payments'], '50.00')
+        self.assertEqual(rows[self.today.strftime('%Y-%m')]['payments'], '200.00')
+
+    def test_membership_change_between_save_and_update(self):
+        """Test that rows keep the membership type they were bucketed under until resaved"""
+        profile = TrainerProfile.objects.get(user=self.trainer)
+        user = User.objects.create_user(username='trainee3', role='TRAINEE', trainer=self.trainer)
+        member = MemberProfile.objects.create(
+            user=user, membership_type='basic',
+            membership_start_date='2025-01-01', membership_end_date='2030-12-31',
+        )
+        session = TrainingSession.objects.create(
+            trainer=profile, member=member, session_type='group',
+            scheduled_date=timezone.now(), duration_minutes=60, price=Decimal('100.00'),
+        )
+        payment = Payment.objects.create(
+            student=Student.objects.create(user=user), amount_ils=Decimal('30.00'), method='TRANSFER',
+        )
+        member.membership_type = 'premium'
+        member.save()
+        session.status = 'completed'
+        session.save()
+        payment.amount_ils = Decimal('40.00')
+        payment.save()
+
+        sessions = set(
+            DailySessionStat.objects.filter(session_type='group')
+            .values_list('status', 'membership_type').annotate(n=Sum('session_count'), revenue=Sum('revenue'))
+        )
+        self.assertEqual(sessions, {
+            ('scheduled', 'basic', 0, Decimal('0.00')),
+            ('completed', 'premium', 1, Decimal('100.00')),
+        })
+        payments = set(
+            DailyPaymentStat.objects.filter(method='TRANSFER')
+            .values_list('membership_type').annotate(n=Sum('payment_count'), amount=Sum('amount'))
+        )
+        self.assertEqual(payments, {('basic', 0, Decimal('0.00')), ('premium', 1, Decimal('40.00'))})
+
+        by_membership = {
+            row['key']: row['total']
+            for row in self._get(self.admin, 'group_by=membership_type').data['results']
+        }
+        rollups.rebuild()
+        rebuilt = {
+            row['key']: row['total']
+            for row in self._get(self.admin, 'group_by=membership_type').data['results']
+        }
+        self.assertEqual(by_membership, rebuilt)
+        self.assertEqual(by_membership['premium'], '460.00')
+        self.assertEqual(by_membership['basic'], '0.00')
+
+
+class PayrollTest(APITestCase):
+    """Test trainer payroll over completed sessions"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', role='ADMIN')
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        other = User.objects.create_user(username='trainer2', role='TRAINER')
+        self.trainee = User.objects.create_user(username='trainee1', role='TRAINEE')
+        profile = TrainerProfile.objects.create(
+            user=self.trainer, specialization='Strength', hourly_rate=Decimal('100.00')
+        )
+        other_profile = TrainerProfile.objects.create(
+            user=other, specialization='Cardio', hourly_rate=Decimal('80.00')
+        )
+        member = MemberProfile.objects.create(
+            user=self.trainee, membership_start_date='2025-01-01', membership_end_date='2030-12-31',
+        )
+
+        def session(trainer, day, minutes, price, session_type='personal', status='completed'):
+            TrainingSession.objects.create(
+                trainer=trainer, member=member, session_type=session_type,
+                scheduled_date=timezone.make_aware(datetime(2025, 3, day, 10)),
+                duration_minutes=minutes, price=Decimal(price), status=status,
+            )
+
+        session(profile, 3, 60, '120.00')
+        session(profile, 4, 45, '50.00', session_type='group')
+        session(profile, 5, 60, '120.00', status='cancelled')
+        session(other_profile, 6, 90, '150.00', session_type='class')
+        # Outside the pay period.
+        TrainingSession.objects.create(
+            trainer=profile, member=member, session_type='personal',
+            scheduled_date=timezone.make_aware(datetime(2025, 4, 1, 10)),
+            duration_minutes=60, price=Decimal('120.00'), status='completed',
+        )
+        self.url = '/api/training/payroll/?from=2025-03-01&to=2025-04-01'
+
+    def test_hourly_basis(self):
+        """Test hours, per-type counts and hourly earnings for completed sessions only"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {row['username']: row for row in response.data['trainers']}
+        self.assertEqual(rows['trainer1']['hours'], '1.75')
+        self.assertEqual(rows['trainer1']['sessions'], 2)
+        self.assertEqual(
+            rows['trainer1']['sessions_by_type'], {'personal': 1, 'group': 1, 'class': 0}
+        )
+        self.assertEqual(rows['trainer1']['earnings'], '175.00')
+        self.assertEqual(rows['trainer2']['earnings'], '120.00')
+        self.assertEqual(response.data['totals']['earnings'], '295.00')
+
+    def test_commission_basis_and_validation(self):
+        """Test commission earnings and rejection of bad options"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(f'{self.url}&basis=commission&commission=0.5')
+        rows = {row['username']: row['earnings'] for row in response.data['trainers']}
+        self.assertEqual(rows, {'trainer1': '85.00', 'trainer2': '75.00'})
+        for query in ('basis=daily', 'commission=abc', 'commission=1.5'):
+            response = self.client.get(f'{self.url}&{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_scope(self):
+        """Test that trainers see only their own payroll and trainees none"""
+        self.client.force_authenticate(user=self.trainer)
+        response = self.client.get(self.url)
+        self.assertEqual([row['username'] for row in response.data['trainers']], ['trainer1'])
+        self.client.force_authenticate(user=self.trainee)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_single_query_and_command(self):
+        """Test that payroll is one grouped query and that the command prints it"""
+        with self.assertNumQueries(1):
+            compute_payroll(date(2025, 3, 1), date(2025, 4, 1))
+        out = StringIO()
+        call_command('compute_payroll', '--from', '2025-03-01', '--to', '2025-04-01', stdout=out)
+        self.assertIn('trainer1', out.getvalue())
+        self.assertIn('295.00 total', out.getvalue())
+
+
+class SearchIndexTest(APITestCase):
+    """Test ?search= answered from the token index"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', role='ADMIN')
+        self.trainer = User.objects.create_user(username='coach', role='TRAINER')
+        self.dana = User.objects.create_user(
+            username='dana', first_name='Dana', last_name='Levi', role='TRAINEE'
+        )
+        self.levin = User.objects.create_user(username='levin', role='TRAINEE')
+        profile = TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        self.member = MemberProfile.objects.create(
+            user=self.dana, membership_start_date='2025-01-01', membership_end_date='2030-12-31'
+        )
+        self.session = TrainingSession.objects.create(
+            trainer=profile, member=self.member, session_type='personal',
+            scheduled_date=timezone.now(), duration_minutes=60, price=Decimal('100.00'),
+            notes='Deadlift technique',
+        )
+        Student.objects.create(user=self.dana)
+        Student.objects.create(user=self.levin)
+        Machine.objects.create(code='LP-01', name='Leg Press', description='Plate loaded')
+        Machine.objects.create(code='RW-01', name='Rower', description='Leg drive and pull')
+        self.client.force_authenticate(user=self.admin)
+
+    def _names(self, url, key='username'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = response.json()['results']
+        # Students nest their user; members flatten the username.
+        return [row['user'][key] if isinstance(row.get('user'), dict) else row[key] for row in rows]
+
+    def test_prefix_terms_and_ranking(self):
+        """Test that every term must match a word prefix and better matches rank first"""
+        # "levi" is Dana's exact last name but only a prefix of "levin".
+        self.assertEqual(self._names('/api/training/students/?search=levi'), ['dana', 'levin'])
+        self.assertEqual(self._names('/api/training/students/?search=dan lev'), ['dana'])
+        self.assertEqual(self._names('/api/training/students/?search=ana'), [])
+        # Code and name outweigh description.
+        self.assertEqual(self._names('/api/training/machines/?search=leg', 'code'), ['LP-01', 'RW-01'])
+        self.assertEqual(self._names('/api/training/machines/?search=LP-01', 'code'), ['LP-01'])
+
+    def test_joined_fields_and_reindex_on_save(self):
+        """Test that joined names are searchable and kept current by signals"""
+        self.assertEqual(len(self._names('/api/training/sessions/?search=dana deadlift', 'id')), 1)
+        self.assertEqual(self._names('/api/users/members/?search=dana'), ['dana'])
+
+        self.dana.username = 'dana_k'
+        self.dana.save()
+        self.assertEqual(len(self._names('/api/training/sessions/?search=dana_k', 'id')), 1)
+        self.assertEqual(self._names('/api/users/members/?search=dana_k'), ['dana_k'])
+
+        self.session.notes = 'Squat'
+        self.session.save()
+        self.assertEqual(self._names('/api/training/sessions/?search=deadlift', 'id'), [])
+        self.session.delete()
+        self.assertFalse(SearchToken.objects.filter(kind='session').exists())
+
+    def test_explicit_ordering_and_rebuild(self):
+        """Test that ?ordering= overrides rank and the rebuild command restores the index"""
+        self.assertEqual(
+            self._names('/api/training/machines/?search=leg&ordering=-code', 'code'),
+            ['RW-01', 'LP-01'],
+        )
+        SearchToken.objects.all().delete()
+        self.assertEqual(self._names('/api/training/machines/?search=rower', 'code'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('2 machine', out.getvalue())
+        self.assertEqual(self._names('/api/training/machines/?search=rower', 'code'), ['RW-01'])
+
+
+class AsyncReadTest(APITestCase):
+    """Test that the async list variants answer like the sync viewsets"""
+
+    def setUp(self):
+        # Real tokens go through the user-state cache; ids are reused after rollback.
+        self.addCleanup(user_states.clear)
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        other = User.objects.create_user(username='trainer2', role='TRAINER')
+        trainee = User.objects.create_user(username='trainee1', role='TRAINEE', trainer=self.trainer)
+        profile = TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        other_profile = TrainerProfile.objects.create(user=other, specialization='Cardio')
+        member = MemberProfile.objects.create(
+            user=trainee, membership_start_date='2025-01-01', membership_end_date='2030-12-31'
+        )
+        for n, trainer in enumerate([profile, profile, other_profile]):
+            TrainingSession.objects.create(
+                trainer=trainer, member=member, session_type='personal',
+                scheduled_date=timezone.now() + timedelta(days=n), duration_minutes=60,
+                price=Decimal('100.00'),
+            )
+        Machine.objects.create(code='M1', name='Rower')
+        self.token = str(UserLoginSerializer.get_token(self.trainer).access_token)
+
+    def _both(self, view, path):
+        auth = f'Bearer {self.token}'
+        expected = self.client.get(path, HTTP_AUTHORIZATION=auth)
+        request = AsyncRequestFactory().get(path, headers={'Authorization': auth})
+        response = async_to_sync(view)(request)
+        return expected, response
+
+    def test_lists_match_sync_views(self):
+        """Test scoped, paginated and cached lists against the sync responses"""
+        cases = [
+            (async_list(TrainingSessionViewSet, 'session'), '/api/training/sessions/'),
+            (async_list(TrainingSessionViewSet, 'session'), '/api/training/sessions/?page_size=1&pagination=cursor'),
+            (async_list(LessonViewSet, 'lesson'), '/api/training/lessons/'),
+            (async_list(MachineViewSet, 'machine'), '/api/training/machines/?search=row'),
+            (async_list(TrainerViewSet, 'trainer'), '/api/users/trainers/'),
+        ]
+        for view, path in cases:
+            expected, response = self._both(view, path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, path)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content), path)
+        # A trainer only sees their own two sessions.
+        self.assertEqual(json.loads(response.content)['count'], 2)
+
+    def test_window_mode_is_served_by_the_sync_view(self):
+        """Test that ?from=&to= on the async sessions route keeps series expansion"""
+        today = timezone.localdate()
+        path = f'/api/training/sessions/?from={today}&to={today + timedelta(days=7)}'
+        expected, response = self._both(async_list(TrainingSessionViewSet, 'session'), path)
+        # The sync view's response is left for the handler to render.
+        response.render()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+        self.assertEqual(len(json.loads(response.content)['results']), 2)
+
+    def test_cached_list_miss_takes_the_build_lock(self):
+        """Test that an async miss finding the build lock taken waits instead of building"""
+        cache = caches['responses']
+        cache.clear()
+        self.addCleanup(cache.clear)
+        key = None
+        original = response_cache.ResponseCacheMixin._acache_key
+
+        async def capture(view, request):
+            nonlocal key
+            key = await original(view, request)
+            # Pretend another worker is already building the list.
+            await cache.aadd(f'{key}:lock', 1, 5)
+            return key
+
+        view = async_list(MachineViewSet, 'machine')
+        request = AsyncRequestFactory().get(
+            '/api/training/machines/', headers={'Authorization': f'Bearer {self.token}'}
+        )
+        waits = stats().get(('machines', 'wait'), 0)
+        with mock.patch.object(response_cache.ResponseCacheMixin, '_acache_key', capture), \
+                mock.patch.object(response_cache, 'LOCK_TIMEOUT', 0.1):
+            response = async_to_sync(view)(request)
+        self.assertEqual(json.loads(response.content)['count'], 1)
+        self.assertEqual(stats()[('machines', 'wait')], waits + 1)
+        # The waiter served without storing, and left the builder's lock alone.
+        self.assertIsNone(cache.get(key))
+        self.assertIsNotNone(cache.get(f'{key}:lock'))
+
+        # Without a competing builder the miss takes the lock, stores and releases it.
+        cache.delete(f'{key}:lock')
+        async_to_sync(view)(request)
+        self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(f'{key}:lock'))
+
+    def test_cached_list_keeps_cache_io_off_the_event_loop(self):
+        """Test that a cached async list never calls the blocking cache API on the loop"""
+        cache = caches['responses']
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        def off_loop(method):
+            def call(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                except RuntimeError:
+                    return method(*args, **kwargs)
+                raise AssertionError(f'cache.{method.__name__} ran on the event loop')
+            return call
+
+        view = async_list(MachineViewSet, 'machine')
+        request = AsyncRequestFactory().get(
+            '/api/training/machines/', headers={'Authorization': f'Bearer {self.token}'}
+        )
+        hits = stats().get(('machines', 'hit'), 0)
+        with mock.patch.multiple(cache, **{
+            name: off_loop(getattr(cache, name)) for name in ('get', 'add', 'set', 'delete')
+        }):
+            miss = async_to_sync(view)(request)
+            hit = async_to_sync(view)(request)
+        self.assertEqual(miss.status_code, status.HTTP_200_OK)
+        self.assertEqual(hit.content, miss.content)
+        self.assertEqual(stats()[('machines', 'hit')], hits + 1)
+
+    def test_auth_and_conditional_get(self):
+        """Test 401 without a token and 304 for a matching ETag"""
+        view = async_list(TrainingSessionViewSet, 'session')
+        factory = AsyncRequestFactory()
+        response = async_to_sync(view)(factory.get('/api/training/sessions/'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        auth = f'Bearer {self.token}'
+        for path in ('/api/training/sessions/', '/api/training/sessions/?pagination=cursor'):
+            first = async_to_sync(view)(factory.get(path, headers={'Authorization': auth}))
+            second = async_to_sync(view)(factory.get(
+                path, headers={'Authorization': auth, 'If-None-Match': first['ETag']}
+            ))
+            self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED, path)
+
+        me = async_to_sync(async_me_view)(factory.get('/api/me', headers={'Authorization': auth}))
+        self.assertEqual(me.status_code, status.HTTP_200_OK)
+        self.assertEqual(me.data['username'], 'trainer1')
+
+
+class DatabasePoolTest(APITestCase):
+    """Test the pooled database engines against a SQLite file"""
+
+    def _wrapper(self, alias='pooled', **pool):
+        if not hasattr(self, 'db_path'):
+            handle, self.db_path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(handle)
+            self.addCleanup(os.remove, self.db_path)
+            self.addCleanup(dbpool.close_pools)
+        handler = ConnectionHandler({
+            'default': {'ENGINE': 'config.dbpool.sqlite3', 'NAME': self.db_path, 'POOL': pool},
+        })
+        wrapper = DatabaseWrapper(handler.settings['default'], alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_connections_are_reused_and_counted(self):
+        """Test that closing returns the connection for the next checkout"""
+        db = self._wrapper()
+        db.ensure_connection()
+        raw = db.connection
+        db.close()
+        db.ensure_connection()
+        self.assertIs(db.connection, raw)
+        stats = db.pool.stats()
+        self.assertEqual((stats['checkouts'], stats['created'], stats['in_use']), (2, 1, 1))
+
+    def test_open_transaction_is_rolled_back_on_return(self):
+        """Test that a connection closed mid-transaction comes back clean"""
+        db = self._wrapper()
+        with db.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (n integer)')
+        db.set_autocommit(False)
+        with db.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (1)')
+        db.close()
+        with db.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM t')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertTrue(db.get_autocommit())
+
+    def test_broken_and_expired_connections_are_replaced(self):
+        """Test the checkout health check and the maximum lifetime"""
+        db = self._wrapper()
+        db.ensure_connection()
+        raw = db.connection
+        db.close()
+        raw.close()  # dies while idle
+        db.ensure_connection()
+        self.assertIsNot(db.connection, raw)
+        self.assertEqual(db.pool.stats()['failed_checks'], 1)
+        db.close()
+
+        db = self._wrapper(alias='short', MAX_LIFETIME=0.05)
+        db.ensure_connection()
+        raw = db.connection
+        db.close()
+        time.sleep(0.06)
+        db.ensure_connection()
+        self.assertIsNot(db.connection, raw)
+        self.assertEqual(db.pool.stats()['recycled'], 1)
+
+    def test_waiters_time_out_when_the_pool_is_full(self):
+        """Test that checkout gives up after TIMEOUT with every connection in use"""
+        holder = self._wrapper(MAX_SIZE=1, TIMEOUT=0.05)
+        holder.ensure_connection()
+        waiter = self._wrapper(MAX_SIZE=1, TIMEOUT=0.05)
+        with self.assertRaises(OperationalError):
+            waiter.ensure_connection()
+        stats = holder.pool.stats()
+        self.assertEqual((stats['size'], stats['timeouts'], stats['waits']), (1, 1, 1))
+
+        # A connection handed back wakes a waiting checkout.
+        holder.pool.timeout = 5
+        holder.inc_thread_sharing()
+        threading.Timer(0.05, holder.close).start()
+        waiter.ensure_connection()
+        self.assertEqual(waiter.pool.stats()['waits'], 2)
+
+    def test_stats_endpoint_is_admin_only(self):
+        """Test that pool counters are exposed to admins"""
+        self._wrapper().ensure_connection()
+        trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        admin = User.objects.create_user(username='admin1', role='ADMIN')
+        self.client.force_authenticate(user=trainer)
+        response = self.client.get('/api/training/db-pool-stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/training/db-pool-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['pooled']['checkouts'], 1)
+
+
+class ReadReplicaTest(APITestCase):
+    """Test replica routing against a second SQLite database"""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.addCleanup(user_states.clear)
+        self.addCleanup(caches['responses'].clear)
+        replicas = override_settings(DATABASE_REPLICAS=('replica',))
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        self.admin = User.objects.create_user(username='admin1', role='ADMIN')
+        # The replica has the account but, "lagging", none of the rows below.
+        User.objects.db_manager('replica').create_user(id=self.admin.pk, username='admin1', role='ADMIN')
+        Machine.objects.create(code='M1', name='Rower')
+
+    def _count(self, **headers):
+        return self.client.get('/api/training/machines/', **headers).json()['count']
+
+    def test_reads_use_the_replica_until_a_write_pins_the_client(self):
+        """Test that a write sends the writer's next reads to the primary"""
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self._count(), 0)
+        response = self.client.post('/api/training/machines/', {'code': 'M2', 'name': 'Bike'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(self._count(), 2)
+        self.client.cookies.clear()
+        caches['responses'].clear()  # cached pages are shared by every client
+        self.assertEqual(self._count(), 0)
+
+    def test_jwt_marker_pins_without_the_cookie(self):
+        """Test that a bearer-token client stays pinned after losing the cookie"""
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {UserLoginSerializer.get_token(self.admin).access_token}'}
+        self.assertEqual(self._count(**auth), 0)
+        self.client.post('/api/training/machines/', {'code': 'M2', 'name': 'Bike'}, **auth)
+        self.client.cookies.clear()
+        self.assertEqual(self._count(**auth), 2)
+
+    def test_exports_and_reports_force_the_replica(self):
+        """Test that exports read from the replica even for a pinned client"""
+        trainee = User.objects.create_user(username='trainee1', role='TRAINEE')
+        student = Student.objects.create(user=trainee)
+        Payment.objects.create(student=student, amount_ils=Decimal('10.00'), method='CASH')
+        self.client.force_authenticate(user=self.admin)
+        self.client.post('/api/training/machines/', {'code': 'M2', 'name': 'Bike'})
+        self.assertEqual(self._count(), 2)
+
+        response = self.client.get('/api/training/payments/export/?format=csv')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.strip().splitlines(), ['id,student_id,student,amount_ils,paid_at,method,note'])
+        response = self.client.get('/api/training/reports/revenue/?group_by=method')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The pinned client's own reads still go to the primary.
+        self.assertEqual(len(self.client.get('/api/training/payments/').json()['results']), 1)
+
+    def test_reads_outside_requests_and_writes_use_the_primary(self):
+        """Test the router's defaults"""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Machine), 'default')
+        self.assertEqual(router.db_for_write(Machine), 'default')
+        self.assertIsNone(router.db_for_read(User._meta.get_field('groups').related_model))
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTest(APITestCase):
+    """Test the per-route metrics and the health probes"""
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.admin = User.objects.create_user(username='admin1', role='ADMIN')
+        self.machine = Machine.objects.create(code='M1', name='Rower')
+
+    def _scrape(self):
+        response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_requests_are_recorded_per_route(self):
+        """Test latency buckets, SQL counts and sizes keyed by URL pattern"""
+        self.client.force_authenticate(user=self.admin)
+        for _ in range(2):
+            self.client.get('/api/training/machines/')
+        detail = self.client.get(f'/api/training/machines/{self.machine.pk}/')
+        missing = self.client.get('/api/training/machines/999999/')
+
+        samples = self._scrape()
+        labels = 'route="api/training/machines/",method="GET"'
+        self.assertEqual(samples[f'gym_http_request_duration_seconds_count{{{labels}}}'], 2)
+        self.assertEqual(samples[f'gym_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'], 2)
+        self.assertGreater(samples[f'gym_http_db_queries_total{{{labels}}}'], 0)
+        self.assertGreater(samples[f'gym_http_response_bytes_total{{{labels}}}'], 0)
+        detail_labels = 'route="api/training/machines/<pk>/",method="GET"'
+        self.assertEqual(samples[f'gym_http_request_duration_seconds_count{{{detail_labels}}}'], 2)
+        self.assertEqual(
+            samples[f'gym_http_response_bytes_total{{{detail_labels}}}'],
+            len(detail.content) + len(missing.content),
+        )
+        self.assertEqual(samples[f'gym_http_responses_total{{{detail_labels},status="404"}}'], 1)
+        self.assertIn('gym_response_cache_events_total{namespace="machines",event="miss"}', samples)
+
+    def test_metrics_token(self):
+        """Test that scraping needs the configured token and is closed without one"""
+        self.assertEqual(self.client.get('/api/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with override_settings(METRICS_TOKEN=None):
+            response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer None')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_exited_threads_are_folded_into_one_shard(self):
+        """Test that shards of finished threads are merged, not kept per thread"""
+        def work():
+            metrics.record('api/x/', 'GET', 200, 0.001, size=10)
+
+        shards = len(metrics._shards)
+        for _ in range(5):
+            worker = threading.Thread(target=work)
+            worker.start()
+            worker.join()
+        self.assertLessEqual(len(metrics._shards), shards + 1)
+        routes, statuses = metrics.snapshot()
+        self.assertEqual(routes[('api/x/', 'GET')][metrics.COUNT], 5)
+        self.assertEqual(routes[('api/x/', 'GET')][metrics.BYTES], 50)
+        self.assertEqual(statuses[('api/x/', 'GET', 200)], 5)
+
+    def test_streamed_bytes_count_on_any_thread(self):
+        """Test that a body drained on another thread still adds its bytes"""
+        metrics.record('api/stream/', 'GET', 200, 0.001)
+        body = metrics._add_bytes('api/stream/', 'GET', iter([b'abc', b'de']))
+        drain = threading.Thread(target=lambda: b''.join(body))
+        drain.start()
+        drain.join()
+        routes, _ = metrics.snapshot()
+        self.assertEqual(routes[('api/stream/', 'GET')][metrics.BYTES], 5)
+        self.assertEqual(routes[('api/stream/', 'GET')][metrics.COUNT], 1)
+
+    def test_deep_health_check_times_the_database(self):
+        """Test the plain and deep health probes"""
+        self.assertEqual(self.client.get('/api/health').json(), {'status': 'ok'})
+        body = self.client.get('/api/health?deep=1').json()
+        self.assertEqual(body['status'], 'ok')
+        self.assertTrue(body['databases']['default']['ok'])
+        self.assertGreaterEqual(body['databases']['default']['seconds'], 0)
+
+
+class QueryBudgetTest(APITestCase):
+    """Test query budgets of every training endpoint and that lists do not grow with rows"""
+
+    LISTS = (
+        '/api/training/students/',
+        '/api/training/lessons/',
+        '/api/training/payments/',
+        '/api/training/sessions/',
+        '/api/training/series/',
+        '/api/training/machines/',
+        '/api/training/plans/',
+        '/api/training/plans/today/',
+        '/api/training/machines/{machine}/plans/',
+    )
+
+    def setUp(self):
+        self.addCleanup(caches['responses'].clear)
+        self.admin = User.objects.create_user(username='admin1', role='ADMIN')
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.profile = TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        self.machine = Machine.objects.create(code='SHARED', name='Rower')
+        self.seeded = 0
+        self._seed(1)
+        self.client.force_authenticate(user=self.admin)
+
+    def _seed(self, count):
+        """Add ``count`` rows of every kind, each with its own trainee."""
+        for n in range(self.seeded, self.seeded + count):
+            at = self.start + timedelta(hours=2 * n)
+            trainee = User.objects.create_user(
+                username=f'trainee{n}', first_name=f'T{n}', role='TRAINEE', trainer=self.trainer
+            )
+            student = Student.objects.create(user=trainee)
+            member = MemberProfile.objects.create(
+                user=trainee, membership_start_date='2025-01-01', membership_end_date='2030-12-31'
+            )
+            Lesson.objects.create(trainer=self.trainer, student=student, start=at, end=at + timedelta(hours=1))
+            Payment.objects.create(student=student, amount_ils=Decimal('10.00'), method='CASH')
+            TrainingSession.objects.create(
+                trainer=self.profile, member=member, session_type='personal',
+                scheduled_date=at + timedelta(hours=1), duration_minutes=60, price=Decimal('40.00'),
+            )
+            SessionSeries.objects.create(
+                trainer=self.profile, member=member, session_type='personal',
+                starts_at=at + timedelta(hours=12), duration_minutes=60, weekdays=0b1111111, until=(at + timedelta(days=30)).date(),
+                price=Decimal('40.00'),
+            )
+            machine = Machine.objects.create(code=f'M{n}', name=f'Machine {n}')
+            plan = Plan.objects.create(
+                trainee=trainee, description='Full body', days='Monday,Tuesday,Wednesday,'
+                'Thursday,Friday,Saturday,Sunday', weekdays=0b1111111,
+            )
+            PlanMachine.objects.create(plan=plan, machine=machine, position=0)
+            PlanMachine.objects.create(plan=plan, machine=self.machine, position=1)
+        self.seeded += count
+
+    def _request(self, method, path, data=None):
+        caches['responses'].clear()
+        response = getattr(self.client, method)(path, data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, (path, getattr(response, 'data', None)))
+
+    def _queries(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as captured:
+            self._request(method, path, data)
+        return len(captured)
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        """Test that each list endpoint runs as many queries for 100 rows as for 1"""
+        paths = [path.format(machine=self.machine.pk) for path in self.LISTS]
+        one = {path: self._queries('get', path) for path in paths}
+        self._seed(99)
+        hundred = {path: self._queries('get', path) for path in paths}
+        self.assertEqual(hundred, one)
+
+    def test_action_budgets(self):
+        """Test every viewset action against its query budget"""
+        student, lesson, payment = Student.objects.get(), Lesson.objects.get(), Payment.objects.get()
+        session, series, plan = TrainingSession.objects.get(), SessionSeries.objects.get(), Plan.objects.get()
+        trainee = User.objects.create_user(username='extra', role='TRAINEE', trainer=self.trainer)
+        later = self.start + timedelta(days=3)
+        cases = [
+            ('get', '/api/training/students/', None, 2),
+            ('get', f'/api/training/students/{student.pk}/', None, 1),
+            ('post', '/api/training/students/', {'user_id': trainee.pk, 'phone': '555'}, 8),
+            ('patch', f'/api/training/students/{student.pk}/', {'phone': '556'}, 7),
+            ('get', '/api/training/lessons/', None, 2),
+            ('get', f'/api/training/lessons/{lesson.pk}/', None, 1),
+            ('post', '/api/training/lessons/', {
+                'trainer_id': self.trainer.pk, 'student': student.pk,
+                'start': later.isoformat(), 'end': (later + timedelta(hours=1)).isoformat(),
+            }, 7),
+            ('patch', f'/api/training/lessons/{lesson.pk}/', {'location': 'Hall'}, 5),
+            ('get', '/api/training/lessons/export/?format=csv', None, 1),
+            ('get', '/api/training/payments/', None, 2),
+            ('get', f'/api/training/payments/{payment.pk}/', None, 1),
+            ('post', '/api/training/payments/', {'student': student.pk, 'amount_ils': '5.00', 'method': 'CARD'}, 8),
+            ('patch', f'/api/training/payments/{payment.pk}/', {'note': 'paid'}, 5),
+            ('get', '/api/training/sessions/', None, 2),
+            ('get', f'/api/training/sessions/{session.pk}/', None, 1),
+            ('post', '/api/training/sessions/', {
+                'trainer': self.profile.pk, 'member': session.member_id, 'session_type': 'personal',
+                'scheduled_date': (later + timedelta(hours=4)).isoformat(), 'duration_minutes': 30,
+                'price': '40.00',
+            }, 17),
+            ('patch', f'/api/training/sessions/{session.pk}/', {'notes': 'moved'}, 13),
+            ('get', '/api/training/series/', None, 2),
+            ('get', f'/api/training/series/{series.pk}/', None, 1),
+            ('post', '/api/training/series/', {
+                'trainer': self.profile.pk, 'member': session.member_id, 'session_type': 'personal',
+                'starts_at': (later + timedelta(days=40)).isoformat(), 'duration_minutes': 60,
+                'weekdays': ['Monday'], 'until': (later + timedelta(days=60)).date().isoformat(),
+                'price': '50.00',
+            }, 3),
+            ('patch', f'/api/training/series/{series.pk}/', {'notes': 'weekly'}, 2),
+            ('get', f'/api/training/series/{series.pk}/occurrences/', None, 3),
+            ('post', f'/api/training/series/{series.pk}/exceptions/', {
+                'occurrence_start': (series.starts_at + timedelta(days=1)).isoformat(), 'notes': 'moved',
+            }, 21),
+            ('get', '/api/training/machines/', None, 2),
+            ('get', f'/api/training/machines/{self.machine.pk}/', None, 1),
+            ('post', '/api/training/machines/', {'code': 'NEW', 'name': 'Sled'}, 7),
+            ('patch', f'/api/training/machines/{self.machine.pk}/', {'name': 'Rack'}, 7),
+            ('get', f'/api/training/machines/{self.machine.pk}/plans/', None, 4),
+            ('get', '/api/training/plans/', None, 3),
+            ('get', f'/api/training/plans/{plan.pk}/', None, 2),
+            ('post', '/api/training/plans/', {
+                'trainee_id': trainee.pk, 'description': 'Legs', 'machines': [self.machine.pk],
+                'days': 'Monday', 'sets': 3, 'reps': 10,
+            }, 12),
+            ('patch', f'/api/training/plans/{plan.pk}/', {'reps': 12}, 11),
+            ('get', '/api/training/plans/today/', None, 2),
+            ('delete', f'/api/training/plans/{plan.pk}/', None, 5),
+            ('delete', f'/api/training/series/{series.pk}/', None, 3),
+            ('delete', f'/api/training/sessions/{session.pk}/', None, 8),
+            ('delete', f'/api/training/payments/{payment.pk}/', None, 7),
+            ('delete', f'/api/training/lessons/{lesson.pk}/', None, 2),
+            ('delete', f'/api/training/machines/{self.machine.pk}/', None, 4),
+            ('delete', f'/api/training/students/{student.pk}/', None, 11),
+        ]
+        for method, path, data, budget in cases:
+            with self.subTest(method=method, path=path), self.assertMaxQueries(budget):
+                self._request(method, path, data)
@@ -1,12 +1,24 @@
 # training/urls.py
+from django.urls import path
 from rest_framework.routers import DefaultRouter
+from .async_reads import async_list_paths
 from .views import (
     StudentViewSet,
     LessonViewSet,
     PaymentViewSet,
     TrainingSessionViewSet,
+    SessionSeriesViewSet,
     MachineViewSet,
     PlanViewSet,
+    DashboardView,
+    RevenueReportView,
+    PayrollView,
+    ConflictsView,
+    ResponseCacheStatsView,
+    DatabasePoolStatsView,
+    CalendarView,
+    CalendarFeedView,
+    CalendarFeedRotateView,
 )
 
 router = DefaultRouter()
@@ -14,6 +26,22 @@ router.register(r"students", StudentViewSet, basename="student")
 router.register(r"lessons", LessonViewSet, basename="lesson")
 router.register(r"payments", PaymentViewSet, basename="payment")
 router.register(r"sessions", TrainingSessionViewSet, basename="session")
+router.register(r"series", SessionSeriesViewSet, basename="series")
 router.register(r"machines", MachineViewSet, basename="machine")
 router.register(r"plans", PlanViewSet, basename="plan")
-urlpatterns = router.urls
+urlpatterns = [
+    *async_list_paths("sessions/", TrainingSessionViewSet, "session"),
+    *async_list_paths("lessons/", LessonViewSet, "lesson"),
+    *async_list_paths("machines/", MachineViewSet, "machine"),
+    path("dashboard/", DashboardView.as_view(), name="dashboard"),
+    path("reports/revenue/", RevenueReportView.as_view(), name="revenue-report"),
+    path("payroll/", PayrollView.as_view(), name="payroll"),
+    path("conflicts/", ConflictsView.as_view(), name="conflicts"),
+    path("cache-stats/", ResponseCacheStatsView.as_view(), name="cache-stats"),
+    path("db-pool-stats/", DatabasePoolStatsView.as_view(), name="db-pool-stats"),
+    path("calendar/", CalendarView.as_view(), name="calendar"),
+    path("calendar/feed/", CalendarFeedRotateView.as_view(), name="calendar-feed-rotate"),
+    path("calendar/feed/<str:token>/", CalendarFeedView.as_view(), name="calendar-feed"),
+]
+
+urlpatterns += router.urls
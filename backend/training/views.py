@@ -1,13 +1,53 @@
 # training/views.py
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework import viewsets, permissions, filters
-from .models import Student, Lesson, Payment, TrainingSession, Machine, Plan
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from config import dbpool
+from config.replicas import force_replica
+from . import calendar
+from .conditional import ConditionalGetMixin
+from .exports import ExportMixin
+from .models import (
+    Student,
+    Lesson,
+    Payment,
+    TrainingSession,
+    SessionSeries,
+    Machine,
+    Plan,
+    WEEKDAYS,
+    masks_with_weekday,
+)
+from .pagination import KeysetPagination
+from .payroll import compute_payroll, payroll_options
+from .recurrence import occurrence_rows, occurrence_sessions
+from .renderers import ICalendarRenderer
+from .reports import report_range, revenue_report
+from .response_cache import ResponseCacheMixin, stats as response_cache_stats
+from .rollups import dashboard_summary
+from .search import IndexedSearchFilter
+from .scheduling import MAX_BOOKING, find_conflicts, requested_window, trainer_bookings
+from .scope import AccessScope, scope_for
 from .serializers import (
     StudentSerializer,
     LessonSerializer,
     PaymentSerializer,
     TrainingSessionSerializer,
+    SessionSeriesSerializer,
+    SeriesExceptionSerializer,
     MachineSerializer,
     PlanSerializer,
+    plan_machines_prefetch,
 )
 
 
@@ -16,35 +56,14 @@ class IsAdminOrTrainerReadOwn(permissions.BasePermission):
         return req.user and req.user.is_authenticated
 
     def has_object_permission(self, req, view, obj):
-        u = req.user
-        if getattr(u, "role", None) == "ADMIN":
-            return True
-        if isinstance(obj, Student):
-            return (
-                (u.role == "TRAINER")
-                and (obj.user.trainer_id == u.id)
-                or (u.role == "TRAINEE" and obj.user_id == u.id)
-            )
-        if isinstance(obj, Lesson):
-            if u.role == "TRAINER":
-                return obj.trainer_id == u.id
-            if u.role == "TRAINEE":
-                return obj.student.user_id == u.id
-        if isinstance(obj, Payment):
-            if u.role == "TRAINER":
-                return obj.student.user.trainer_id == u.id
-            if u.role == "TRAINEE":
-                return obj.student.user_id == u.id
-        if isinstance(obj, TrainingSession):
-            if u.role == "TRAINER":
-                return obj.trainer.user_id == u.id
-            if u.role == "TRAINEE":
-                return obj.member.user_id == u.id
-        return False
-
-
-class BaseViewSet(viewsets.ModelViewSet):
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+        return scope_for(req).allows(obj)
+
+
+class BaseViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    filter_backends = [IndexedSearchFilter, filters.OrderingFilter]
+
+    def get_queryset(self):
+        return scope_for(self.request).filter(super().get_queryset())
 
 
 class StudentViewSet(BaseViewSet):
@@ -53,103 +72,395 @@ class StudentViewSet(BaseViewSet):
     serializer_class = StudentSerializer
     permission_classes = [IsAdminOrTrainerReadOwn]
     search_fields = ["user__username", "user__first_name", "user__last_name"]
+    search_index = "student"
 
-    def get_queryset(self):
-        u = self.request.user
-        if u.role == "ADMIN":
-            return super().get_queryset()
-        if u.role == "TRAINER":
-            return super().get_queryset().filter(user__trainer_id=u.id)
-        return super().get_queryset().filter(user_id=u.id)
 
-
-class LessonViewSet(BaseViewSet):
+class LessonViewSet(ExportMixin, BaseViewSet):
     queryset = Lesson.objects.select_related("trainer", "student", "student__user")
     serializer_class = LessonSerializer
     permission_classes = [IsAdminOrTrainerReadOwn]
+    pagination_class = KeysetPagination
     search_fields = ["location", "student__user__username"]
     ordering_fields = ["start", "end", "price_ils"]
-
-    def get_queryset(self):
-        u = self.request.user
-        if u.role == "ADMIN":
-            return super().get_queryset()
-        if u.role == "TRAINER":
-            return super().get_queryset().filter(trainer_id=u.id)
-        return super().get_queryset().filter(student__user_id=u.id)
+    export_columns = (
+        ("id", "id"),
+        ("trainer_id", "trainer_id"),
+        ("trainer", "trainer__username"),
+        ("student_id", "student_id"),
+        ("student", "student__user__username"),
+        ("start", "start"),
+        ("end", "end"),
+        ("location", "location"),
+        ("is_completed", "is_completed"),
+        ("price_ils", "price_ils"),
+    )
 
 
-class PaymentViewSet(BaseViewSet):
+class PaymentViewSet(ExportMixin, BaseViewSet):
     queryset = Payment.objects.select_related("student", "student__user")
     serializer_class = PaymentSerializer
     permission_classes = [IsAdminOrTrainerReadOwn]
+    pagination_class = KeysetPagination
     search_fields = ["method", "note"]
     ordering_fields = ["paid_at", "amount_ils"]
-
-    def get_queryset(self):
-        u = self.request.user
-        if u.role == "ADMIN":
-            return super().get_queryset()
-        if u.role == "TRAINER":
-            return super().get_queryset().filter(student__user__trainer_id=u.id)
-        return super().get_queryset().filter(student__user_id=u.id)
+    export_columns = (
+        ("id", "id"),
+        ("student_id", "student_id"),
+        ("student", "student__user__username"),
+        ("amount_ils", "amount_ils"),
+        ("paid_at", "paid_at"),
+        ("method", "method"),
+        ("note", "note"),
+    )
 
 
-class TrainingSessionViewSet(BaseViewSet):
+class TrainingSessionViewSet(ExportMixin, BaseViewSet):
     queryset = TrainingSession.objects.select_related(
         "trainer__user", "member__user"
     )
     serializer_class = TrainingSessionSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsAdminOrTrainerReadOwn]
+    pagination_class = KeysetPagination
     search_fields = ["session_type", "status", "notes"]
+    search_index = "session"
     ordering_fields = ["scheduled_date", "duration_minutes", "price"]
+    # Window mode of ``list``; the async list route hands these to this view.
+    sync_list_params = ("from", "to")
+    export_columns = (
+        ("id", "id"),
+        ("trainer_id", "trainer_id"),
+        ("trainer", "trainer__user__username"),
+        ("member_id", "member_id"),
+        ("member", "member__user__username"),
+        ("session_type", "session_type"),
+        ("scheduled_date", "scheduled_date"),
+        ("duration_minutes", "duration_minutes"),
+        ("status", "status"),
+        ("price", "price"),
+        ("notes", "notes"),
+    )
 
-    def get_queryset(self):
-        qs = super().get_queryset()
-        u = self.request.user
-        role = getattr(u, "role", None)
-        if role == "ADMIN":
-            return qs
-        if role == "TRAINER":
-            return qs.filter(trainer__user_id=u.id)
-        if role == "TRAINEE":
-            return qs.filter(member__user_id=u.id)
-        return qs.none()
+    def list(self, request, *args, **kwargs):
+        """Stored sessions, or with ``?from=``/``?to=`` the window with series expanded.
+
+        In window mode stored sessions overlapping ``[from, to)`` and the virtual
+        occurrences of series in scope come back as one list in time order.
+        ``requested_window`` caps the window, which bounds both the expansion
+        and the response, so it is not paginated. Search applies to the stored
+        sessions only.
+        """
+        if not any(name in request.query_params for name in self.sync_list_params):
+            return super().list(request, *args, **kwargs)
+        start, end = requested_window(request.query_params)
+        sessions = self.filter_queryset(self.get_queryset()).filter(
+            scheduled_date__gt=start - MAX_BOOKING, scheduled_date__lt=end, ends_at__gt=start
+        )
+        virtual = occurrence_sessions(
+            scope_for(request).filter(SessionSeries.objects.order_by()), start, end
+        )
+        merged = sorted([*sessions, *virtual], key=lambda session: session.scheduled_date)
+        return Response({
+            "from": start,
+            "to": end,
+            "results": self.get_serializer(merged, many=True).data,
+        })
+
+
+class SessionSeriesViewSet(BaseViewSet):
+    queryset = SessionSeries.objects.select_related("trainer__user", "member__user")
+    serializer_class = SessionSeriesSerializer
+    permission_classes = [IsAdminOrTrainerReadOwn]
+    search_fields = ["session_type", "notes"]
+    ordering_fields = ["starts_at", "until"]
+
+    @action(detail=True, methods=["get"])
+    def occurrences(self, request, pk=None):
+        """Expanded occurrences in ``?from=&to=``, minus materialized exceptions."""
+        series = self.get_object()
+        start, end = requested_window(request.query_params)
+        rows = occurrence_rows(SessionSeries.objects.filter(pk=series.pk), start, end)
+        return Response({
+            "series": series.pk,
+            "from": start,
+            "to": end,
+            "results": [
+                {"occurrence_start": row["start_at"], "ends_at": row["end_at"]}
+                for row in rows
+            ],
+        })
+
+    @action(detail=True, methods=["post"])
+    def exceptions(self, request, pk=None):
+        """Materialize (or update) one occurrence as a stored session."""
+        series = self.get_object()
+        serializer = SeriesExceptionSerializer(data=request.data, context={"series": series})
+        serializer.is_valid(raise_exception=True)
+        session = serializer.save()
+        # Same trainer and member as the series, whose users are already joined.
+        session.trainer, session.member = series.trainer, series.member
+        return Response(TrainingSessionSerializer(session).data)
 
 
-class MachineViewSet(viewsets.ModelViewSet):
+class MachineViewSet(ResponseCacheMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Machine.objects.all()
+    cache_namespace = "machines"
     serializer_class = MachineSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [IndexedSearchFilter, filters.OrderingFilter]
     search_fields = ["code", "name", "description"]
+    search_index = "machine"
     ordering_fields = ["name", "code", "created_at"]
 
+    @action(detail=True, methods=["get"])
+    def plans(self, request, pk=None):
+        """Plans that use this machine, served from the (machine, plan) index."""
+        machine = self.get_object()
+        qs = scope_for(request).filter(
+            Plan.objects.filter(plan_machines__machine=machine)
+            .select_related("trainee")
+            .prefetch_related(plan_machines_prefetch())
+            .distinct()
+        )
+        page = self.paginate_queryset(qs)
+        serializer = PlanSerializer(page if page is not None else qs, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
 
-class PlanViewSet(viewsets.ModelViewSet):
-    queryset = Plan.objects.select_related("trainee")
+
+class PlanViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Plan.objects.select_related("trainee").prefetch_related(
+        plan_machines_prefetch()
+    )
     serializer_class = PlanSerializer
-    permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    permission_classes = [IsAdminOrTrainerReadOwn]
+    filter_backends = [IndexedSearchFilter, filters.OrderingFilter]
     search_fields = ["description", "trainee__username"]
+    search_index = "plan"
     ordering_fields = ["created_at", "trainee__username"]
 
     def get_queryset(self):
         qs = super().get_queryset()
-        u = self.request.user
-        role = getattr(u, "role", None)
 
         # Filter by trainee_id query param if provided
         trainee_id = self.request.query_params.get('trainee_id')
         if trainee_id:
             qs = qs.filter(trainee_id=trainee_id)
 
+        return scope_for(self.request).filter(qs)
+
+    @action(detail=False, methods=["get"])
+    def today(self, request):
+        """Plans scheduled for today (or ``?weekday=``), grouped by trainee."""
+        weekday = self._requested_weekday(request)
+        plans = (
+            self.get_queryset()
+            .filter(weekdays__in=masks_with_weekday(weekday))
+            .order_by("trainee__username", "-created_at")
+        )
+        groups = {}
+        for data in self.get_serializer(plans, many=True).data:
+            group = groups.setdefault(
+                data["trainee"]["id"],
+                {
+                    "trainee": data["trainee"],
+                    "trainee_name": data["trainee_name"],
+                    "plans": [],
+                },
+            )
+            group["plans"].append(data)
+        return Response(
+            {
+                "weekday": weekday,
+                "day": WEEKDAYS[weekday],
+                "trainees": list(groups.values()),
+            }
+        )
+
+    def _requested_weekday(self, request):
+        raw = request.query_params.get("weekday")
+        if raw is None or raw == "":
+            return timezone.localdate().weekday()
+        if raw.isdigit() and int(raw) < len(WEEKDAYS):
+            return int(raw)
+        for index, name in enumerate(WEEKDAYS):
+            if name.lower().startswith(raw.lower()) and len(raw) >= 2:
+                return index
+        raise ValidationError({"weekday": "Use 0-6 (Monday = 0) or a day name."})
+
+
+class DashboardView(APIView):
+    """Dashboard totals for the caller's role, read from the daily rollups."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(dashboard_summary(request.user))
+
+
+@force_replica
+class RevenueReportView(APIView):
+    """Revenue in ``?from=``/``?to=`` grouped by ``?group_by=`` (month by default)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        start, end = report_range(request.query_params)
+        group_by = request.query_params.get("group_by", "month")
+        return Response({
+            "from": start,
+            "to": end,
+            "group_by": group_by,
+            "results": revenue_report(scope_for(request), start, end, group_by),
+        })
+
+
+@force_replica
+class PayrollView(APIView):
+    """Trainer payroll for ``?from=``/``?to=`` (this month by default).
+
+    ``?basis=hourly|commission`` and ``?commission=`` override the settings.
+    Admins see every trainer, trainers only their own row.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        scope = scope_for(request)
+        if scope.is_admin:
+            trainers = None
+        elif scope.role == "TRAINER":
+            trainers = [scope.trainer_profile_id]
+        else:
+            raise PermissionDenied("Payroll is available to admins and trainers.")
+        start, end = report_range(request.query_params, period="month")
+        basis, commission = payroll_options(request.query_params)
+        payroll = compute_payroll(start, end, basis, commission, trainers=trainers)
+        return Response({"from": start, "to": end, **payroll})
+
+
+class ResponseCacheStatsView(APIView):
+    """Per-process hit/miss/wait counters of the reference-data response cache."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not scope_for(request).is_admin:
+            raise PermissionDenied()
+        counters = {}
+        for (namespace, event), count in response_cache_stats().items():
+            counters.setdefault(namespace, {"hit": 0, "miss": 0, "wait": 0})[event] = count
+        return Response(counters)
+
+
+class DatabasePoolStatsView(APIView):
+    """Size, checkout and wait counters of this process's database connection pools."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not scope_for(request).is_admin:
+            raise PermissionDenied()
+        return Response(dbpool.stats())
+
+
+class ConflictsView(APIView):
+    """Overlapping trainer bookings (sessions and lessons) in ``?from=``/``?to=``."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        start, end = requested_window(request.query_params, max_days=31)
+        role = getattr(request.user, "role", None)
         if role == "ADMIN":
-            return qs
-        if role == "TRAINER":
-            # Trainers can see plans for their trainees
-            return qs.filter(trainee__trainer_id=u.id)
-        if role == "TRAINEE":
-            # Trainees can only see their own plans
-            return qs.filter(trainee_id=u.id)
-        return qs.none()
+            trainer = request.query_params.get("trainer")
+            if trainer and not trainer.isdigit():
+                raise ValidationError({"trainer": "Expected a trainer user id."})
+            trainers = [int(trainer)] if trainer else None
+        elif role == "TRAINER":
+            trainers = [request.user.id]
+        else:
+            raise PermissionDenied("Only admins and trainers can review conflicts.")
+        conflicts = find_conflicts(trainer_bookings(start, end, trainers))
+        return Response({"from": start, "to": end, "conflicts": conflicts})
+
+
+class CalendarView(APIView):
+    """Sessions and lessons in ``?from=``/``?to=`` as one time-ordered stream.
+
+    Pages are continued with the ``next`` link; ``?format=ics`` renders the
+    page as iCalendar and ``feed_url`` is a subscribable .ics URL.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ICalendarRenderer]
+    default_limit = 100
+    max_limit = 500
+
+    def get(self, request):
+        start, end = requested_window(request.query_params)
+        limit = self.default_limit
+        raw_limit = request.query_params.get("limit")
+        if raw_limit:
+            if not raw_limit.isdigit() or int(raw_limit) < 1:
+                raise ValidationError({"limit": "Expected a positive integer."})
+            limit = min(int(raw_limit), self.max_limit)
+        raw_cursor = request.query_params.get("cursor")
+        cursor = calendar.decode_cursor(raw_cursor) if raw_cursor else None
+
+        rows = calendar.calendar_items(scope_for(request), start, end, cursor, limit + 1)
+        next_link = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_link = replace_query_param(
+                request.build_absolute_uri(), "cursor", calendar.encode_cursor(rows[-1])
+            )
+        return Response(
+            {
+                "from": start,
+                "to": end,
+                "next": next_link,
+                "feed_url": feed_url(request),
+                "results": rows,
+            }
+        )
+
+
+def feed_url(request):
+    """Absolute .ics feed URL for the request user at their current feed version."""
+    version = (
+        get_user_model().objects.filter(pk=request.user.pk)
+        .values_list("calendar_feed_version", flat=True).get()
+    )
+    token = calendar.feed_token(request.user.pk, version)
+    return request.build_absolute_uri(reverse("calendar-feed", args=[token]))
+
+
+class CalendarFeedRotateView(APIView):
+    """Revoke every feed URL issued to the request user and return a new one."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        get_user_model().objects.filter(pk=request.user.pk).update(
+            calendar_feed_version=F("calendar_feed_version") + 1
+        )
+        return Response({"feed_url": feed_url(request)})
+
+
+class CalendarFeedView(APIView):
+    """Subscribable .ics feed authenticated by the signed token in the URL."""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    renderer_classes = [ICalendarRenderer]
+    past = timedelta(days=14)
+    future = timedelta(days=90)
+    max_events = 2000
+
+    def get(self, request, token):
+        claims = calendar.feed_claims(token)
+        user = None
+        if claims is not None:
+            user_id, version = claims
+            user = get_user_model().objects.filter(
+                pk=user_id, is_active=True, calendar_feed_version=version
+            ).first()
+        if user is None:
+            raise NotFound("Unknown calendar feed.")
+        now = timezone.now()
+        rows = calendar.calendar_items(
+            AccessScope(user), now - self.past, now + self.future, limit=self.max_events
+        )
+        return Response({"results": rows})
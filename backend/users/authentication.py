@@ -0,0 +1,159 @@
+# users/authentication.py
+"""JWT authentication that builds the request user from token claims.
+
+``UserLoginSerializer.get_token`` puts the username, names, role and trainer in
+the token, so the request user is assembled from those claims instead of a
+``User`` query. What a token cannot vouch for after it is issued (the account
+still exists, is active, and has the same role and trainer) is checked against
+``user_states``, a small per-process LRU cache with a TTL. ``users.signals``
+evicts an entry whenever its user is saved or deleted, and the TTL bounds how
+long other processes can serve a stale entry.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+# Claims written by UserLoginSerializer.get_token, copied onto the request user.
+PROFILE_CLAIMS = ("username", "email", "first_name", "last_name")
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+user_states = TTLCache(
+    maxsize=getattr(settings, "AUTH_USER_CACHE_SIZE", 10_000),
+    ttl=getattr(settings, "AUTH_USER_CACHE_TTL", 60),
+)
+
+
+def user_state(user_id):
+    """``(role, trainer_id, is_active)`` for ``user_id``, or None if there is no such user."""
+    state = user_states.get(user_id)
+    if state is None:
+        state = (
+            User.objects.filter(pk=user_id)
+            .values_list("role", "trainer_id", "is_active")
+            .first()
+        )
+        if state is not None:
+            user_states.set(user_id, state)
+    return state
+
+
+async def auser_state(user_id):
+    """``user_state`` for async views; the cache miss is an async query."""
+    state = user_states.get(user_id)
+    if state is None:
+        state = await (
+            User.objects.filter(pk=user_id)
+            .values_list("role", "trainer_id", "is_active")
+            .afirst()
+        )
+        if state is not None:
+            user_states.set(user_id, state)
+    return state
+
+
+def _user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` without the per-request ``User`` query.
+
+    Tokens issued without the profile claims fall back to loading the user.
+    ``aauthenticate`` is the same check for async views.
+    """
+
+    def get_user(self, validated_token):
+        if "role" not in validated_token:
+            return super().get_user(validated_token)
+        user_id = _user_id(validated_token)
+        return self._claims_user(validated_token, user_id, user_state(user_id))
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if "role" not in validated_token:
+            user = await sync_to_async(super().get_user)(validated_token)
+        else:
+            user_id = _user_id(validated_token)
+            user = self._claims_user(validated_token, user_id, await auser_state(user_id))
+        return user, validated_token
+
+    def _claims_user(self, validated_token, user_id, state):
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        role, trainer_id, is_active = state
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if (validated_token["role"], validated_token.get("trainer_id")) != (role, trainer_id):
+            # Role or trainer changed since login; claims can no longer be trusted.
+            raise AuthenticationFailed(_("Token is out of date, log in again"), code="token_stale")
+
+        user = User(
+            role=role,
+            trainer_id=trainer_id,
+            is_active=True,
+            **{api_settings.USER_ID_FIELD: user_id},
+            **{claim: validated_token.get(claim, "") for claim in PROFILE_CLAIMS},
+        )
+        # Behave like a fetched row so it can be used as a foreign-key value.
+        user._state.adding = False
+        return user
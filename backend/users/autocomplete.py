@@ -0,0 +1,266 @@
+# users/autocomplete.py
+"""In-process prefix index for name lookup at the front desk.
+
+Every member and trainer is filed under the lower-cased username, first
+name, last name and email, in sorted lists of ``(text, kind, id)`` keys; a
+lookup bisects to the first key at or after the typed prefix and walks
+forward while keys still start with it. Extra words in the query must each
+prefix one of the same person's fields.
+
+Keys live in per-scope buckets so a trainer's lookup only walks their own
+trainees: ``trainers``, ``members``, and ``members:<trainer user id>``.
+
+The index is built on first use and updated by ``users.signals`` when saves
+in this process commit. After ``AUTOCOMPLETE_MAX_AGE`` seconds it is rebuilt
+in a background thread so changes made by other processes show up
+eventually; lookups keep using the old index meanwhile.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .models import MemberProfile, TrainerProfile
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+TEXT_FIELDS = ("username", "first_name", "last_name", "email")
+
+TRAINERS = "trainers"
+MEMBERS = "members"
+
+
+def _members_of(trainer_user_id):
+    return f"{MEMBERS}:{trainer_user_id}"
+
+
+def scope_buckets(user):
+    """Buckets ``user`` may look people up in."""
+    role = getattr(user, "role", None)
+    if role == "ADMIN":
+        return (TRAINERS, MEMBERS)
+    if role == "TRAINER":
+        return (TRAINERS, _members_of(user.pk))
+    return (TRAINERS,)
+
+
+class PrefixIndex:
+    """Sorted-array prefix index; not thread-safe on its own."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._entries = {}  # (kind, id) -> (entry, buckets, texts)
+        self._by_user = {}  # user id -> {(kind, id)}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry, trainer_user_id=None, keep_sorted=True):
+        """File ``entry``; with ``keep_sorted=False`` keys are appended until ``sort()``."""
+        ident = (entry["kind"], entry["id"])
+        self.remove(ident)
+        if entry["kind"] == "trainer":
+            buckets = (TRAINERS,)
+        elif trainer_user_id is not None:
+            buckets = (MEMBERS, _members_of(trainer_user_id))
+        else:
+            buckets = (MEMBERS,)
+        texts = frozenset(entry[name].lower() for name in TEXT_FIELDS if entry[name])
+        for bucket in buckets:
+            keys = self._buckets.setdefault(bucket, [])
+            for text in texts:
+                if keep_sorted:
+                    bisect.insort(keys, (text, *ident))
+                else:
+                    keys.append((text, *ident))
+        self._entries[ident] = (entry, buckets, texts)
+        self._by_user.setdefault(entry["user_id"], set()).add(ident)
+
+    def sort(self):
+        for keys in self._buckets.values():
+            keys.sort()
+
+    def remove(self, ident):
+        found = self._entries.pop(ident, None)
+        if found is None:
+            return
+        entry, buckets, texts = found
+        for bucket in buckets:
+            keys = self._buckets[bucket]
+            for text in texts:
+                key = (text, *ident)
+                i = bisect.bisect_left(keys, key)
+                if i < len(keys) and keys[i] == key:
+                    del keys[i]
+        owned = self._by_user.get(entry["user_id"])
+        if owned is not None:
+            owned.discard(ident)
+            if not owned:
+                del self._by_user[entry["user_id"]]
+
+    def remove_user(self, user_id):
+        for ident in list(self._by_user.get(user_id, ())):
+            self.remove(ident)
+
+    def lookup(self, buckets, terms, limit=DEFAULT_LIMIT):
+        """Up to ``limit`` entries matching all ``terms``, in key order per bucket."""
+        first, rest = terms[0], terms[1:]
+        found = []
+        seen = set()
+        for bucket in buckets:
+            keys = self._buckets.get(bucket, ())
+            i = bisect.bisect_left(keys, (first,))
+            taken = 0
+            while i < len(keys) and taken < limit and keys[i][0].startswith(first):
+                ident = keys[i][1:]
+                i += 1
+                if ident in seen:
+                    continue
+                seen.add(ident)
+                entry, _, texts = self._entries[ident]
+                if all(any(text.startswith(term) for text in texts) for term in rest):
+                    found.append((keys[i - 1][0], entry))
+                    taken += 1
+        found.sort(key=lambda pair: pair[0])
+        return [entry for _, entry in found[:limit]]
+
+
+def _member_rows(**filters):
+    for pk, user_id, username, first, last, email, trainer_id, active in (
+        MemberProfile.objects.filter(**filters).values_list(
+            "pk", "user_id", "user__username", "user__first_name", "user__last_name",
+            "user__email", "user__trainer_id", "is_active",
+        ).iterator(chunk_size=5000)
+    ):
+        entry = {
+            "kind": "member", "id": pk, "user_id": user_id, "username": username,
+            "first_name": first, "last_name": last, "email": email, "is_active": active,
+        }
+        yield entry, trainer_id
+
+
+def _trainer_rows(**filters):
+    for pk, user_id, username, first, last, email, active in (
+        TrainerProfile.objects.filter(**filters).values_list(
+            "pk", "user_id", "user__username", "user__first_name", "user__last_name",
+            "user__email", "user__is_active",
+        ).iterator(chunk_size=5000)
+    ):
+        entry = {
+            "kind": "trainer", "id": pk, "user_id": user_id, "username": username,
+            "first_name": first, "last_name": last, "email": email, "is_active": active,
+        }
+        yield entry, None
+
+
+_index = None
+_built_at = 0.0
+_lock = threading.RLock()  # guards reads and in-place updates of _index, and _dirty
+_build_lock = threading.Lock()  # one build at a time; held until the new index is live
+_dirty = set()  # users refreshed while a build was running
+
+
+def _entries(**filters):
+    return [*_member_rows(**filters), *_trainer_rows(**filters)]
+
+
+def _load(index, keep_sorted=True, **filters):
+    for entry, trainer_id in _entries(**filters):
+        index.add(entry, trainer_id, keep_sorted=keep_sorted)
+
+
+def _replace_user(index, user_id, entries):
+    index.remove_user(user_id)
+    for entry, trainer_id in entries:
+        index.add(entry, trainer_id)
+
+
+def build():
+    """A fresh index of every member and trainer, sorted once at the end."""
+    index = PrefixIndex()
+    _load(index, keep_sorted=False)
+    index.sort()
+    return index
+
+
+def _build_and_install():
+    """Build an index and make it live; the caller holds ``_build_lock``.
+
+    Users refreshed while the build ran are re-read into it before the swap,
+    so a save that lands mid-build is not lost with the old index.
+    """
+    global _index, _built_at
+    fresh = build()
+    while True:
+        with _lock:
+            if not _dirty:
+                _index, _built_at = fresh, time.monotonic()
+                return fresh
+            dirty = list(_dirty)
+            _dirty.clear()
+        for user_id in dirty:
+            _replace_user(fresh, user_id, _entries(user_id=user_id))
+
+
+def _rebuild_in_background():
+    try:
+        _build_and_install()
+    finally:
+        # The thread's own database connections would otherwise linger.
+        connections.close_all()
+        _build_lock.release()
+
+
+def _current():
+    """The live index, building it on first use.
+
+    Once an index exists, requests never wait for a build: when it is older
+    than ``AUTOCOMPLETE_MAX_AGE`` the request that notices starts a rebuild in
+    a daemon thread and, like everyone else, keeps answering from the old
+    index until the new one is swapped in.
+    """
+    index = _index
+    if index is not None:
+        stale = time.monotonic() - _built_at > settings.AUTOCOMPLETE_MAX_AGE
+        if stale and _build_lock.acquire(blocking=False):
+            threading.Thread(
+                target=_rebuild_in_background, name="autocomplete-rebuild", daemon=True
+            ).start()
+        return index
+    with _build_lock:
+        return _index if _index is not None else _build_and_install()
+
+
+def lookup(user, q, limit=DEFAULT_LIMIT):
+    """People matching ``q`` that ``user`` may see."""
+    terms = q.lower().split()
+    if not terms:
+        return []
+    index = _current()
+    with _lock:
+        return index.lookup(scope_buckets(user), terms, limit)
+
+
+def refresh_user(user_id):
+    """Re-read one user's member and trainer entries; a no-op until the index is built.
+
+    The rows are read before taking ``_lock``, so lookups never wait on the
+    query. ``users.signals`` calls this once the saving transaction commits.
+    """
+    if _index is None and not _build_lock.locked():
+        return
+    entries = _entries(user_id=user_id)
+    with _lock:
+        if _build_lock.locked():
+            _dirty.add(user_id)
+        if _index is not None:
+            _replace_user(_index, user_id, entries)
+
+
+def reset():
+    global _index
+    with _lock:
+        _index = None
+        _dirty.clear()
@@ -0,0 +1,102 @@
+# users/availability.py
+"""Free-slot search across trainers.
+
+All bookings in the window, recurring series occurrences included, are read
+with ``training.scheduling.trainer_bookings`` (a fixed number of queries,
+whatever the number of trainers), grouped per trainer, sorted and merged, then
+subtracted from each trainer's working hours.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from django.utils import timezone
+
+from training.scheduling import trainer_bookings
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching ``(start, end)`` pairs; input order is irrelevant."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _local(day, at):
+    return timezone.make_aware(datetime.combine(day, at))
+
+
+def working_intervals(trainer, start, end, local=_local):
+    """The trainer's working hours inside ``[start, end)``, in local time.
+
+    ``local(day, time)`` builds the aware shift bounds; ``trainer_availability``
+    passes a memoized one, since most trainers share the same hours.
+    """
+    tz = timezone.get_current_timezone()
+    day = timezone.localtime(start, tz).date()
+    last = timezone.localtime(end, tz).date()
+    while day <= last:
+        if trainer.works_on(day) and trainer.work_end > trainer.work_start:
+            shift_start = local(day, trainer.work_start)
+            shift_end = local(day, trainer.work_end)
+            shift_start, shift_end = max(shift_start, start), min(shift_end, end)
+            if shift_start < shift_end:
+                yield shift_start, shift_end
+        day += timedelta(days=1)
+
+
+def free_slots(shifts, busy, min_length):
+    """Gaps of at least ``min_length`` in ``shifts`` not covered by merged ``busy``."""
+    slots = []
+    index, count = 0, len(busy)
+    for shift_start, shift_end in shifts:
+        cursor = shift_start
+        # Both lists are sorted, so one pointer walks the busy intervals once.
+        while index < count and busy[index][1] <= cursor:
+            index += 1
+        probe = index
+        while probe < count and busy[probe][0] < shift_end:
+            busy_start, busy_end = busy[probe]
+            if busy_start - cursor >= min_length:
+                slots.append((cursor, busy_start))
+            if busy_end > cursor:
+                cursor = busy_end
+            probe += 1
+        if shift_end - cursor >= min_length:
+            slots.append((cursor, shift_end))
+    return slots
+
+
+def trainer_availability(trainers, start, end, duration):
+    """Free slots of at least ``duration`` for each trainer profile in ``trainers``.
+
+    Shifts are built once per distinct working schedule; a trainer with
+    nothing booked gets the schedule's shifts as they are.
+    """
+    trainers = list(trainers)
+    busy = defaultdict(list)
+    for trainer_user_id, booking_start, booking_end, _, _ in trainer_bookings(
+        start, end, [t.user_id for t in trainers]
+    ):
+        busy[trainer_user_id].append((booking_start, booking_end))
+
+    local = lru_cache(maxsize=None)(_local)
+    shifts, idle = {}, {}
+    results = []
+    for trainer in trainers:
+        schedule = (trainer.work_start, trainer.work_end, trainer.work_days)
+        if schedule not in shifts:
+            shifts[schedule] = list(working_intervals(trainer, start, end, local))
+            idle[schedule] = free_slots(shifts[schedule], [], duration)
+        bookings = busy.get(trainer.user_id)
+        if bookings:
+            slots = free_slots(shifts[schedule], merge_intervals(bookings), duration)
+        else:
+            slots = idle[schedule]
+        results.append((trainer, slots))
+    return results
@@ -0,0 +1,188 @@
+# users/benchmarks.py
+"""Login latency under concurrent load, through the ASGI handler.
+
+Not collected by the default test run; invoke explicitly::
+
+    python manage.py test users.benchmarks
+
+Fires ``LOGINS`` concurrent logins alongside ``PINGS`` health checks and
+prints p50/p95/p99 for both, plus how many logins were shed with 503.
+``AutocompleteBenchmark`` times ``/api/users/autocomplete/`` over
+``MEMBERS`` members, and ``AvailabilityBenchmark`` times two weeks of
+``/api/users/trainers/availability/`` over ``TRAINERS`` booked trainers
+against an ``AVAILABILITY_BUDGET_MS`` median.
+"""
+import asyncio
+import random
+import statistics
+import time
+from datetime import date, datetime, time as clock, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from training.models import Lesson, Student, TrainingSession
+
+from . import autocomplete, login
+from .models import MemberProfile, TrainerProfile
+
+User = get_user_model()
+
+LOGINS = 64
+PINGS = 64
+MEMBERS = 100_000
+LOOKUPS = 500
+TRAINERS = 200
+BOOKINGS_PER_DAY = 4  # per trainer, half sessions and half lessons
+AVAILABILITY_RUNS = 20
+AVAILABILITY_BUDGET_MS = 100
+
+
+def _percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "max": max(samples)}
+
+
+class LoginLatencyBenchmark(TransactionTestCase):
+    def setUp(self):
+        User.objects.create_user(username="bench", password="bench-password-1", role="TRAINEE")
+        login._pool = None
+
+    async def _timed(self, client, method, path, **kwargs):
+        started = time.perf_counter()
+        response = await getattr(client, method)(path, **kwargs)
+        return response.status_code, (time.perf_counter() - started) * 1000
+
+    async def _run(self):
+        client = AsyncClient()
+        credentials = {"username": "bench", "password": "bench-password-1"}
+        logins = [
+            self._timed(client, "post", "/api/users/login/", data=credentials,
+                        content_type="application/json")
+            for _ in range(LOGINS)
+        ]
+        pings = [self._timed(client, "get", "/api/health") for _ in range(PINGS)]
+        results = await asyncio.gather(*logins, *pings)
+        return results[:LOGINS], results[LOGINS:]
+
+    def test_login_p99(self):
+        logins, pings = asyncio.run(self._run())
+        self.assertTrue(all(code in (200, 503) for code, _ in logins))
+        self.assertTrue(all(code == 200 for code, _ in pings))
+
+        served = [ms for code, ms in logins if code == 200]
+        shed = sum(1 for code, _ in logins if code == 503)
+        print(f"\nlogin  ok={len(served)} shed={shed} "
+              + " ".join(f"{k}={v:.1f}ms" for k, v in _percentiles(served).items()))
+        print("health " + " ".join(
+            f"{k}={v:.1f}ms" for k, v in _percentiles([ms for _, ms in pings]).items()
+        ))
+
+
+class AutocompleteBenchmark(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        syllables = ["ka", "lo", "mi", "ra", "te", "shi", "do", "na", "vi", "el", "or", "ya"]
+
+        def name():
+            return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).title()
+
+        users = User.objects.bulk_create(
+            (
+                User(username=f"member{n}", first_name=name(), last_name=name(),
+                     email=f"member{n}@example.com", role="TRAINEE")
+                for n in range(MEMBERS)
+            ),
+            batch_size=5000,
+        )
+        MemberProfile.objects.bulk_create(
+            (
+                MemberProfile(user=user, membership_start_date=date(2025, 1, 1),
+                              membership_end_date=date(2030, 1, 1))
+                for user in users
+            ),
+            batch_size=5000,
+        )
+        cls.admin = User.objects.create_user(username="bench-admin", role="ADMIN")
+        cls.prefixes = [rng.choice(syllables) + rng.choice(syllables)[:1] for _ in range(LOOKUPS)]
+
+    def setUp(self):
+        autocomplete.reset()
+        self.addCleanup(autocomplete.reset)
+
+    def test_lookup_latency(self):
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        started = time.perf_counter()
+        client.get("/api/users/autocomplete/", {"q": "x"})
+        print(f"\nautocomplete build ({MEMBERS} members): {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        samples = []
+        for prefix in self.prefixes:
+            started = time.perf_counter()
+            response = client.get("/api/users/autocomplete/", {"q": prefix})
+            samples.append((time.perf_counter() - started) * 1000)
+            self.assertEqual(response.status_code, 200)
+        print("autocomplete " + " ".join(f"{k}={v:.2f}ms" for k, v in _percentiles(samples).items()))
+        self.assertLess(_percentiles(samples)["p99"], 5)
+
+
+class AvailabilityBenchmark(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        trainee = User.objects.create_user(username="bench-member", role="TRAINEE")
+        member = MemberProfile.objects.create(
+            user=trainee, membership_start_date=date(2025, 1, 1), membership_end_date=date(2030, 1, 1)
+        )
+        student = Student.objects.create(user=trainee)
+        users = User.objects.bulk_create(
+            User(username=f"bench-trainer-{n}", role="TRAINER") for n in range(TRAINERS)
+        )
+        profiles = TrainerProfile.objects.bulk_create(
+            TrainerProfile(user=user, specialization="Bench") for user in users
+        )
+        cls.monday = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+        sessions, lessons = [], []
+        for profile in profiles:
+            for day in range(14):
+                for slot in range(BOOKINGS_PER_DAY):
+                    start = timezone.make_aware(
+                        datetime.combine(cls.monday + timedelta(days=day), clock(9 + 2 * slot))
+                    )
+                    if slot % 2:
+                        lessons.append(Lesson(
+                            trainer_id=profile.user_id, student=student,
+                            start=start, end=start + timedelta(minutes=45),
+                        ))
+                    else:
+                        sessions.append(TrainingSession(
+                            trainer=profile, member=member, session_type="personal",
+                            scheduled_date=start, duration_minutes=60,
+                            ends_at=start + timedelta(minutes=60), price=Decimal("50.00"),
+                        ))
+        TrainingSession.objects.bulk_create(sessions, batch_size=2000)
+        Lesson.objects.bulk_create(lessons, batch_size=2000)
+        cls.admin = User.objects.create_user(username="bench-admin", role="ADMIN")
+
+    def test_two_weeks_for_all_trainers(self):
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        params = {
+            "from": self.monday.isoformat(),
+            "to": (self.monday + timedelta(days=14)).isoformat(),
+            "duration": 30,
+        }
+        samples = []
+        for _ in range(AVAILABILITY_RUNS):
+            started = time.perf_counter()
+            response = client.get("/api/users/trainers/availability/", params)
+            samples.append((time.perf_counter() - started) * 1000)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["trainers"]), TRAINERS)
+        print(f"\navailability ({TRAINERS} trainers) "
+              + " ".join(f"{k}={v:.1f}ms" for k, v in _percentiles(samples).items()))
+        self.assertLess(statistics.median(samples), AVAILABILITY_BUDGET_MS)
@@ -0,0 +1,38 @@
+# users/expiry.py
+"""Membership expiry, served from the ``(is_active, membership_end_date)`` index.
+
+``deactivate_expired`` flips ``is_active`` off for members whose end date has
+passed, with one ``UPDATE`` per batch of primary keys so no single statement
+locks the whole table. ``update()`` skips ``auto_now``, so ``updated_at`` is
+set explicitly; conditional GETs on the members list then see the change.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import MemberProfile
+
+BATCH_SIZE = 1000
+MAX_WITHIN_DAYS = 366
+
+
+def expiring(within_days, today=None):
+    """Active members whose membership ends in ``[today, today + within_days]``, soonest first."""
+    today = today or timezone.localdate()
+    return MemberProfile.objects.filter(
+        is_active=True,
+        membership_end_date__gte=today,
+        membership_end_date__lte=today + timedelta(days=within_days),
+    ).order_by("membership_end_date", "pk")
+
+
+def deactivate_expired(today=None, batch_size=BATCH_SIZE):
+    """Deactivate members whose membership ended before ``today``; yields each batch's row count."""
+    today = today or timezone.localdate()
+    expired = MemberProfile.objects.filter(is_active=True, membership_end_date__lt=today)
+    while True:
+        ids = list(expired.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return
+        # Re-check the condition so rows renewed since the SELECT are left alone.
+        yield expired.filter(pk__in=ids).update(is_active=False, updated_at=timezone.now())
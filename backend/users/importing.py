@@ -0,0 +1,170 @@
+# users/importing.py
+"""Bulk member import from CSV.
+
+Rows are read as a stream and handled in chunks. Each chunk is validated with
+``MemberCreateSerializer``, its passwords are hashed (in a process pool when
+``workers`` asks for one; the hash is the expensive part of creating a user),
+and users and profiles are written with ``bulk_create`` inside one transaction
+per chunk; ``bulk_create`` skips ``post_save``, so the new profiles are added to
+the search index explicitly. With a pool, hashing of the next chunk overlaps with the inserts of
+the current one. The upload endpoint hashes in-process by default
+(``MEMBER_IMPORT_WORKERS``); the ``import_members`` command uses the pool. Bad rows are
+reported and skipped; they never abort the import.
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, transaction
+
+from training import search
+
+from .models import MemberProfile, User
+from .serializers import MemberCreateSerializer
+
+CHUNK_SIZE = 1000
+PROFILE_FIELDS = (
+    "membership_type",
+    "membership_start_date",
+    "membership_end_date",
+    "emergency_contact",
+    "medical_conditions",
+    "is_active",
+)
+
+
+def _init_worker():
+    # Spawned workers (macOS, Windows) start without configured settings.
+    django.setup()
+
+
+class _InlineExecutor:
+    """Stand-in for a process pool when ``workers`` is 0."""
+
+    def map(self, fn, iterable, chunksize=1):
+        return list(map(fn, iterable))
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def _validate(rows, seen):
+    """Split ``(line, row)`` pairs into valid data and per-row errors."""
+    valid, errors = [], []
+    for line, row in rows:
+        serializer = MemberCreateSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({"line": line, "username": row.get("username"), "errors": serializer.errors})
+            continue
+        username = serializer.validated_data["username"]
+        if username in seen:
+            errors.append({"line": line, "username": username,
+                           "errors": {"username": ["Duplicate username in file."]}})
+            continue
+        seen.add(username)
+        valid.append((line, serializer.validated_data))
+
+    taken = set(
+        User.objects.filter(username__in=[data["username"] for _, data in valid])
+        .values_list("username", flat=True)
+    )
+    if taken:
+        errors += [
+            {"line": line, "username": data["username"],
+             "errors": {"username": ["A user with that username already exists."]}}
+            for line, data in valid if data["username"] in taken
+        ]
+        valid = [(line, data) for line, data in valid if data["username"] not in taken]
+    return valid, errors
+
+
+def _insert(valid, hashes):
+    """Create the users and profiles of one chunk in a single transaction."""
+    users = [
+        User(
+            username=data["username"],
+            email=User.objects.normalize_email(data.get("email", "")),
+            first_name=data.get("first_name", ""),
+            last_name=data.get("last_name", ""),
+            password=password,
+            role=User.Role.TRAINEE,
+        )
+        for (_, data), password in zip(valid, hashes)
+    ]
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        # Not every backend (MySQL) returns primary keys from bulk_create.
+        ids = dict(
+            User.objects.filter(username__in=[user.username for user in users])
+            .values_list("username", "id")
+        )
+        profiles = MemberProfile.objects.bulk_create(
+            MemberProfile(
+                user_id=ids[data["username"]],
+                **{name: data[name] for name in PROFILE_FIELDS if name in data},
+            )
+            for _, data in valid
+        )
+        profile_ids = [profile.pk for profile in profiles]
+        if None in profile_ids:
+            profile_ids = MemberProfile.objects.filter(user_id__in=ids.values()).values_list("pk", flat=True)
+        search.index("member", profile_ids)
+    return len(users)
+
+
+def import_members(stream, chunk_size=CHUNK_SIZE, workers=None):
+    """Import members from a CSV text stream with a header row.
+
+    Columns follow ``MemberCreateSerializer``. ``workers`` is the size of the
+    hashing pool (``None`` for one per CPU, ``0`` to hash in-process).
+    Returns ``{"created": n, "errors": [{"line", "username", "errors"}]}``.
+    """
+    reader = csv.DictReader(stream)
+    # Line 1 is the header; line numbers assume no embedded newlines.
+    numbered = enumerate(reader, start=2)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    else:
+        executor = _InlineExecutor()
+
+    created, errors, seen = 0, [], set()
+    pending = None
+
+    def flush(valid, hashes):
+        try:
+            return _insert(valid, hashes)
+        except DatabaseError as exc:
+            errors.extend(
+                {"line": line, "username": data["username"], "errors": {"non_field_errors": [str(exc)]}}
+                for line, data in valid
+            )
+            return 0
+
+    try:
+        while True:
+            chunk = [
+                (line, {key: value for key, value in row.items() if key and value not in ("", None)})
+                for line, row in islice(numbered, chunk_size)
+            ]
+            if not chunk:
+                break
+            valid, chunk_errors = _validate(chunk, seen)
+            errors += chunk_errors
+            hashes = executor.map(
+                make_password, [data["password"] for _, data in valid],
+                chunksize=max(1, len(valid) // (4 * max(workers, 1))),
+            )
+            if pending is not None:
+                created += flush(*pending)
+            pending = (valid, hashes)
+        if pending is not None:
+            created += flush(*pending)
+    finally:
+        executor.shutdown()
+    errors.sort(key=lambda error: error["line"])
+    return {"created": created, "errors": errors}
@@ -0,0 +1,160 @@
+# users/login.py
+"""Async login with password verification off the event loop.
+
+Under ASGI (``config/asgi.py``) the login views below run
+``django.contrib.auth.authenticate`` (the configured backends, their
+``is_active`` checks, ``user_login_failed`` and hash upgrades) in a small,
+bounded thread pool; ``hashlib`` releases the GIL while hashing, so other
+requests keep being served. When more logins are waiting than the pool and
+its queue allow, the caller gets ``503`` with ``Retry-After`` instead of
+piling up behind the hash.
+"""
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.db import connections
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .serializers import UserLoginSerializer
+
+User = get_user_model()
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    """Thread pool that refuses work beyond ``workers + max_queue`` outstanding jobs."""
+
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rejected = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="login-hash")
+
+    @property
+    def pending(self):
+        return self._pending
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated
+            self._pending += 1
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(settings.LOGIN_HASH_WORKERS, settings.LOGIN_HASH_QUEUE)
+        return _pool
+
+
+def pool_stats():
+    """Worker, pending and rejected counts, or None before the first login."""
+    pool = _pool
+    if pool is None:
+        return None
+    return {"workers": pool.workers, "pending": pool.pending, "rejected": pool.rejected}
+
+
+def _authenticate(request, credentials):
+    try:
+        return authenticate(request, **credentials)
+    finally:
+        # Pool threads outlive requests; don't let their connections linger.
+        connections.close_all()
+
+
+def _respond(data, code=status.HTTP_200_OK, headers=None):
+    """A DRF ``Response`` rendered as JSON without going through an ``APIView``."""
+    response = Response(data, status=code, headers=headers)
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = "application/json"
+    response.renderer_context = {}
+    return response
+
+
+def _user_payload(user):
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "role": getattr(user, "role", None),
+        "trainer_id": getattr(user, "trainer_id", None),
+        "is_active": user.is_active,
+    }
+
+
+async def _login(request, include_user):
+    try:
+        body = json.loads(request.body or b"{}") if request.content_type == "application/json" else request.POST
+        username, password = body.get(User.USERNAME_FIELD), body.get("password")
+    except (ValueError, AttributeError):
+        return _respond({"detail": "Malformed request body."}, status.HTTP_400_BAD_REQUEST)
+    missing = {
+        name: ["This field is required."]
+        for name, value in ((User.USERNAME_FIELD, username), ("password", password))
+        if not value
+    }
+    if missing:
+        return _respond(missing, status.HTTP_400_BAD_REQUEST)
+
+    credentials = {User.USERNAME_FIELD: username, "password": password}
+    try:
+        user = await hashing_pool().run(_authenticate, request, credentials)
+    except PoolSaturated:
+        return _respond(
+            {"detail": "Too many logins in progress, try again shortly."},
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(settings.LOGIN_RETRY_AFTER)},
+        )
+
+    if user is None:
+        return _respond(
+            {"detail": "No active account found with the given credentials"},
+            status.HTTP_401_UNAUTHORIZED,
+        )
+    refresh = UserLoginSerializer.get_token(user)
+    data = {"refresh": str(refresh), "access": str(refresh.access_token)}
+    if include_user:
+        data["user"] = _user_payload(user)
+    return _respond(data)
+
+
+@csrf_exempt
+@require_POST
+async def login_view(request):
+    """``/api/users/login/``: tokens plus the user payload the frontend stores."""
+    return await _login(request, include_user=True)
+
+
+@csrf_exempt
+@require_POST
+async def token_obtain_view(request):
+    """``/api/auth/token/``: access and refresh tokens only."""
+    return await _login(request, include_user=False)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from users.expiry import BATCH_SIZE, deactivate_expired
+
+
+class Command(BaseCommand):
+    help = "Deactivate members whose membership_end_date has passed; safe to run on a schedule"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = 0
+        for count in deactivate_expired(batch_size=options["batch_size"]):
+            total += count
+            self.stdout.write(f"Deactivated {count} members")
+        self.stdout.write(self.style.SUCCESS(f"Deactivated {total} expired memberships."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.importing import CHUNK_SIZE, import_members
+
+
+class Command(BaseCommand):
+    help = "Bulk-create members (TRAINEE users with a MemberProfile) from a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV with a header row: username,email,password,...")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Password hashing processes (default: one per CPU, 0 to hash in-process)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as stream:
+                result = import_members(
+                    stream, chunk_size=options["chunk_size"], workers=options["workers"]
+                )
+        except OSError as exc:
+            raise CommandError(exc)
+        for error in result["errors"]:
+            self.stderr.write(f"line {error['line']} ({error['username']}): {dict(error['errors'])}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result['created']} members; {len(result['errors'])} rows rejected."
+            )
+        )
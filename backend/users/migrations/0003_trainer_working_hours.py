@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:05
+
+import datetime
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_role_memberprofile_trainerprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainerprofile',
+            name='work_days',
+            field=models.PositiveSmallIntegerField(default=31, help_text='Bitmask of working weekdays, Monday = 1', validators=[django.core.validators.MaxValueValidator(127)]),
+        ),
+        migrations.AddField(
+            model_name='trainerprofile',
+            name='work_end',
+            field=models.TimeField(default=datetime.time(17, 0)),
+        ),
+        migrations.AddField(
+            model_name='trainerprofile',
+            name='work_start',
+            field=models.TimeField(default=datetime.time(9, 0)),
+        ),
+    ]
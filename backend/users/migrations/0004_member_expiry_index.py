@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_trainer_working_hours'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='memberprofile',
+            index=models.Index(fields=['is_active', 'membership_end_date'], name='users_membe_is_acti_a9069a_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_member_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='calendar_feed_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Signed into calendar feed URLs; bumping it revokes every issued URL.'),
+        ),
+    ]
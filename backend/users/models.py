@@ -1,4 +1,7 @@
+from datetime import time
+
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MaxValueValidator
 from django.db import models
 
 
@@ -17,6 +20,40 @@ class User(AbstractUser):
         related_name="trainees",
         limit_choices_to={"role": Role.TRAINER},
     )
+    calendar_feed_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Signed into calendar feed URLs; bumping it revokes every issued URL.",
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # Signal handlers compare against these to tell what a save changed.
+        user._loaded_values = dict(zip(field_names, values))
+        return user
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def loaded_value(self, name, default=None):
+        """``name`` as last loaded from or saved to the database, else ``default``."""
+        return (getattr(self, "_loaded_values", None) or {}).get(name, default)
+
+    def changed(self, fields):
+        """Whether any of ``fields`` differs from its loaded value.
+
+        Users built in memory rather than loaded always count as changed.
+        """
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is None:
+            return True
+        return any(self.__dict__.get(name, loaded.get(name)) != loaded.get(name) for name in fields)
 
 
 class TimestampedModel(models.Model):
@@ -41,6 +78,13 @@ class TrainerProfile(TimestampedModel):
     bio = models.TextField(blank=True)
     hourly_rate = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     is_available = models.BooleanField(default=True)
+    work_start = models.TimeField(default=time(9, 0))
+    work_end = models.TimeField(default=time(17, 0))
+    work_days = models.PositiveSmallIntegerField(
+        default=0b0011111,
+        validators=[MaxValueValidator(0b1111111)],
+        help_text="Bitmask of working weekdays, Monday = 1",
+    )
 
     class Meta:
         ordering = ["-updated_at"]
@@ -48,6 +92,9 @@ class TrainerProfile(TimestampedModel):
     def __str__(self):
         return f"TrainerProfile(user={self.user.username})"
 
+    def works_on(self, day):
+        return bool(self.work_days & (1 << day.weekday()))
+
 
 class MemberProfile(TimestampedModel):
     BASIC = "basic"
@@ -76,6 +123,9 @@ class MemberProfile(TimestampedModel):
 
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [
+            models.Index(fields=["is_active", "membership_end_date"]),
+        ]
 
     def __str__(self):
         return f"MemberProfile(user={self.user.username})"
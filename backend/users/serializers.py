@@ -118,11 +118,23 @@ class TrainerProfileSerializer(serializers.ModelSerializer):
             "bio",
             "hourly_rate",
             "is_available",
+            "work_start",
+            "work_end",
+            "work_days",
             "created_at",
             "updated_at",
         )
         read_only_fields = ("created_at", "updated_at")
 
+    def validate(self, attrs):
+        start = attrs.get("work_start", getattr(self.instance, "work_start", None))
+        end = attrs.get("work_end", getattr(self.instance, "work_end", None))
+        if start and end and end <= start:
+            raise serializers.ValidationError(
+                {"work_end": "Working hours must end after they start."}
+            )
+        return attrs
+
 
 class MemberProfileSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(
@@ -213,6 +225,9 @@ class MemberCreateSerializer(serializers.Serializer):
 
         return member_profile
 
+    def to_representation(self, instance):
+        return MemberProfileSerializer(instance, context=self.context).data
+
 
 class TrainerCreateSerializer(serializers.Serializer):
     """Create a User and TrainerProfile in one transaction"""
@@ -229,6 +244,17 @@ class TrainerCreateSerializer(serializers.Serializer):
     bio = serializers.CharField(required=False, allow_blank=True)
     hourly_rate = serializers.DecimalField(max_digits=8, decimal_places=2, default=0)
     is_available = serializers.BooleanField(default=True)
+    work_start = serializers.TimeField(required=False)
+    work_end = serializers.TimeField(required=False)
+    work_days = serializers.IntegerField(required=False, min_value=0, max_value=0b1111111)
+
+    def validate(self, attrs):
+        start, end = attrs.get("work_start"), attrs.get("work_end")
+        if start and end and end <= start:
+            raise serializers.ValidationError(
+                {"work_end": "Working hours must end after they start."}
+            )
+        return attrs
 
     def create(self, validated_data):
         # Extract profile fields
@@ -239,6 +265,9 @@ class TrainerCreateSerializer(serializers.Serializer):
             'hourly_rate': validated_data.pop('hourly_rate', 0),
             'is_available': validated_data.pop('is_available', True),
         }
+        for field in ('work_start', 'work_end', 'work_days'):
+            if field in validated_data:
+                profile_fields[field] = validated_data.pop(field)
 
         # Create user with TRAINER role
         user = User.objects.create_user(
@@ -254,3 +283,6 @@ class TrainerCreateSerializer(serializers.Serializer):
         trainer_profile = TrainerProfile.objects.create(user=user, **profile_fields)
 
         return trainer_profile
+
+    def to_representation(self, instance):
+        return TrainerProfileSerializer(instance, context=self.context).data
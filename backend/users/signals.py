@@ -0,0 +1,47 @@
+# users/signals.py
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete
+from .authentication import user_states
+from .models import MemberProfile, TrainerProfile
+
+User = get_user_model()
+
+AUTH_FIELDS = ("role", "trainer_id", "is_active")
+# Fields the autocomplete index files people under or scopes them by.
+LOOKUP_FIELDS = ("username", "first_name", "last_name", "email", "trainer_id", "is_active")
+
+
+def _refresh_lookup(user_id):
+    # Re-read after commit: inside the transaction the query would hold it
+    # open longer, and a rollback would leave the index ahead of the database.
+    transaction.on_commit(partial(autocomplete.refresh_user, user_id))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    if instance.changed(AUTH_FIELDS):
+        user_states.pop(instance.pk)
+    if instance.changed(LOOKUP_FIELDS):
+        _refresh_lookup(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_states.pop(instance.pk)
+    _refresh_lookup(instance.pk)
+
+
+@receiver(post_save, sender=MemberProfile)
+@receiver(post_delete, sender=MemberProfile)
+@receiver(post_save, sender=TrainerProfile)
+@receiver(post_delete, sender=TrainerProfile)
+def profile_changed(sender, instance, **kwargs):
+    _refresh_lookup(instance.user_id)
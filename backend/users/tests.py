@@ -1,8 +1,33 @@
-from django.test import TestCase
+import io
+import threading
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from django.utils import timezone
 from rest_framework import status
-from django.contrib.auth import get_user_model
+from rest_framework.test import APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.testing import APITestCase
+from training.models import Lesson, Student, TrainingSession
+from training.search import search
+
+from . import login, autocomplete
+from .authentication import user_states, TTLCache
+from .expiry import deactivate_expired
+from .importing import import_members
+from .models import MemberProfile, TrainerProfile
+from .serializers import UserLoginSerializer
 
 User = get_user_model()
 
@@ -51,6 +76,20 @@ class UserModelTest(TestCase):
         self.assertEqual(trainee.trainer, trainer)
         self.assertIn(trainee, trainer.trainees.all())
 
+    def test_changed_compares_with_loaded_values(self):
+        """Test that changed() sees edits since the last load or save, including deferred loads"""
+        User.objects.create_user(username='member1', role='TRAINEE')
+        user = User.objects.get(username='member1')
+        self.assertFalse(user.changed(('username', 'role')))
+        user.role = 'TRAINER'
+        self.assertTrue(user.changed(('username', 'role')))
+        self.assertEqual(user.loaded_value('role'), 'TRAINEE')
+        user.save()
+        self.assertFalse(user.changed(('role',)))
+        deferred = User.objects.only('id').get(username='member1')
+        self.assertFalse(deferred.changed(('username', 'role')))
+        self.assertTrue(User(username='fresh').changed(('username',)))
+
 
 class UserRegistrationAPITest(APITestCase):
     """Test the user registration API"""
@@ -85,7 +124,7 @@ class UserRegistrationAPITest(APITestCase):
         self.assertEqual(User.objects.count(), 0)
 
 
-class AuthenticationAPITest(APITestCase):
+class AuthenticationAPITest(APITransactionTestCase):
     """Test JWT authentication"""
 
     def setUp(self):
@@ -118,3 +157,516 @@ class AuthenticationAPITest(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+
+
+class TrainerAvailabilityAPITest(APITestCase):
+    """Test the free-slot finder across trainers"""
+
+    def setUp(self):
+        self.desk = User.objects.create_user(username='desk', role='ADMIN')
+        self.trainers = []
+        for i, specialization in enumerate(['Yoga', 'Strength']):
+            user = User.objects.create_user(username=f'trainer{i}', role='TRAINER')
+            self.trainers.append(TrainerProfile.objects.create(
+                user=user, specialization=specialization,
+                work_start=time(9, 0), work_end=time(12, 0), work_days=0b1111111,
+            ))
+        trainee = User.objects.create_user(username='trainee', role='TRAINEE')
+        member = MemberProfile.objects.create(
+            user=trainee, membership_start_date='2025-01-01', membership_end_date='2030-12-31'
+        )
+        student = Student.objects.create(user=trainee)
+        self.day = timezone.localdate() + timedelta(days=2)
+        # trainer0: busy 09:30-10:00 (session) and 09:45-10:30 (lesson)
+        TrainingSession.objects.create(
+            trainer=self.trainers[0], member=member, session_type='personal',
+            scheduled_date=self.at(9, 30), duration_minutes=30, price=Decimal('10.00'),
+        )
+        Lesson.objects.create(
+            trainer=self.trainers[0].user, student=student, start=self.at(9, 45), end=self.at(10, 30)
+        )
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day, time(hour, minute)))
+
+    def _get(self, **params):
+        self.client.force_authenticate(user=self.desk)
+        params.setdefault('from', self.day.isoformat())
+        params.setdefault('to', (self.day + timedelta(days=1)).isoformat())
+        return self.client.get('/api/users/trainers/availability/', params)
+
+    def test_slots_exclude_merged_bookings(self):
+        """Test that overlapping bookings are merged and subtracted from working hours"""
+        response = self._get(duration=30)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        slots = {t['username']: t['slots'] for t in response.data['trainers']}
+        self.assertEqual(
+            [(datetime.fromisoformat(s['start']), datetime.fromisoformat(s['end'])) for s in slots['trainer0']],
+            [(self.at(9), self.at(9, 30)), (self.at(10, 30), self.at(12))],
+        )
+        self.assertEqual(
+            [(datetime.fromisoformat(s['start']), datetime.fromisoformat(s['end'])) for s in slots['trainer1']],
+            [(self.at(9), self.at(12))],
+        )
+
+    def test_duration_and_specialization_filters(self):
+        """Test that short gaps are dropped and specialization narrows trainers"""
+        response = self._get(duration=60, specialization='yoga')
+        trainers = response.data['trainers']
+        self.assertEqual([t['username'] for t in trainers], ['trainer0'])
+        self.assertEqual(len(trainers[0]['slots']), 1)
+
+    def test_query_count_is_independent_of_trainer_count(self):
+        """Test that adding trainers does not add queries"""
+        for i in range(20):
+            user = User.objects.create_user(username=f'extra{i}', role='TRAINER')
+            TrainerProfile.objects.create(user=user, specialization='Cardio')
+        self.client.force_authenticate(user=self.desk)
+        # trainers + users, sessions, lessons, series
+        with self.assertNumQueries(4):
+            self._get(duration=30)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class MemberImportTest(APITestCase):
+    """Test the bulk CSV member import"""
+
+    HEADER = "username,email,password,first_name,membership_type,membership_start_date,membership_end_date\n"
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin1', role='ADMIN')
+        User.objects.create_user(username='taken', role='TRAINEE')
+
+    def rows(self, count, start=0):
+        return "".join(
+            f"member{i},member{i}@example.com,secret{i},Name{i},premium,2025-01-01,2025-12-31\n"
+            for i in range(start, start + count)
+        )
+
+    def test_import_across_chunks_with_pool(self):
+        """Test that rows in several chunks are created with hashed passwords"""
+        result = import_members(io.StringIO(self.HEADER + self.rows(25)), chunk_size=10, workers=2)
+        self.assertEqual(result, {"created": 25, "errors": []})
+        self.assertEqual(MemberProfile.objects.filter(membership_type='premium').count(), 25)
+        user = User.objects.get(username='member7')
+        self.assertEqual(user.role, 'TRAINEE')
+        self.assertEqual(user.first_name, 'Name7')
+        self.assertTrue(user.check_password('secret7'))
+        # bulk_create skips post_save; the importer indexes the profiles itself.
+        found = search(MemberProfile.objects.all(), 'member', ['name7'])
+        self.assertEqual([profile.user_id for profile in found], [user.pk])
+
+    def test_bad_rows_are_reported(self):
+        """Test that invalid, duplicate and existing usernames are skipped, not fatal"""
+        csv_text = (
+            self.HEADER
+            + self.rows(2)
+            + "taken,t@example.com,secret,,basic,2025-01-01,2025-12-31\n"
+            + "member0,again@example.com,secret,,basic,2025-01-01,2025-12-31\n"
+            + "bad,not-an-email,secret,,basic,2025-01-01,2024-12-31\n"
+            + self.rows(1, start=5)
+        )
+        result = import_members(io.StringIO(csv_text), chunk_size=2, workers=0)
+        self.assertEqual(result["created"], 3)
+        self.assertEqual([error["line"] for error in result["errors"]], [4, 5, 6])
+        self.assertIn("username", result["errors"][0]["errors"])
+        self.assertIn("email", result["errors"][2]["errors"])
+        self.assertTrue(User.objects.filter(username='member5').exists())
+
+    def test_endpoint_is_admin_only(self):
+        """Test that the upload endpoint imports for admins and rejects trainers"""
+        upload = SimpleUploadedFile("members.csv", (self.HEADER + self.rows(3)).encode())
+        trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.client.force_authenticate(user=trainer)
+        response = self.client.post('/api/users/members/import/', {'file': upload})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        upload.seek(0)
+        self.client.force_authenticate(user=self.admin)
+        # Uploads hash in the request's process; only the command forks a pool.
+        with mock.patch('users.importing.ProcessPoolExecutor') as pool:
+            response = self.client.post('/api/users/members/import/', {'file': upload})
+        pool.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+
+        response = self.client.post('/api/users/members/import/', {})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ClaimsAuthenticationTest(APITestCase):
+    """Test JWT authentication built from token claims"""
+
+    def setUp(self):
+        user_states.clear()
+        self.trainer = User.objects.create_user(username='trainer1', role='TRAINER')
+        self.user = User.objects.create_user(
+            username='trainee1', email='t1@example.com', first_name='Tina',
+            role='TRAINEE', trainer=self.trainer,
+        )
+
+    def authenticate(self, user):
+        token = UserLoginSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_me_without_queries(self):
+        """Test that /api/me is served from claims once the user state is cached"""
+        self.authenticate(self.user)
+        self.assertEqual(self.client.get('/api/me').status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/me')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['username'], 'trainee1')
+        self.assertEqual(response.data['first_name'], 'Tina')
+        self.assertEqual(response.data['role'], 'TRAINEE')
+        self.assertEqual(response.data['trainer_id'], self.trainer.pk)
+
+    def test_role_or_activity_change_invalidates(self):
+        """Test that saving a new role or deactivating rejects existing tokens"""
+        self.authenticate(self.user)
+        self.assertEqual(self.client.get('/api/me').status_code, status.HTTP_200_OK)
+        self.user.role = 'TRAINER'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/me').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.authenticate(self.user)
+        self.assertEqual(self.client.get('/api/me').status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/me').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_claims_user_works_as_foreign_key(self):
+        """Test that the claims user can be saved as a relation"""
+        self.authenticate(self.trainer)
+        response = self.client.post('/api/users/trainees/', {
+            'username': 'trainee2', 'email': 't2@example.com', 'password': 'secret',
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(User.objects.get(username='trainee2').trainer, self.trainer)
+        self.assertFalse(TrainerProfile.objects.exists())
+
+    def test_token_without_claims_falls_back(self):
+        """Test that tokens without profile claims still authenticate from the DB"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        response = self.client.get('/api/me')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], 't1@example.com')
+
+    def test_cache_bounds(self):
+        """Test that the cache drops the least recently used and expired entries"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set(1, 'a')
+        cache.set(2, 'b')
+        cache.get(1)
+        cache.set(3, 'c')
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), 'a')
+        cache.ttl = 0
+        cache.set(4, 'd')
+        self.assertIsNone(cache.get(4))
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class AsyncLoginTest(APITransactionTestCase):
+    """Test the async login views and their hashing pool backpressure"""
+
+    # authenticate() runs on the login hashing pool's threads, whose own
+    # connections only see committed rows.
+
+    def setUp(self):
+        self.login = login
+        login._pool = None
+        self.addCleanup(setattr, login, '_pool', None)
+        User.objects.create_user(username='member1', password='secret123', role='TRAINEE')
+
+    def test_login_returns_tokens_and_user(self):
+        """Test that /api/users/login/ returns tokens with the user payload"""
+        response = self.client.post(
+            '/api/users/login/', {'username': 'member1', 'password': 'secret123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertIn('access', data)
+        self.assertEqual(data['user']['role'], 'TRAINEE')
+
+        response = self.client.get('/api/me', HTTP_AUTHORIZATION=f"Bearer {data['access']}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_rejects_bad_input(self):
+        """Test that missing fields, unknown users and GET requests are refused"""
+        response = self.client.post('/api/users/login/', {'username': 'member1'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', response.data)
+        response = self.client.post(
+            '/api/users/login/', {'username': 'ghost', 'password': 'secret123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get('/api/users/login/').status_code, 405)
+
+    def test_goes_through_authentication_backends(self):
+        """Test that inactive users are refused and failures send user_login_failed"""
+        failures = []
+
+        def handler(sender, credentials, **kwargs):
+            failures.append(credentials['username'])
+
+        user_login_failed.connect(handler)
+        self.addCleanup(user_login_failed.disconnect, handler)
+        response = self.client.post(
+            '/api/users/login/', {'username': 'member1', 'password': 'wrong'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(failures, ['member1'])
+
+        User.objects.filter(username='member1').update(is_active=False)
+        response = self.client.post(
+            '/api/auth/token/', {'username': 'member1', 'password': 'secret123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saturated_pool_sheds_load(self):
+        """Test that a full hashing pool answers 503 with Retry-After"""
+        pool = self.login.HashingPool(workers=1, max_queue=0)
+        pool._pending = 1
+        self.login._pool = pool
+        response = self.client.post(
+            '/api/auth/token/', {'username': 'member1', 'password': 'secret123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(pool.rejected, 1)
+
+
+class MemberConditionalGetTest(APITestCase):
+    """Test that member and trainer lists revalidate with ETags"""
+
+    def test_member_list_not_modified(self):
+        admin = User.objects.create_user(username='admin1', role='ADMIN')
+        trainee = User.objects.create_user(username='trainee1', role='TRAINEE')
+        member = MemberProfile.objects.create(
+            user=trainee, membership_start_date='2025-01-01', membership_end_date='2025-12-31'
+        )
+        self.client.force_authenticate(user=admin)
+        etag = self.client.get('/api/users/members/')['ETag']
+        response = self.client.get('/api/users/members/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        member.membership_type = MemberProfile.VIP
+        member.save()
+        response = self.client.get('/api/users/members/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/users/trainers/').status_code, status.HTTP_200_OK)
+
+
+class MembershipExpiryTest(APITestCase):
+    """Test the expiry sweeper and the expiring-soon list"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin1', role='ADMIN')
+        today = timezone.localdate()
+        self.members = {}
+        for name, days in (('lapsed1', -30), ('lapsed2', -1), ('today', 0), ('soon', 3), ('later', 40)):
+            user = User.objects.create_user(username=name, role='TRAINEE')
+            self.members[name] = MemberProfile.objects.create(
+                user=user,
+                membership_start_date=today - timedelta(days=365),
+                membership_end_date=today + timedelta(days=days),
+            )
+
+    def test_sweeper_deactivates_in_batches(self):
+        """Test that only lapsed members are deactivated, in bounded batches"""
+        before = self.members['lapsed1'].updated_at
+        self.assertEqual(list(deactivate_expired(batch_size=1)), [1, 1])
+        inactive = set(
+            MemberProfile.objects.filter(is_active=False).values_list('user__username', flat=True)
+        )
+        self.assertEqual(inactive, {'lapsed1', 'lapsed2'})
+        self.members['lapsed1'].refresh_from_db()
+        self.assertGreater(self.members['lapsed1'].updated_at, before)
+
+        out = io.StringIO()
+        call_command('expire_memberships', stdout=out)
+        self.assertIn('Deactivated 0 expired memberships', out.getvalue())
+
+    def test_expiring_endpoint(self):
+        """Test that the expiring list covers today through within_days, soonest first"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/users/members/expiring/?within_days=7')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        usernames = [row['username'] for row in response.data['results']]
+        self.assertEqual(usernames, ['today', 'soon'])
+        response = self.client.get('/api/users/members/expiring/?within_days=60')
+        self.assertEqual(response.data['count'], 3)
+        response = self.client.get('/api/users/members/expiring/?within_days=soon')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AutocompleteTest(APITestCase):
+    """Test prefix lookup of members and trainers"""
+
+    def setUp(self):
+        autocomplete.reset()
+        self.addCleanup(autocomplete.reset)
+        self.admin = User.objects.create_user(username='admin1', role='ADMIN')
+        self.trainer = User.objects.create_user(
+            username='coach_dan', first_name='Daniel', last_name='Cohen', role='TRAINER'
+        )
+        TrainerProfile.objects.create(user=self.trainer, specialization='Strength')
+        self.dana = User.objects.create_user(
+            username='dana', first_name='Dana', last_name='Levi',
+            email='dana@example.com', role='TRAINEE', trainer=self.trainer,
+        )
+        self.other = User.objects.create_user(
+            username='danny', first_name='Danny', last_name='Katz', role='TRAINEE'
+        )
+        for user in (self.dana, self.other):
+            MemberProfile.objects.create(
+                user=user, membership_start_date='2025-01-01', membership_end_date='2030-12-31'
+            )
+
+    def _lookup(self, user, q):
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/users/autocomplete/', {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(row['kind'], row['username']) for row in response.data['results']]
+
+    def test_prefix_matches_any_field(self):
+        """Test that any name field or email prefix matches, and extra words narrow"""
+        self.assertEqual(
+            self._lookup(self.admin, 'dan'),
+            [('member', 'dana'), ('trainer', 'coach_dan'), ('member', 'danny')],
+        )
+        self.assertEqual(self._lookup(self.admin, 'Dan lev'), [('member', 'dana')])
+        self.assertEqual(self._lookup(self.admin, 'dana@'), [('member', 'dana')])
+        self.assertEqual(self._lookup(self.admin, 'ana'), [])
+        self.assertEqual(self._lookup(self.admin, ''), [])
+
+    def test_scoped_by_role(self):
+        """Test that trainers see their own trainees and trainees only trainers"""
+        self.assertEqual(
+            self._lookup(self.trainer, 'dan'), [('member', 'dana'), ('trainer', 'coach_dan')]
+        )
+        self.assertEqual(self._lookup(self.dana, 'dan'), [('trainer', 'coach_dan')])
+
+    def test_signals_keep_index_current(self):
+        """Test that renames, reassignments and deletions show up without a rebuild"""
+        self._lookup(self.admin, 'dan')  # build the index
+        self.dana.first_name = 'Shira'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.dana.save()
+            # Nothing is re-read until the transaction commits.
+            self.assertEqual(self._lookup(self.admin, 'shira'), [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._lookup(self.admin, 'shira'), [('member', 'dana')])
+
+        self.other.trainer = self.trainer
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.save()
+        self.assertIn(('member', 'danny'), self._lookup(self.trainer, 'katz'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MemberProfile.objects.get(user=self.other).delete()
+        self.assertEqual(self._lookup(self.admin, 'katz'), [])
+
+    def test_stale_index_is_rebuilt_in_the_background(self):
+        """Test that a stale index keeps answering while a thread rebuilds it"""
+        self._lookup(self.admin, 'dan')  # build the index
+        self.dana.first_name = 'Shira'
+        self.dana.save()  # no commit, so only a rebuild picks this up
+        fresh = autocomplete.build()
+        release = threading.Event()
+
+        def slow_build():
+            release.wait(5)
+            return fresh
+
+        with override_settings(AUTOCOMPLETE_MAX_AGE=0), \
+                mock.patch.object(autocomplete, 'build', side_effect=slow_build):
+            self.assertEqual(self._lookup(self.admin, 'shira'), [])
+            release.set()
+            self.assertTrue(autocomplete._build_lock.acquire(timeout=5))
+            autocomplete._build_lock.release()
+        self.assertEqual(self._lookup(self.admin, 'shira'), [('member', 'dana')])
+
+
+class QueryBudgetTest(APITestCase):
+    """Test query budgets of every users endpoint and that lists do not grow with rows"""
+
+    LISTS = (
+        '/api/users/members/',
+        '/api/users/members/expiring/',
+        '/api/users/trainers/',
+        '/api/users/trainers/availability/',
+    )
+
+    def setUp(self):
+        self.addCleanup(caches['responses'].clear)
+        self.admin = User.objects.create_user(username='admin1', role='ADMIN')
+        self.seeded = 0
+        self._seed(1)
+        self.client.force_authenticate(user=self.admin)
+
+    def _seed(self, count):
+        """Add ``count`` trainers and ``count`` members whose membership ends this week."""
+        today = timezone.localdate()
+        for n in range(self.seeded, self.seeded + count):
+            trainer = User.objects.create_user(username=f'trainer{n}', role='TRAINER')
+            TrainerProfile.objects.create(user=trainer, specialization='Strength')
+            member = User.objects.create_user(username=f'member{n}', role='TRAINEE', trainer=trainer)
+            MemberProfile.objects.create(
+                user=member, membership_start_date=today - timedelta(days=30),
+                membership_end_date=today + timedelta(days=3),
+            )
+        self.seeded += count
+
+    def _request(self, method, path, data=None, format='json'):
+        caches['responses'].clear()
+        response = getattr(self.client, method)(path, data, format=format)
+        self.assertLess(response.status_code, 400, (path, getattr(response, 'data', None)))
+
+    def _queries(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as captured:
+            self._request(method, path, data)
+        return len(captured)
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        """Test that each list endpoint runs as many queries for 100 rows as for 1"""
+        one = {path: self._queries('get', path) for path in self.LISTS}
+        self._seed(99)
+        hundred = {path: self._queries('get', path) for path in self.LISTS}
+        self.assertEqual(hundred, one)
+
+    def test_action_budgets(self):
+        """Test every viewset action against its query budget"""
+        trainer, member = TrainerProfile.objects.get(), MemberProfile.objects.get()
+        upload = SimpleUploadedFile(
+            'members.csv',
+            b'username,email,password,membership_start_date,membership_end_date\n'
+            b'new1,new1@example.com,secret1,2025-01-01,2025-12-31\n'
+            b'new2,new2@example.com,secret2,2025-01-01,2025-12-31\n',
+        )
+        cases = [
+            ('get', '/api/users/trainers/', None, 2),
+            ('get', f'/api/users/trainers/{trainer.pk}/', None, 1),
+            ('post', '/api/users/trainers/', {
+                'username': 'coach', 'email': 'coach@example.com', 'password': 'secret',
+                'specialization': 'Yoga',
+            }, 2),
+            ('patch', f'/api/users/trainers/{trainer.pk}/', {'bio': 'Lifts'}, 2),
+            ('get', '/api/users/trainers/availability/', None, 4),
+            ('get', '/api/users/members/', None, 2),
+            ('get', f'/api/users/members/{member.pk}/', None, 1),
+            ('post', '/api/users/members/', {
+                'username': 'joiner', 'email': 'joiner@example.com', 'password': 'secret',
+                'membership_start_date': '2025-01-01', 'membership_end_date': '2025-12-31',
+            }, 7),
+            ('patch', f'/api/users/members/{member.pk}/', {'emergency_contact': 'Mom'}, 7),
+            ('get', '/api/users/members/expiring/', None, 2),
+            ('delete', f'/api/users/members/{member.pk}/', None, 5),
+            ('delete', f'/api/users/trainers/{trainer.pk}/', None, 5),
+        ]
+        for method, path, data, budget in cases:
+            with self.subTest(method=method, path=path), self.assertMaxQueries(budget):
+                self._request(method, path, data)
+        with self.assertMaxQueries(11):
+            self._request('post', '/api/users/members/import/', {'file': upload}, format='multipart')
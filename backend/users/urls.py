@@ -1,11 +1,13 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
+from training.async_reads import async_list_paths
 
+from .login import login_view
 from .views import (
+    AutocompleteView,
     CreateTraineeView,
     MemberViewSet,
     TrainerViewSet,
-    UserLoginView,
     UserRegistrationView,
 )
 
@@ -14,8 +16,10 @@ router.register(r"members", MemberViewSet, basename="member")
 router.register(r"trainers", TrainerViewSet, basename="trainer")
 
 urlpatterns = [
+    *async_list_paths("trainers/", TrainerViewSet, "trainer"),
     path("register/", UserRegistrationView.as_view(), name="user-register"),
-    path("login/", UserLoginView.as_view(), name="user-login"),
+    path("login/", login_view, name="user-login"),
+    path("autocomplete/", AutocompleteView.as_view(), name="user-autocomplete"),
     path("trainees/", CreateTraineeView.as_view(), name="create-trainee"),
 ]
 
@@ -1,12 +1,30 @@
-from rest_framework.views import APIView
-from rest_framework.response import Response
+import csv
+import io
+from datetime import timedelta
+
+from django.conf import settings
+from rest_framework import filters, generics, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework import generics, permissions, status, viewsets
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import APIView
+
+from training.async_reads import async_get
+from training.conditional import ConditionalGetMixin
+from training.response_cache import ResponseCacheMixin
+from training.scheduling import MAX_BOOKING, requested_window
+from training.search import IndexedSearchFilter
+
+from . import autocomplete
+from .availability import trainer_availability
+from .expiry import MAX_WITHIN_DAYS, expiring
+from .importing import import_members
 from .serializers import (
     TraineeCreateSerializer,
     UserRegistrationSerializer,
-    UserLoginSerializer,
     MemberProfileSerializer,
     TrainerProfileSerializer,
     MemberCreateSerializer,
@@ -52,6 +70,28 @@ class MeView(APIView):
         )
 
 
+async def _me(view):
+    # MeView reads only request.user, which claims authentication builds without a query.
+    return view.get(view.request)
+
+
+async_me_view = async_get(MeView, _me, MeView.as_view())
+
+
+class AutocompleteView(APIView):
+    """Members and trainers whose names or email start with ``?q=``, scoped by role."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", autocomplete.DEFAULT_LIMIT))
+        except ValueError:
+            limit = autocomplete.DEFAULT_LIMIT
+        limit = max(1, min(limit, autocomplete.MAX_LIMIT))
+        q = request.query_params.get("q", "")
+        return Response({"results": autocomplete.lookup(request.user, q, limit)})
+
+
 class IsTrainer(permissions.BasePermission):
     """Only trainers or admins can create trainees."""
 
@@ -79,13 +119,9 @@ class CreateTraineeView(generics.CreateAPIView):
     permission_classes = [IsTrainer]
 
 
-class UserLoginView(TokenObtainPairView):
-    permission_classes = [AllowAny]
-    serializer_class = UserLoginSerializer
-
-
-class TrainerViewSet(viewsets.ModelViewSet):
+class TrainerViewSet(ResponseCacheMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = TrainerProfile.objects.select_related("user").all()
+    cache_namespace = "trainers"
     serializer_class = TrainerProfileSerializer
     permission_classes = [IsAuthenticated]
 
@@ -99,11 +135,71 @@ class TrainerViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsAdminRole()]
         return [permission() for permission in self.permission_classes]
 
+    @action(detail=False, methods=["get"])
+    def availability(self, request):
+        """Free slots across available trainers in ``?from=``/``?to=``."""
+        start, end = requested_window(request.query_params, default_days=7, max_days=31)
+        raw = request.query_params.get("duration", "60")
+        if not raw.isdigit() or not 0 < int(raw) <= MAX_BOOKING.total_seconds() // 60:
+            raise ValidationError({"duration": "Expected minutes between 1 and 1440."})
+        duration = timedelta(minutes=int(raw))
+
+        trainers = (
+            self.get_queryset()
+            .filter(is_available=True)
+            .only(
+                "specialization", "work_start", "work_end", "work_days",
+                "user__username", "user__first_name", "user__last_name",
+            )
+            .order_by("id")
+        )
+        specialization = request.query_params.get("specialization")
+        if specialization:
+            trainers = trainers.filter(specialization__icontains=specialization)
+
+        # Slots repeat across trainers (shared shift times, bookings on the
+        # hour), so each distinct one is formatted once here rather than by the
+        # renderer per occurrence. Keyed with the tzinfo: equal instants in
+        # different zones render differently.
+        formatted, encode = {}, JSONEncoder().default
+
+        def slot(slot_start, slot_end):
+            key = (slot_start, slot_end, slot_start.tzinfo, slot_end.tzinfo)
+            entry = formatted.get(key)
+            if entry is None:
+                entry = formatted[key] = {"start": encode(slot_start), "end": encode(slot_end)}
+            return entry
 
-class MemberViewSet(viewsets.ModelViewSet):
+        return Response(
+            {
+                "from": start,
+                "to": end,
+                "duration": int(raw),
+                "trainers": [
+                    {
+                        "id": trainer.id,
+                        "user": trainer.user_id,
+                        "username": trainer.user.username,
+                        "first_name": trainer.user.first_name,
+                        "last_name": trainer.user.last_name,
+                        "specialization": trainer.specialization,
+                        "slots": [slot(s, e) for s, e in slots],
+                    }
+                    for trainer, slots in trainer_availability(trainers, start, end, duration)
+                    if slots
+                ],
+            }
+        )
+
+
+class MemberViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = MemberProfile.objects.select_related("user").all()
     serializer_class = MemberProfileSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [IndexedSearchFilter, filters.OrderingFilter]
+    search_fields = ["user__username", "user__first_name", "user__last_name", "user__email"]
+    search_index = "member"
+    ordering_fields = ["membership_end_date", "user__username"]
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -111,6 +207,36 @@ class MemberViewSet(viewsets.ModelViewSet):
         return MemberProfileSerializer
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'import_csv']:
             return [IsAuthenticated(), IsAdminRole()]
         return [permission() for permission in self.permission_classes]
+
+    @action(detail=False, methods=["get"])
+    def expiring(self, request):
+        """Active members whose membership ends within ``?within_days=`` (default 7)."""
+        raw = request.query_params.get("within_days", "7")
+        try:
+            within_days = int(raw)
+        except ValueError:
+            within_days = -1
+        if not 0 <= within_days <= MAX_WITHIN_DAYS:
+            raise ValidationError({"within_days": f"Use a whole number of days from 0 to {MAX_WITHIN_DAYS}."})
+        queryset = expiring(within_days).select_related("user")
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser])
+    def import_csv(self, request):
+        """Bulk-create members from an uploaded CSV (``file``); bad rows are reported."""
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Upload a CSV file."})
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        try:
+            result = import_members(stream, workers=settings.MEMBER_IMPORT_WORKERS)
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ValidationError({"file": f"Could not read CSV: {exc}"})
+        code = status.HTTP_201_CREATED if result["created"] else status.HTTP_200_OK
+        return Response(result, status=code)
@@ -0,0 +1,17 @@
+export interface DashboardStats {
+  role: 'ADMIN' | 'TRAINER' | 'TRAINEE' | null;
+  month: string;
+  members: { active: number };
+  trainers: { available: number };
+  sessions: {
+    total: number;
+    by_status: Record<string, number>;
+    by_type: Record<string, number>;
+    completed_today: number;
+  };
+  revenue: {
+    payments: string;
+    sessions: string;
+    total: string;
+  };
+}
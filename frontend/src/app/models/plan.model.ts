@@ -1,3 +1,12 @@
+export interface PlanMachine {
+  machine: number;
+  code: string;
+  name: string;
+  position: number;
+  sets: number;
+  reps: number;
+}
+
 export interface Plan {
   id: number;
   trainee: {
@@ -10,7 +19,7 @@ export interface Plan {
   };
   trainee_name: string;
   description: string;
-  machines: string; // comma-separated machine IDs
+  machines: PlanMachine[];
   days: string; // e.g., "Monday,Wednesday,Friday"
   sets: number;
   reps: number;
@@ -21,7 +30,7 @@ export interface Plan {
 export interface PlanRequest {
   trainee_id: number;
   description: string;
-  machines: string;
+  machines: string | number[]; // comma-separated machine IDs or a list of IDs
   days: string;
   sets: number;
   reps: number;
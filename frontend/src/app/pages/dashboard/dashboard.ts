@@ -6,10 +6,9 @@ import { MatListModule } from '@angular/material/list';
 import { Router } from '@angular/router';
 import { AuthService } from '../../services/auth.service';
 import { MemberService } from '../../services/member.service';
-import { TrainerService } from '../../services/trainer.service';
 import { SessionService } from '../../services/session.service';
+import { DashboardService } from '../../services/dashboard.service';
 import { Member } from '../../models/member.model';
-import { Trainer } from '../../models/trainer.model';
 import { TrainingSession } from '../../models/session.model';
 
 @Component({
@@ -36,8 +35,8 @@ export class Dashboard implements OnInit {
   constructor(
     private authService: AuthService,
     private memberService: MemberService,
-    private trainerService: TrainerService,
     private sessionService: SessionService,
+    private dashboardService: DashboardService,
     private router: Router
   ) {}
 
@@ -53,28 +52,25 @@ export class Dashboard implements OnInit {
   }
 
   loadDashboardData() {
+    this.dashboardService.getStats().subscribe({
+      next: (stats) => {
+        this.totalMembers = stats.members.active;
+        this.totalTrainers = stats.trainers.available;
+        this.totalClasses = stats.sessions.total;
+        this.todayAttendance = stats.sessions.completed_today;
+      },
+      error: (err) => console.error('Error loading dashboard stats:', err)
+    });
+
     this.memberService.getMembers().subscribe({
       next: (members) => {
-        this.totalMembers = members.length;
         this.recentMembers = members.slice(0, 5);
       },
       error: (err) => console.error('Error loading members:', err)
     });
 
-    this.trainerService.getTrainers().subscribe({
-      next: (trainers) => {
-        this.totalTrainers = trainers.length;
-      },
-      error: (err) => console.error('Error loading trainers:', err)
-    });
-
     this.sessionService.getSessions().subscribe({
       next: (sessions) => {
-        this.totalClasses = sessions.length;
-        const today = new Date().toISOString().split('T')[0];
-        this.todayAttendance = sessions.filter(s => 
-          s.scheduled_date.startsWith(today) && s.status === 'completed'
-        ).length;
         this.upcomingSessions = sessions
           .filter(s => s.status === 'scheduled')
           .slice(0, 5);
@@ -121,7 +121,7 @@ export class PlanDialogComponent implements OnInit {
       trainee_id: [data?.trainee?.id || '', Validators.required],
       description: [data?.description || '', Validators.required],
       days: [data?.days || '', Validators.required],
-      machines: [data?.machines || '', Validators.required],
+      machines: [data?.machines?.map(m => m.machine).join(',') || '', Validators.required],
       sets: [data?.sets || 3, [Validators.required, Validators.min(1)]],
       reps: [data?.reps || 15, [Validators.required, Validators.min(1)]],
       duration_minutes: [data?.duration_minutes || null]